@@ -0,0 +1,206 @@
+import asyncio
+import math
+import os
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+from components.cancellation import CancellationToken, OperationCancelled
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# コスト見積もりの単位（1 + ファイル数 / FILES_PER_UNIT + バイト数 / BYTES_PER_UNIT）
+ADMISSION_FILES_PER_UNIT = float(os.getenv("ADMISSION_FILES_PER_UNIT", "50"))
+ADMISSION_BYTES_PER_UNIT = float(os.getenv("ADMISSION_BYTES_PER_UNIT", str(1024 * 1024)))
+# メタデータにサイズがないファイルのバイト数の見積もり
+ADMISSION_DEFAULT_FILE_BYTES = int(os.getenv("ADMISSION_DEFAULT_FILE_BYTES", "4096"))
+
+
+class AdmissionRejected(Exception):
+    """受け付けられないリクエスト（HTTP 429/503 と Retry-After で応答する）"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class _Waiter:
+    def __init__(self, user_id: str, cost: float):
+        self.user_id = user_id
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionController:
+    def __init__(self, capacity: float, user_concurrency: int, max_queue: int, user_queue: int, max_wait: float):
+        """
+        パイプラインの同時実行を制御するアドミッションコントローラー（asyncio用）。
+        実行中のコスト合計が capacity を超えないように受け付け、超える分は上限付きの待ち行列で待たせます。
+
+        :param capacity: 同時に実行できるコストの合計
+        :param user_concurrency: ユーザーごとの同時実行数の上限
+        :param max_queue: 待ち行列の長さの上限（超えた場合は 503）
+        :param user_queue: ユーザーごとの待ち行列の長さの上限（超えた場合は 429）
+        :param max_wait: 待ち行列で待つ最大秒数（超えた場合は 503）
+        """
+        self.capacity = capacity
+        self.user_concurrency = user_concurrency
+        self.max_queue = max_queue
+        self.user_queue = user_queue
+        self.max_wait = max_wait
+
+        self.in_flight_cost = 0.0
+        self.active_by_user: Counter = Counter()
+        self.queue: Deque[_Waiter] = deque()
+
+        # メトリクス
+        self.admitted_total = 0
+        self.rejected_total: Counter = Counter()
+        self.wait_times: Deque[float] = deque(maxlen=1000)
+        self.avg_service_time = 10.0  # 実行時間の指数移動平均（秒）
+        self.avg_cost = 1.0
+
+    @staticmethod
+    def estimate_cost(file_count: int, total_bytes: int) -> float:
+        """ファイル数と合計バイト数から実行コストを見積もります。"""
+        return 1.0 + file_count / ADMISSION_FILES_PER_UNIT + total_bytes / ADMISSION_BYTES_PER_UNIT
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, cost: float, cancel_token: Optional[CancellationToken] = None) -> AsyncIterator[None]:
+        """
+        実行枠を確保してから処理を実行します。
+
+        :param user_id: ユーザーID
+        :param cost: 見積もりコスト（capacity を上限に丸める）
+        :param cancel_token: 待機中にキャンセルされた場合は待ち行列から外れる
+        """
+        cost = min(cost, self.capacity)
+        waiter = self._enqueue(user_id, cost)
+        try:
+            await self._wait(waiter, cancel_token)
+        except BaseException:
+            # 待機中にタスクがキャンセルされた場合も、待ち行列と実行枠を元に戻す
+            if waiter in self.queue:
+                self.queue.remove(waiter)
+            elif waiter.future.done():
+                self._release(waiter)
+            raise
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(waiter, time.monotonic() - started_at)
+
+    def _enqueue(self, user_id: str, cost: float) -> _Waiter:
+        if sum(1 for waiter in self.queue if waiter.user_id == user_id) >= self.user_queue:
+            self.rejected_total["user_queue_full"] += 1
+            raise AdmissionRejected(429, "Too many queued requests for this user", self._retry_after())
+        if len(self.queue) >= self.max_queue:
+            self.rejected_total["queue_full"] += 1
+            raise AdmissionRejected(503, "Server is busy; admission queue is full", self._retry_after())
+        waiter = _Waiter(user_id, cost)
+        self.queue.append(waiter)
+        self._dispatch()
+        return waiter
+
+    async def _wait(self, waiter: _Waiter, cancel_token: Optional[CancellationToken]):
+        deadline = waiter.enqueued_at + self.max_wait
+        while not waiter.future.done():
+            timeout = deadline - time.monotonic()
+            if cancel_token is not None:
+                timeout = min(timeout, 0.25)  # キャンセルは通知されないため、一定間隔で確認する
+            if timeout > 0:
+                await asyncio.wait({waiter.future}, timeout=timeout)
+            if waiter.future.done():
+                break
+            if cancel_token is not None and cancel_token.cancelled:
+                self.queue.remove(waiter)
+                self.rejected_total["cancelled"] += 1
+                raise OperationCancelled(cancel_token.reason)
+            if time.monotonic() >= deadline:
+                self.queue.remove(waiter)
+                self.rejected_total["wait_timeout"] += 1
+                raise AdmissionRejected(503, "Server is busy; timed out waiting for admission", self._retry_after())
+        self.wait_times.append(time.monotonic() - waiter.enqueued_at)
+
+    def _dispatch(self):
+        """
+        待ち行列の先頭から順に、実行枠に収まるものを受け付けます。
+        ユーザーの同時実行数の上限で止まっているリクエストは飛ばしますが、
+        容量不足のリクエストより後ろは受け付けません（大きなリクエストの飢餓を防ぐ）。
+        """
+        for waiter in list(self.queue):
+            if self.active_by_user[waiter.user_id] >= self.user_concurrency:
+                continue
+            if self.in_flight_cost + waiter.cost > self.capacity:
+                break
+            self.queue.remove(waiter)
+            self.in_flight_cost += waiter.cost
+            self.active_by_user[waiter.user_id] += 1
+            self.admitted_total += 1
+            waiter.future.set_result(None)
+
+    def _release(self, waiter: _Waiter, service_time: Optional[float] = None):
+        self.in_flight_cost -= waiter.cost
+        self.active_by_user[waiter.user_id] -= 1
+        if self.active_by_user[waiter.user_id] <= 0:
+            del self.active_by_user[waiter.user_id]
+        if service_time is not None:
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+            self.avg_cost = 0.8 * self.avg_cost + 0.2 * waiter.cost
+        self._dispatch()
+
+    def _retry_after(self) -> float:
+        """待ち行列が捌けるまでのおおよその秒数。"""
+        parallelism = max(1.0, self.capacity / self.avg_cost)
+        return self.avg_service_time * (1 + len(self.queue) / parallelism)
+
+    def metrics(self) -> Dict[str, Any]:
+        waits: List[float] = sorted(self.wait_times)
+        return {
+            "capacity": self.capacity,
+            "in_flight_cost": round(self.in_flight_cost, 3),
+            "in_flight": sum(self.active_by_user.values()),
+            "active_by_user": dict(self.active_by_user),
+            "queue_depth": len(self.queue),
+            "admitted_total": self.admitted_total,
+            "rejected_total": dict(self.rejected_total),
+            "avg_service_time_seconds": round(self.avg_service_time, 3),
+            "wait_time_seconds": {
+                "count": len(waits),
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p50": round(_percentile(waits, 0.5), 3),
+                "p95": round(_percentile(waits, 0.95), 3),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+        }
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+ADMISSION_CAPACITY = float(os.getenv("ADMISSION_CAPACITY", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# ユーザーごとの上限。フロントエンドからのリクエストは設定されたユーザーID（1つ）で受け付けるため、
+# 既定では全体の上限と同じにする（設定した場合は webhook の事前生成などユーザーIDごとに制限できる）
+ADMISSION_USER_CONCURRENCY = int(os.getenv("ADMISSION_USER_CONCURRENCY") or math.ceil(ADMISSION_CAPACITY))
+ADMISSION_USER_QUEUE = int(os.getenv("ADMISSION_USER_QUEUE") or ADMISSION_MAX_QUEUE)
+
+admission_controller = AdmissionController(
+    capacity=ADMISSION_CAPACITY,
+    user_concurrency=ADMISSION_USER_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    user_queue=ADMISSION_USER_QUEUE,
+    max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "60")),
+)
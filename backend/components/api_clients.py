@@ -1,10 +1,53 @@
-from groq import Groq
-from toolhouse import Toolhouse
-from lingustruct import LinguStruct
+import threading
+from typing import Dict, Tuple
+from utils.lazy_import import lazy_import
 
 class APIClients:
     def __init__(self, groq_api_key: str, toolhouse_api_key: str, lingu_key: str, user_id: str):
-        self.groq = Groq(api_key=groq_api_key)
-        self.toolhouse = Toolhouse(api_key=toolhouse_api_key)
-        self.toolhouse.set_metadata('id', user_id)
-        self.lingu = LinguStruct()
\ No newline at end of file
+        # SDKの読み込みとクライアントの生成は初回使用時まで遅延する
+        self.groq_api_key = groq_api_key
+        self.toolhouse_api_key = toolhouse_api_key
+        self.lingu_key = lingu_key
+        self.user_id = user_id
+        self._groq = None
+        self._toolhouse = None
+        self._lingu = None
+        self._lock = threading.Lock()
+
+    @property
+    def groq(self):
+        with self._lock:
+            if self._groq is None:
+                self._groq = lazy_import("groq").Groq(api_key=self.groq_api_key)
+            return self._groq
+
+    @property
+    def toolhouse(self):
+        with self._lock:
+            if self._toolhouse is None:
+                self._toolhouse = lazy_import("toolhouse").Toolhouse(api_key=self.toolhouse_api_key)
+                self._toolhouse.set_metadata('id', self.user_id)
+            return self._toolhouse
+
+    @property
+    def lingu(self):
+        with self._lock:
+            if self._lingu is None:
+                self._lingu = lazy_import("lingustruct").LinguStruct()
+            return self._lingu
+
+
+_clients: Dict[Tuple[str, str, str, str], APIClients] = {}
+_clients_lock = threading.Lock()
+
+
+def get_api_clients(groq_api_key: str, toolhouse_api_key: str, lingu_key: str, user_id: str) -> APIClients:
+    """
+    APIクライアントをプロセス内で再利用します（接続プールを使い回し、リクエストごとの生成コストを避ける）。
+    """
+    key = (groq_api_key, toolhouse_api_key, lingu_key, user_id)
+    with _clients_lock:
+        clients = _clients.get(key)
+        if clients is None:
+            clients = _clients[key] = APIClients(groq_api_key, toolhouse_api_key, lingu_key, user_id)
+        return clients
@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import Optional
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+REASON_CLIENT_DISCONNECTED = "client disconnected"
+REASON_DEADLINE_EXCEEDED = "deadline exceeded"
+
+
+class OperationCancelled(BaseException):
+    """
+    キャンセルトークンによって処理が中断された場合の例外。
+    asyncio.CancelledError と同様に BaseException を継承し、各所の except Exception で握りつぶされないようにしています。
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    def __init__(self, deadline: Optional[float] = None):
+        """
+        パイプライン全体に伝播するキャンセルトークン。
+        明示的なキャンセル（クライアントの切断など）か、期限（time.monotonic() 基準）の経過でキャンセル状態になります。
+
+        :param deadline: 期限（time.monotonic() の値、None の場合は期限なし）
+        """
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def with_timeout(cls, timeout: Optional[float]) -> "CancellationToken":
+        return cls(time.monotonic() + timeout if timeout else None)
+
+    def cancel(self, reason: str = REASON_CLIENT_DISCONNECTED):
+        with self._lock:
+            if self.reason is None:
+                self.reason = reason
+                logger.info(f"Cancellation requested: {reason}")
+        self._event.set()
+
+    def extend_deadline(self, deadline: Optional[float]):
+        """期限を延長します（None は期限なし）。同じ処理を複数のリクエストが共有する場合に使用します。"""
+        with self._lock:
+            if self.deadline is not None and (deadline is None or deadline > self.deadline):
+                self.deadline = deadline
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(REASON_DEADLINE_EXCEEDED)
+            return True
+        return False
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+    def remaining(self) -> Optional[float]:
+        """期限までの残り秒数（期限なしの場合は None）。"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def timeout(self, default: Optional[float] = None) -> Optional[float]:
+        """上流呼び出しのタイムアウト値。期限までの残り時間と既定値の小さい方を返します。"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return remaining if default is None else min(default, remaining)
+
+    def sleep(self, seconds: float):
+        """指定秒数待機します。待機中にキャンセルされた場合は OperationCancelled を送出します。"""
+        remaining = self.remaining()
+        if remaining is not None and remaining < seconds:
+            self._event.wait(remaining)
+        else:
+            self._event.wait(seconds)
+        self.raise_if_cancelled()
@@ -1,70 +1,133 @@
 import ast
+import contextvars
+import hashlib
 import json
-import yaml
-from typing import Optional, List, Dict, Union
+import os
+import threading
+from typing import Any, Callable, Optional, List, Dict, Tuple, Union
 from components.api_clients import APIClients
-from utils.logger import setup_logger
+from utils.logger import capped, setup_logger
+from components.upstream_scheduler import get_scheduler
+from components.single_flight import SingleFlight
+from components.module_index import ModuleResolver
+from components.manifest_analyzer import ManifestAnalyzer, load_yaml
+from components.shared_cache import SharedCache
+from components.cancellation import CancellationToken, OperationCancelled
+from components.file_metadata import local_file_paths, local_repo_path, local_tree_sha, parse_listing, remember_listing_metadata
+from components.file_tree import cached_listing, listing_digest, remember_listing
+from concurrent.futures import ThreadPoolExecutor
 import re
 
 logger = setup_logger(__name__)
 
-class DataFetcher:
-    PYTHON_STANDARD_LIBRARIES = {
-        "os", "sys", "time", "json", "re", "logging", "collections", "datetime", "math",
-        "itertools", "functools", "pathlib", "subprocess", "uuid", "typing", "itertools"
-    }
+# 同一ファイルの同時取得を1回の上流呼び出しにまとめる（プロセス共通）
+_file_fetch_flight = SingleFlight("file-fetch")
+
+# 取得済みファイル内容のキャッシュ（(repo, branch, path) → content）
+_content_cache = SharedCache("content", ttl=float(os.getenv("CONTENT_CACHE_TTL", "300")), l1_max_entries=int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "20000")))
 
-    TYPESCRIPT_STANDARD_LIBRARIES = {
-        "fs", "path", "os", "crypto", "http", "url"
-    }
+# Toolhouseのツールスキーマのキャッシュ（APIキーごと、TTL秒）
+TOOL_SCHEMA_TTL = float(os.getenv("TOOL_SCHEMA_TTL", "600"))
+_tool_schema_cache = SharedCache("tool-schema", ttl=TOOL_SCHEMA_TTL, l1_max_entries=16)
+_tool_schema_lock = threading.Lock()
 
-    JAVASCRIPT_STANDARD_LIBRARIES = {
-        "fs", "path", "os", "crypto", "http", "url"
-    }
+# import 文の正規表現
+ES_IMPORT_PATTERN = re.compile(r'import\s+(?:.*?\s+from\s+)?[\'"]([^\'"]+)[\'"]')
 
-    def __init__(self, api_clients: APIClients):
-        self.client = api_clients.groq
-        self.toolhouse = api_clients.toolhouse
+class DataFetcher:
+    def __init__(self, api_clients: APIClients, cancel_token: Optional[CancellationToken] = None):
+        """
+        :param api_clients: APIクライアント
+        :param cancel_token: キャンセルされると、待機中・実行予定の上流呼び出しを中断する
+        """
+        self.api_clients = api_clients
+        self.cancel_token = cancel_token or CancellationToken()
+        self.toolhouse_key = api_clients.toolhouse_api_key
+        self.scheduler = get_scheduler()
+        self.batch_size = max(1, int(os.getenv("FETCH_BATCH_SIZE", "20")))
+        # このインスタンスが行ったファイル内容の取得リクエスト（バッチ）の数。予算付きの生成で使う
+        self.fetch_requests = 0
+
+    @property
+    def client(self):
+        # SDKのクライアントは上流呼び出しが必要になった時点で生成する
+        return self.api_clients.groq
+
+    @property
+    def toolhouse(self):
+        return self.api_clients.toolhouse
 
     def fetch_file_tree(self, repo_name: str, branch_name: str) -> Optional[List[Dict[str, Union[str, List]]]]:
         """
         リポジトリ内のフォルダ名とファイル名を取得し、再帰的に構造化して返します。
         """
-        try:
-            messages = [{
-                "role": "user",
-                "content": f'github_file({{"operation": "read", "path": "/"}})'
-            }]
-            
-            logger.info(f"Fetching repository file tree for repo: {repo_name}, branch: {branch_name}")
-            response = self.client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=messages,
-                tools=self.toolhouse.get_tools()
-            )
-
-            result = self.toolhouse.run_tools(response)
-            
-            if not result or not any(item['role'] == 'tool' for item in result):
-                raise ValueError("Toolhouse returned an invalid or empty response.")
-            
-            tool_response = next(item for item in result if item['role'] == 'tool')
-            logger.debug(f"Tool response content: {tool_response['content']}")
+        listing = self.fetch_file_listing(repo_name, branch_name)
+        if listing is None:
+            return None
+        return self.build_file_tree(listing[1])
 
-            # フラットなパスリストを作成
-            file_paths = [line.strip().split()[0] for line in tool_response['content'].splitlines() if line.strip()]
-            logger.debug(f"Extracted file paths: {file_paths}")
+    def fetch_file_listing(self, repo_name: str, branch_name: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        ブランチのファイルパスの一覧を、ツリーのSHAとともに返します。
+        ローカルのクローンがあれば git から、なければ Toolhouse から取得し、ブランチごとにキャッシュします。
+        Toolhouse からはツリーのSHAが得られないため、一覧の内容のハッシュを代わりに使います。
 
-            # ファイルパスからツリー構造を構築
-            file_tree = self.build_file_tree(file_paths)
+        :return: (ツリーのSHA, ファイルパスのリスト)。取得できない場合は None
+        """
+        try:
+            repo_path = local_repo_path(repo_name)
+            if repo_path is not None:
+                tree_sha = local_tree_sha(repo_path, branch_name)
+                cached = cached_listing(repo_name, branch_name)
+                if cached is not None and cached["tree_sha"] == tree_sha:
+                    return tree_sha, cached["paths"]
+                file_paths = local_file_paths(repo_path, branch_name)
+            else:
+                cached = cached_listing(repo_name, branch_name)
+                if cached is not None:
+                    logger.debug("Using cached file listing for %s@%s", repo_name, branch_name)
+                    return cached["tree_sha"], cached["paths"]
+                file_paths, _ = self._fetch_remote_listing(repo_name, branch_name)
+                tree_sha = listing_digest(file_paths)
 
-            logger.info("Successfully fetched and structured repository file tree")
-            return file_tree
+            remember_listing(repo_name, branch_name, tree_sha, file_paths)
+            logger.info("Fetched file listing for %s@%s: %d files (tree %s)", repo_name, branch_name, len(file_paths), tree_sha)
+            return tree_sha, file_paths
 
         except Exception as e:
             logger.error(f"Error fetching repository file tree: {e}", exc_info=True)
             return None
 
+    def fetch_listing_metadata(self, repo_name: str, branch_name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Toolhouse からファイル一覧を取得し直し、一覧の列から読み取ったメタデータを返します。
+        保存済みのメタデータが期限切れの場合に、設計書の生成から呼び出します（一覧のキャッシュも更新する）。
+        """
+        file_paths, file_metadata = self._fetch_remote_listing(repo_name, branch_name)
+        remember_listing(repo_name, branch_name, listing_digest(file_paths), file_paths)
+        return file_metadata
+
+    def _fetch_remote_listing(self, repo_name: str, branch_name: str) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+        messages = [{
+            "role": "user",
+            "content": f'github_file({{"operation": "read", "path": "/"}})'
+        }]
+
+        logger.info(f"Fetching repository file tree for repo: {repo_name}, branch: {branch_name}")
+        result = self._run_tool_completion(messages)
+
+        if not result or not any(item['role'] == 'tool' for item in result):
+            raise ValueError("Toolhouse returned an invalid or empty response.")
+
+        tool_response = next(item for item in result if item['role'] == 'tool')
+        logger.debug("Tool response content: %s", capped(tool_response['content']))
+
+        # フラットなパスリストを作成（パスに続く列のサイズ・更新日時は設計書の生成用に保存する）
+        file_paths, file_metadata = parse_listing(tool_response['content'])
+        remember_listing_metadata(repo_name, branch_name, file_metadata)
+        logger.debug("Extracted %d file paths: %s", len(file_paths), capped(file_paths))
+        return file_paths, file_metadata
+
     def build_file_tree(self, file_paths: List[str]) -> List[Dict[str, Union[str, List]]]:
         """
         フラットなファイルパスのリストからディレクトリツリーを構築します。
@@ -101,77 +164,262 @@ class DataFetcher:
 
         return dict_to_list(tree)
 
-    def fetch_files_content(self, repo_name: str, branch_name: str, file_paths: List[str]) -> Dict[str, str]:
+    def fetch_files_content(self, repo_name: str, branch_name: str, file_paths: List[str], populate_cache: bool = True,
+                            on_batch: Optional[Callable[[Dict[str, str]], None]] = None) -> Dict[str, str]:
         """
         選択された複数のファイルの内容を取得します。
+
+        :param populate_cache: 取得した内容をキャッシュに保存するか（アウトオブコアモードでは保存しない）
+        :param on_batch: 上流から取得したバッチごとに呼び出すコールバック（チェックポイントの保存など）
         """
         if not file_paths:
             logger.warning("No file paths provided for fetching content.")
             return {}
 
-        file_contents = {}
-        for file_path in file_paths:
-            try:
-                messages = [{
-                    "role": "user",
-                    "content": f'github_file({{"operation": "read", "path": "{file_path}"}})'
-                }]
-                logger.info(f"Fetching content of file: {file_path}")
-                
-                response = self.client.chat.completions.create(
-                    model="llama3-70b-8192",
-                    messages=messages,
-                    tools=self.toolhouse.get_tools()
-                )
-
-                result = self.toolhouse.run_tools(response)
-                if not result or not any(item['role'] == 'tool' for item in result):
-                    raise ValueError(f"Toolhouse returned an invalid or empty response for file: {file_path}")
-
-                tool_response = next(item for item in result if item['role'] == 'tool')
-                content = tool_response.get('content', '').strip()
-                
-                if not content:
-                    logger.warning(f"Content for {file_path} is empty. Skipping.")
-                    continue
-                
-                file_contents[file_path] = content
-                logger.info(f"Successfully fetched content of file: {file_path}")
+        # キャッシュ済みの内容は上流に問い合わせない
+        cached = _content_cache.get_many((repo_name, branch_name, file_path) for file_path in file_paths)
+        file_contents = {key[2]: content for key, content in cached.items()}
+        missing = [file_path for file_path in file_paths if file_path not in file_contents]
+        if not missing:
+            logger.info(f"All {len(file_paths)} files served from content cache.")
+            return file_contents
 
-            except ValueError as ve:
-                logger.error(f"Validation error for file: {file_path}: {ve}")
-            except Exception as e:
-                logger.error(f"Error fetching content of file: {file_path}: {e}", exc_info=True)
+        # バッチに分割し、1回のLLM呼び出しで複数ファイルを読み込む（batch_size=1 で従来の1ファイルずつの取得）
+        batches = [tuple(missing[i:i + self.batch_size]) for i in range(0, len(missing), self.batch_size)]
+        self.fetch_requests += len(batches)
+        max_workers = min(len(batches), self.scheduler.max_concurrency("groq"))
+        # ワーカースレッドでもリクエストID・実行IDがログに付くよう、呼び出し元のコンテキストで実行する
+        contexts = [contextvars.copy_context() for _ in batches]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda context, batch: context.run(self._fetch_batch_coalesced, repo_name, branch_name, batch),
+                contexts, batches
+            )
+            for batch_contents in results:
+                file_contents.update(batch_contents)
+                if on_batch is not None and batch_contents:
+                    on_batch(batch_contents)
+                if populate_cache:
+                    _content_cache.set_many({
+                        (repo_name, branch_name, file_path): content for file_path, content in batch_contents.items()
+                    })
 
         if not file_contents:
             logger.warning("No file contents were successfully fetched.")
         return file_contents
 
-    def analyze_dependencies(self, file_contents: Dict[str, str]) -> Dict[str, Dict[str, List[str]]]:
+    @staticmethod
+    def cached_contents(repo_name: str, branch_name: str, file_paths: List[str]) -> Dict[str, str]:
+        """
+        キャッシュ済みのファイル内容だけを返します（上流への呼び出しは行いません）。
+        """
+        cached = _content_cache.get_many((repo_name, branch_name, file_path) for file_path in file_paths)
+        return {key[2]: content for key, content in cached.items()}
+
+    @staticmethod
+    def invalidate_cached_content(repo_name: str, branch_name: str, file_paths: List[str]) -> None:
+        """
+        指定したファイルのキャッシュ済み内容を破棄します。
+        """
+        for file_path in file_paths:
+            _content_cache.delete((repo_name, branch_name, file_path))
+
+    def _fetch_batch_coalesced(self, repo_name: str, branch_name: str, file_paths: Tuple[str, ...]) -> Dict[str, str]:
+        """
+        ファイルの同時取得をパスごとに1回にまとめます。他のリクエストが取得中でないパスだけで上流へのバッチを作り、
+        取得中のパスはその結果を待ちます。共有していた先行リクエストがキャンセルされた場合は、
+        自身がキャンセルされていない限りそのパスを取得し直します。
+        """
+        def fetch_owned(keys: Tuple[Tuple[str, str, str], ...]) -> Dict[Tuple[str, str, str], str]:
+            contents = self._fetch_batch(tuple(key[2] for key in keys))
+            return {(repo_name, branch_name, file_path): content for file_path, content in contents.items()}
+
+        file_contents: Dict[str, str] = {}
+        pending = file_paths
+        while pending:
+            results, errors = _file_fetch_flight.do_many(
+                ((repo_name, branch_name, file_path) for file_path in pending), fetch_owned
+            )
+            file_contents.update((key[2], content) for key, content in results.items())
+            for error in errors.values():
+                if not isinstance(error, OperationCancelled) or self.cancel_token.cancelled:
+                    raise error
+            pending = tuple(key[2] for key in errors)
+            if pending:
+                logger.info(f"Coalesced fetch was cancelled by another request; retrying {len(pending)} files.")
+        return file_contents
+
+    def _fetch_batch(self, file_paths: Tuple[str, ...]) -> Dict[str, str]:
+        """
+        複数ファイルの github_file 読み込みを1回の補完（並列ツール呼び出し）で要求し、結果をパスごとに振り分けます。
+        取得できなかったファイルは1ファイルずつの取得にフォールバックします。
+        """
+        if len(file_paths) == 1:
+            content = self._fetch_single_file(file_paths[0])
+            return {file_paths[0]: content} if content else {}
+
+        contents: Dict[str, str] = {}
+        try:
+            calls = "\n".join(
+                f'github_file({{"operation": "read", "path": "{file_path}"}})' for file_path in file_paths
+            )
+            messages = [{
+                "role": "user",
+                "content": f"Call all of the following tools in parallel, one tool call per line:\n{calls}"
+            }]
+            logger.info(f"Fetching content of {len(file_paths)} files in one batch")
+
+            response = self._create_tool_completion(messages)
+            result = self.scheduler.call("toolhouse", self.toolhouse.run_tools, response, cancel_token=self.cancel_token)
+            call_paths = self._tool_call_paths(response)
+
+            for item in result or []:
+                if item.get('role') != 'tool':
+                    continue
+                file_path = call_paths.get(item.get('tool_call_id'))
+                content = (item.get('content') or '').strip()
+                if file_path in file_paths and content:
+                    contents[file_path] = content
+        except Exception as e:
+            logger.error(f"Error fetching batch of {len(file_paths)} files, falling back to per-file reads: {e}", exc_info=True)
+
+        missing = [file_path for file_path in file_paths if file_path not in contents]
+        if missing:
+            logger.warning(f"Batch read returned {len(contents)}/{len(file_paths)} files; fetching {len(missing)} individually.")
+            for file_path in missing:
+                content = self._fetch_single_file(file_path)
+                if content:
+                    contents[file_path] = content
+        return contents
+
+    @staticmethod
+    def _tool_call_paths(response: Any) -> Dict[str, str]:
+        """
+        補完レスポンスのツール呼び出しIDから、読み込み対象のパスへの対応表を作成します。
+        """
+        call_paths = {}
+        try:
+            tool_calls = response.choices[0].message.tool_calls or []
+        except (AttributeError, IndexError):
+            return call_paths
+        for tool_call in tool_calls:
+            try:
+                arguments = json.loads(tool_call.function.arguments)
+                call_paths[tool_call.id] = arguments.get("path")
+            except (AttributeError, TypeError, ValueError):
+                continue
+        return call_paths
+
+    def _fetch_single_file(self, file_path: str) -> Optional[str]:
+        """
+        単一ファイルの内容を取得します。失敗した場合はNoneを返します。
+        """
+        try:
+            messages = [{
+                "role": "user",
+                "content": f'github_file({{"operation": "read", "path": "{file_path}"}})'
+            }]
+            logger.debug("Fetching content of file: %s", file_path)
+
+            result = self._run_tool_completion(messages)
+            if not result or not any(item['role'] == 'tool' for item in result):
+                raise ValueError(f"Toolhouse returned an invalid or empty response for file: {file_path}")
+
+            tool_response = next(item for item in result if item['role'] == 'tool')
+            content = tool_response.get('content', '').strip()
+
+            if not content:
+                logger.warning(f"Content for {file_path} is empty. Skipping.")
+                return None
+
+            logger.debug("Successfully fetched content of file: %s", file_path)
+            return content
+
+        except ValueError as ve:
+            logger.error(f"Validation error for file: {file_path}: {ve}")
+        except Exception as e:
+            logger.error(f"Error fetching content of file: {file_path}: {e}", exc_info=True)
+        return None
+
+    def _run_tool_completion(self, messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Groqでツール呼び出しを生成し、Toolhouseで実行します。
+        どちらの呼び出しもスケジューラー経由でレート制限・リトライされます。
+        """
+        response = self._create_tool_completion(messages)
+        return self.scheduler.call("toolhouse", self.toolhouse.run_tools, response, cancel_token=self.cancel_token)
+
+    def _create_tool_completion(self, messages: List[Dict[str, str]]) -> Any:
+        options = {}
+        # 期限が設定されている場合は、実行中の呼び出しも期限までに打ち切る
+        timeout = self.cancel_token.timeout()
+        if timeout is not None:
+            options["timeout"] = timeout
+        return self.scheduler.call(
+            "groq",
+            self.client.chat.completions.create,
+            model="llama3-70b-8192",
+            messages=messages,
+            tools=self._get_tools(),
+            cancel_token=self.cancel_token,
+            **options
+        )
+
+    def _get_tools(self) -> List[Dict[str, Any]]:
+        """
+        Toolhouseのツールスキーマを返します。スキーマはワーカー間で共有され、TTLの間キャッシュされます。
+        """
+        # APIキーそのものは共有キャッシュのキーに含めない
+        cache_key = hashlib.sha256(self.toolhouse_key.encode("utf-8")).hexdigest()[:16]
+        with _tool_schema_lock:
+            cached = _tool_schema_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            tools = self.scheduler.call("toolhouse", self.toolhouse.get_tools, cancel_token=self.cancel_token)
+            _tool_schema_cache.set(cache_key, tools)
+            logger.debug("Toolhouse tool schemas fetched and cached.")
+            return tools
+
+    def analyze_dependencies(self, file_contents: Dict[str, str], resolver: Optional[ModuleResolver] = None) -> Dict[str, Dict[str, Any]]:
         """
         ファイル間の依存関係を解析し、分類
         """
+        # 選択範囲のパスとマニフェストから分類器を1回だけ構築する
+        resolver = resolver or ModuleResolver.from_selection(file_contents)
         dependencies = {}
         for file_path, content in file_contents.items():
-            if file_path.endswith(".py"):
-                dependencies[file_path] = self._analyze_python_dependencies(content)
-            elif file_path.endswith((".ts", ".tsx")):
-                dependencies[file_path] = self._analyze_typescript_dependencies(content)
-            elif file_path.endswith((".js", ".jsx")):
-                dependencies[file_path] = self._analyze_javascript_dependencies(content)
-            elif file_path.endswith((".json", ".yaml", ".yml")):
-                dependencies[file_path] = self._analyze_json_yaml_dependencies(content)
-            else:
-                dependencies[file_path] = {
-                    "standard_libraries": [],
-                    "external_libraries": [],
-                    "custom_modules": [],
-                    "dependencies": []
-                }
-        logger.debug(f"Dependencies: {dependencies}")
+            dependencies[file_path] = self.analyze_file_dependencies(file_path, content, resolver)
+        logger.debug("Dependencies of %d files: %s", len(dependencies), capped(dependencies))
         return dependencies
 
-    def _analyze_python_dependencies(self, content: str) -> Dict[str, List[str]]:
+    def analyze_file_dependencies(self, file_path: str, content: str, resolver: ModuleResolver) -> Dict[str, Any]:
+        """
+        単一ファイルの依存関係を解析し、分類
+        """
+        if file_path in resolver.manifests:
+            manifest = resolver.manifests[file_path]
+        else:
+            manifest = ManifestAnalyzer.analyze(file_path, content)
+        if manifest:
+            return self._manifest_dependencies(manifest)
+        if file_path.endswith(".py"):
+            return self._analyze_python_dependencies(content, resolver)
+        elif file_path.endswith((".ts", ".tsx")):
+            return self._analyze_typescript_dependencies(content, resolver)
+        elif file_path.endswith((".js", ".jsx")):
+            return self._analyze_javascript_dependencies(content, resolver)
+        elif file_path.endswith(".json"):
+            return self._analyze_json_yaml_dependencies(content, is_json=True)
+        elif file_path.endswith((".yaml", ".yml")):
+            return self._analyze_json_yaml_dependencies(content)
+        return {
+            "standard_libraries": [],
+            "external_libraries": [],
+            "custom_modules": [],
+            "dependencies": []
+        }
+
+    def _analyze_python_dependencies(self, content: str, resolver: ModuleResolver) -> Dict[str, List[str]]:
         """
         Pythonファイルの依存関係を分類
         """
@@ -185,12 +433,17 @@ class DataFetcher:
                 if isinstance(node, ast.Import):
                     for alias in node.names:
                         module_name = alias.name.split('.')[0]
-                        self._classify_dependency(module_name, standard_libraries, external_libraries, custom_modules)
+                        self._classify_dependency(resolver.classify_python(module_name), module_name, standard_libraries, external_libraries, custom_modules)
                         dependencies.append(module_name)
                 elif isinstance(node, ast.ImportFrom):
-                    if node.module:
+                    if node.level > 0:
+                        # 相対インポートは常にリポジトリ内のモジュール
+                        module_name = "." * node.level + (node.module or "")
+                        custom_modules.append(module_name)
+                        dependencies.append(module_name)
+                    elif node.module:
                         module_name = node.module.split('.')[0]
-                        self._classify_dependency(module_name, standard_libraries, external_libraries, custom_modules)
+                        self._classify_dependency(resolver.classify_python(module_name), module_name, standard_libraries, external_libraries, custom_modules)
                         dependencies.append(module_name)
             return {
                 "standard_libraries": sorted(list(set(standard_libraries))),
@@ -207,32 +460,12 @@ class DataFetcher:
                 "dependencies": []
             }
 
-    def _analyze_typescript_dependencies(self, content: str) -> Dict[str, List[str]]:
+    def _analyze_typescript_dependencies(self, content: str, resolver: ModuleResolver) -> Dict[str, List[str]]:
         """
         TypeScriptファイルの依存関係を分類
         """
         try:
-            # import 文の正規表現
-            import_pattern = re.compile(r'import\s+(?:.*?\s+from\s+)?[\'"]([^\'"]+)[\'"]')
-            imports = import_pattern.findall(content)
-            standard_libraries = []
-            external_libraries = []
-            custom_modules = []
-            dependencies = []
-            for module in imports:
-                if module in self.TYPESCRIPT_STANDARD_LIBRARIES:
-                    standard_libraries.append(module)
-                elif module.startswith('.') or module.startswith('/'):
-                    custom_modules.append(module)
-                else:
-                    external_libraries.append(module)
-                dependencies.append(module)
-            return {
-                "standard_libraries": sorted(list(set(standard_libraries))),
-                "external_libraries": sorted(list(set(external_libraries))),
-                "custom_modules": sorted(list(set(custom_modules))),
-                "dependencies": sorted(list(set(dependencies)))
-            }
+            return self._analyze_es_module_dependencies(content, resolver)
         except Exception as e:
             logger.error(f"Error analyzing TypeScript dependencies: {e}")
             return {
@@ -242,32 +475,12 @@ class DataFetcher:
                 "dependencies": []
             }
 
-    def _analyze_javascript_dependencies(self, content: str) -> Dict[str, List[str]]:
+    def _analyze_javascript_dependencies(self, content: str, resolver: ModuleResolver) -> Dict[str, List[str]]:
         """
         JavaScriptファイルの依存関係を分類
         """
         try:
-            # import 文の正規表現
-            import_pattern = re.compile(r'import\s+(?:.*?\s+from\s+)?[\'"]([^\'"]+)[\'"]')
-            imports = import_pattern.findall(content)
-            standard_libraries = []
-            external_libraries = []
-            custom_modules = []
-            dependencies = []
-            for module in imports:
-                if module in self.JAVASCRIPT_STANDARD_LIBRARIES:
-                    standard_libraries.append(module)
-                elif module.startswith('.') or module.startswith('/'):
-                    custom_modules.append(module)
-                else:
-                    external_libraries.append(module)
-                dependencies.append(module)
-            return {
-                "standard_libraries": sorted(list(set(standard_libraries))),
-                "external_libraries": sorted(list(set(external_libraries))),
-                "custom_modules": sorted(list(set(custom_modules))),
-                "dependencies": sorted(list(set(dependencies)))
-            }
+            return self._analyze_es_module_dependencies(content, resolver)
         except Exception as e:
             logger.error(f"Error analyzing JavaScript dependencies: {e}")
             return {
@@ -277,27 +490,45 @@ class DataFetcher:
                 "dependencies": []
             }
 
-    def _analyze_json_yaml_dependencies(self, content: str) -> Dict[str, List[str]]:
+    def _analyze_es_module_dependencies(self, content: str, resolver: ModuleResolver) -> Dict[str, List[str]]:
+        """
+        TypeScript/JavaScriptのimport文を抽出して分類
+        """
+        imports = ES_IMPORT_PATTERN.findall(content)
+        standard_libraries = []
+        external_libraries = []
+        custom_modules = []
+        dependencies = []
+        for module in imports:
+            self._classify_dependency(resolver.classify_node(module), module, standard_libraries, external_libraries, custom_modules)
+            dependencies.append(module)
+        return {
+            "standard_libraries": sorted(list(set(standard_libraries))),
+            "external_libraries": sorted(list(set(external_libraries))),
+            "custom_modules": sorted(list(set(custom_modules))),
+            "dependencies": sorted(list(set(dependencies)))
+        }
+
+    def _analyze_json_yaml_dependencies(self, content: str, is_json: bool = False) -> Dict[str, List[str]]:
         """
         JSONやYAMLファイルの依存関係を解析
         """
         try:
-            data = yaml.safe_load(content)
+            # JSONはjsonモジュールで高速に読み、YAMLはCローダーを優先する
+            data = json.loads(content) if is_json else load_yaml(content)
             dependencies = []
             if isinstance(data, dict):
-                # 依存関係を定義しているフィールドを抽出
-                dependencies = data.get("dependencies", [])
-                if isinstance(dependencies, list):
-                    dependencies = [dep for dep in dependencies if isinstance(dep, str)]
-                else:
-                    dependencies = []
+                # 依存関係を定義しているフィールドを抽出（リスト形式と辞書形式の両方に対応）
+                declared = data.get("dependencies", [])
+                if isinstance(declared, (dict, list)):
+                    dependencies = [dep for dep in declared if isinstance(dep, str)]
             return {
                 "standard_libraries": [],
                 "external_libraries": [],
                 "custom_modules": [],
                 "dependencies": sorted(list(set(dependencies)))
             }
-        except yaml.YAMLError:
+        except ValueError:  # json.JSONDecodeError / YamlError
             logger.warning("Invalid YAML/JSON content.")
         except Exception as e:
             logger.error(f"Error analyzing JSON/YAML dependencies: {e}")
@@ -308,15 +539,30 @@ class DataFetcher:
             "dependencies": []
         }
 
-    def _classify_dependency(self, module_name: str, std_libs: List[str], ext_libs: List[str], custom_mods: List[str]):
+    def _manifest_dependencies(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        マニフェストの解析結果を依存関係の形式に変換します。
+        宣言済みの依存関係は外部ライブラリとして扱い、ロックファイルの解決済みバージョンは resolved に保持します。
+        """
+        declared = manifest["declared"]
+        return {
+            "standard_libraries": [],
+            "external_libraries": sorted(declared),
+            "custom_modules": [],
+            "dependencies": sorted(declared),
+            "manifest_type": manifest["manifest_type"],
+            "ecosystem": manifest["ecosystem"],
+            "declared": declared,
+            "resolved": manifest["resolved"]
+        }
+
+    def _classify_dependency(self, kind: str, module_name: str, std_libs: List[str], ext_libs: List[str], custom_mods: List[str]):
         """
         依存関係を分類
         """
-        if module_name in self.PYTHON_STANDARD_LIBRARIES:
-            std_libs.append(module_name)
-        elif module_name in self.TYPESCRIPT_STANDARD_LIBRARIES or module_name in self.JAVASCRIPT_STANDARD_LIBRARIES:
+        if kind == "standard":
             std_libs.append(module_name)
-        elif module_name in {"dotenv", "fastapi", "requests", "psycopg2", "react", "next"}:
+        elif kind == "external":
             ext_libs.append(module_name)
         else:
             custom_mods.append(module_name)
@@ -0,0 +1,179 @@
+from array import array
+from collections import Counter
+from itertools import compress
+from typing import Any, Dict, List, Set, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 依存関係の種類（kind 列の値）
+KIND_STANDARD = 0
+KIND_EXTERNAL = 1
+KIND_CUSTOM = 2
+KIND_DEPENDENCY = 3
+
+KIND_TO_KEY = {
+    KIND_STANDARD: "standard_libraries",
+    KIND_EXTERNAL: "external_libraries",
+    KIND_CUSTOM: "custom_modules",
+    KIND_DEPENDENCY: "dependencies",
+}
+
+MANIFEST_KEYS = ("manifest_type", "ecosystem", "declared", "resolved")
+
+# kind 列（1行1バイト）を bytes.translate で一括変換し、指定した種類の行だけが 1 のマスクにするための変換表
+_MASK_TABLES = {kind: bytes(1 if value == kind else 0 for value in range(256)) for kind in KIND_TO_KEY}
+
+# 正規化したライブラリ名からフレームワーク表示名へのマッピング
+KNOWN_FRAMEWORKS = {
+    "fastapi": "FastAPI",
+    "django": "Django",
+    "flask": "Flask",
+    "react": "React",
+    "next": "Next.js",
+    "vue": "Vue",
+    "@angular/core": "Angular",
+    "express": "Express",
+    "svelte": "Svelte",
+    "actix-web": "Actix Web",
+    "axum": "Axum",
+    "github.com/gin-gonic/gin": "Gin",
+}
+
+
+class DependencyTable:
+    def __init__(self):
+        """
+        ファイルごとの依存関係を列指向で保持するテーブル。
+        ライブラリ名はIDにインターンされ、(file_id, lib_id, kind) の3本の配列に格納されます。
+        各ファイルの行は連続して追加されるため、file_offsets で範囲を引けます。
+        """
+        self.files: List[str] = []
+        self.lib_names: List[str] = []
+        self.lib_ids_by_name: Dict[str, int] = {}
+        self.file_ids = array("I")
+        self.lib_ids = array("I")
+        self.kinds = array("B")
+        self.file_offsets = array("I", [0])
+        # マニフェストから得た宣言済み・解決済みバージョン（file_id → 情報）
+        self.manifests: Dict[int, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_dependencies(cls, dependencies: Dict[str, Dict[str, List[str]]]) -> "DependencyTable":
+        """
+        DataFetcher.analyze_dependencies の結果からテーブルを構築します。
+        """
+        table = cls()
+        for file_path, deps in dependencies.items():
+            table.add_file(file_path, deps)
+        logger.debug("Built dependency table: %d files, %d libraries, %d rows.", len(table.files), len(table.lib_names), len(table.lib_ids))
+        return table
+
+    def intern(self, name: str) -> int:
+        lib_id = self.lib_ids_by_name.get(name)
+        if lib_id is None:
+            lib_id = len(self.lib_names)
+            self.lib_names.append(name)
+            self.lib_ids_by_name[name] = lib_id
+        return lib_id
+
+    def add_file(self, file_path: str, deps: Dict[str, List[str]]) -> None:
+        file_id = len(self.files)
+        self.files.append(file_path)
+        intern = self.intern
+        for kind, key in KIND_TO_KEY.items():
+            names = deps.get(key) or []
+            self.lib_ids.extend(intern(name) for name in names)
+            self.kinds.extend([kind] * len(names))
+            self.file_ids.extend([file_id] * len(names))
+        self.file_offsets.append(len(self.lib_ids))
+        if "manifest_type" in deps:
+            self.manifests[file_id] = {key: deps[key] for key in MANIFEST_KEYS if key in deps}
+
+    def _mask(self, kind: int) -> bytes:
+        """指定した種類の行が 1、それ以外が 0 のマスク（Python のループを使わず C で一括変換する）"""
+        return self.kinds.tobytes().translate(_MASK_TABLES[kind])
+
+    def distinct(self, kind: int) -> Set[str]:
+        """指定した種類のライブラリ名の集合を返します。"""
+        names = self.lib_names
+        return {names[lib_id] for lib_id in set(compress(self.lib_ids, self._mask(kind)))}
+
+    def usage_counts(self, kind: int) -> Counter:
+        """指定した種類のライブラリごとの使用ファイル数を返します。"""
+        names = self.lib_names
+        counts = Counter(compress(self.lib_ids, self._mask(kind)))
+        return Counter({names[lib_id]: count for lib_id, count in counts.items()})
+
+    def top_n(self, kind: int, n: int = 10) -> List[Tuple[str, int]]:
+        """使用ファイル数の多い順に上位n件を返します。"""
+        return self.usage_counts(kind).most_common(n)
+
+    def frameworks(self, kinds: Tuple[int, ...] = (KIND_EXTERNAL,)) -> Dict[str, str]:
+        """
+        既知のフレームワークに該当するライブラリ名とその表示名を返します。
+        外部ライブラリには、ロックファイルだけが選択されたエコシステムの解決済みパッケージも含めます。
+        """
+        found = set()
+        for kind in kinds:
+            found |= self.distinct(kind)
+        if KIND_EXTERNAL in kinds:
+            found |= self.lockfile_packages()
+        return {name: KNOWN_FRAMEWORKS[name.lower()] for name in found if name.lower() in KNOWN_FRAMEWORKS}
+
+    def _manifest_versions(self) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
+        """エコシステムごとの (宣言済みのバージョン, ロックファイルで解決済みのバージョン)"""
+        declared: Dict[str, Dict[str, str]] = {}
+        resolved: Dict[str, Dict[str, str]] = {}
+        for manifest in self.manifests.values():
+            ecosystem = manifest.get("ecosystem", "unknown")
+            declared.setdefault(ecosystem, {}).update(manifest.get("declared", {}))
+            resolved.setdefault(ecosystem, {}).update(manifest.get("resolved", {}))
+        return declared, resolved
+
+    def declared_versions(self) -> Dict[str, Dict[str, str]]:
+        """
+        エコシステムごとに、マニフェストで宣言された依存関係とそのバージョンを返します。
+        ロックファイルで解決済みのバージョンがあればそちらを優先します。
+        宣言するマニフェストが選択されていないエコシステムは、ロックファイルの解決済みパッケージをそのまま返します。
+        """
+        declared, resolved = self._manifest_versions()
+        versions = {
+            ecosystem: {name: resolved.get(ecosystem, {}).get(name, spec) for name, spec in sorted(packages.items())}
+            for ecosystem, packages in declared.items() if packages
+        }
+        for ecosystem, packages in resolved.items():
+            if packages and ecosystem not in versions:
+                versions[ecosystem] = dict(sorted(packages.items()))
+        return versions
+
+    def resolved_versions(self) -> Dict[str, str]:
+        """ロックファイルで解決済みのパッケージのバージョン（全エコシステム）"""
+        _, resolved = self._manifest_versions()
+        versions: Dict[str, str] = {}
+        for packages in resolved.values():
+            versions.update(packages)
+        return versions
+
+    def lockfile_packages(self) -> Set[str]:
+        """
+        宣言するマニフェストが選択されていないエコシステムで、ロックファイルから解決されたパッケージ。
+        マニフェストがある場合は、推移的な依存関係を含むロックファイルの一覧ではなく宣言済みの依存関係を使う。
+        """
+        declared, resolved = self._manifest_versions()
+        return {name for ecosystem, packages in resolved.items() if not declared.get(ecosystem) for name in packages}
+
+    def file_rows(self, file_index: int) -> Dict[str, List[str]]:
+        """1ファイル分の依存関係を元の辞書形式で返します。"""
+        start, end = self.file_offsets[file_index], self.file_offsets[file_index + 1]
+        names = self.lib_names
+        result = {key: [] for key in KIND_TO_KEY.values()}
+        for lib_id, kind in zip(self.lib_ids[start:end], self.kinds[start:end]):
+            result[KIND_TO_KEY[kind]].append(names[lib_id])
+        result.update(self.manifests.get(file_index, {}))
+        return result
+
+    def to_dep_tree(self) -> Dict[str, Dict[str, List[str]]]:
+        """ファイルパスをキーとした依存関係ツリーを返します。"""
+        return {file_path: self.file_rows(index) for index, file_path in enumerate(self.files)}
+
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+from components.ttl_cache import TTLCache
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# パイプラインの出力形式を変更した場合はインクリメントする
+PIPELINE_VERSION = 3
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def compute_fingerprint(repo_name: str, branch_name: str, commit_sha: Optional[str], file_hashes: Dict[str, str],
+                        key_mapping_version: str, template_versions: Dict[str, str]) -> str:
+    """
+    設計書の入力を一意に表すフィンガープリントを計算します。
+    いずれかの入力（ファイル内容、キーマッピング、テンプレートのバージョンなど）が変われば値も変わります。
+    """
+    payload = {
+        "pipeline_version": PIPELINE_VERSION,
+        "repo": repo_name,
+        "branch": branch_name,
+        "commit": commit_sha,
+        "files": sorted(file_hashes.items()),
+        "key_mapping_version": key_mapping_version,
+        "template_versions": sorted(template_versions.items()),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def etag_for(fingerprint: str) -> str:
+    return f'"{fingerprint}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match ヘッダーが指定のETagに一致するか判定します（弱いETagと * に対応）。"""
+    if not if_none_match:
+        return False
+    candidates: List[str] = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag == "*" or tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# 設計書のうち、ページ単位で取得できるモジュールの一覧のキー
+MODULES_KEY = "modules"
+
+
+def module_key(module: Dict[str, Any]) -> str:
+    """モジュールを一意に表すキー。ファイルごとのモジュールは "ID:パス"、それ以外はモジュールID。"""
+    file_path = module.get("file_path")
+    return f"{module.get('id')}:{file_path}" if file_path else str(module.get("id"))
+
+
+def parse_json_pointer(pointer: str) -> List[str]:
+    """RFC 6901 の JSON Pointer をトークンの一覧に分解します。"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer: {pointer}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def resolve_tokens(value: Any, tokens: List[str]) -> Any:
+    """JSON Pointer のトークンを順に辿ります。存在しない場合は KeyError を送出します。"""
+    for token in tokens:
+        if isinstance(value, dict):
+            value = value[token]
+        elif isinstance(value, list):
+            if not token.isdigit():
+                raise KeyError(token)
+            value = value[int(token)]
+        else:
+            raise KeyError(token)
+    return value
+
+
+class DocumentCache:
+    def __init__(self, base_dir: Optional[str] = None):
+        """
+        生成済みの設計書をフィンガープリント（ドキュメントID）をキーとしてディスクに保存します。
+        モジュールは1行1モジュールのファイルに、その他の項目は別のファイルに分けて保存し、
+        モジュールごとの位置を索引に記録します。1つのモジュールやモジュールの一部のページだけを、
+        設計書全体を読み込まずに取り出せます。
+
+        :param base_dir: 保存先ディレクトリ（既定は環境変数 DOCUMENT_CACHE_DIR または document_cache）
+        """
+        self.base_dir = base_dir or os.getenv("DOCUMENT_CACHE_DIR", "document_cache")
+        os.makedirs(self.base_dir, exist_ok=True)  # ディレクトリを自動作成
+        # 保存済みの設計書は変更されないため、索引はプロセス内でキャッシュできる
+        self._indexes = TTLCache(ttl=3600, max_entries=256)
+
+    def _dir(self, fingerprint: str) -> str:
+        return os.path.join(self.base_dir, fingerprint[:2], fingerprint)
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """フィンガープリントに対応する設計書を読み込みます。存在しない場合はNoneを返します。"""
+        skeleton = self.skeleton(fingerprint)
+        if skeleton is None:
+            return None
+        index = self.index(fingerprint)
+        modules = self.read_modules(fingerprint, index)
+        if modules is None:
+            return None
+        document = dict(skeleton)
+        document[MODULES_KEY] = modules
+        return document
+
+    def put(self, fingerprint: str, document: Dict[str, Any]) -> None:
+        """
+        設計書を保存します。一時ディレクトリに書き込んでから名前を変更するため、読み込み側が途中の状態を見ることはありません。
+        """
+        directory = self._dir(fingerprint)
+        if os.path.isdir(directory):
+            return  # 同じフィンガープリントの設計書は同じ内容
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        tmp_dir = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            index = []
+            with open(os.path.join(tmp_dir, "modules.jsonl"), "wb") as file:
+                for module in document.get(MODULES_KEY, []):
+                    line = json.dumps(module, ensure_ascii=False).encode("utf-8") + b"\n"
+                    index.append({
+                        "key": module_key(module),
+                        "id": module.get("id"),
+                        "name": module.get("name"),
+                        "category": module.get("category"),
+                        "file_path": module.get("file_path"),
+                        "offset": file.tell(),
+                        "length": len(line),
+                    })
+                    file.write(line)
+            skeleton = {key: value for key, value in document.items() if key != MODULES_KEY}
+            with open(os.path.join(tmp_dir, "document.json"), "w", encoding="utf-8") as file:
+                json.dump(skeleton, file, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, "index.json"), "w", encoding="utf-8") as file:
+                json.dump(index, file, ensure_ascii=False)
+            os.rename(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
+            return  # 他のワーカーが先に保存した
+        logger.debug("Stored document %s in cache.", fingerprint)
+
+    def contains(self, fingerprint: str) -> bool:
+        return os.path.isdir(self._dir(fingerprint))
+
+    def _read_json(self, fingerprint: str, name: str) -> Any:
+        try:
+            with open(os.path.join(self._dir(fingerprint), name), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read cached document {fingerprint}: {e}")
+            return None
+
+    def skeleton(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """モジュール以外の項目（meta, relationships など）"""
+        return self._read_json(fingerprint, "document.json")
+
+    def index(self, fingerprint: str) -> Optional[List[Dict[str, Any]]]:
+        """モジュールの索引（キー、ID、名前、カテゴリ、ファイルパス、保存位置）"""
+        index = self._indexes.get(fingerprint)
+        if index is None:
+            index = self._read_json(fingerprint, "index.json")
+            if index is not None:
+                self._indexes.set(fingerprint, index)
+        return index
+
+    def read_modules(self, fingerprint: str, entries: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """索引のエントリに対応するモジュールだけを読み込みます。"""
+        try:
+            with open(os.path.join(self._dir(fingerprint), "modules.jsonl"), "rb") as file:
+                modules = []
+                for entry in entries:
+                    file.seek(entry["offset"])
+                    modules.append(json.loads(file.read(entry["length"])))
+                return modules
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read modules of cached document {fingerprint}: {e}")
+            return None
+
+    def find_modules(self, fingerprint: str, module_id: Optional[int] = None, category: Optional[str] = None,
+                     path_prefix: Optional[str] = None, per_file: Optional[bool] = None) -> Optional[List[Dict[str, Any]]]:
+        """条件に一致するモジュールの索引のエントリ。設計書が存在しない場合は None。"""
+        index = self.index(fingerprint)
+        if index is None:
+            return None
+        entries = index
+        if module_id is not None:
+            entries = [entry for entry in entries if entry["id"] == module_id]
+        if category is not None:
+            entries = [entry for entry in entries if entry["category"] == category]
+        if path_prefix is not None:
+            entries = [entry for entry in entries if (entry["file_path"] or "").startswith(path_prefix)]
+        if per_file is not None:
+            entries = [entry for entry in entries if bool(entry["file_path"]) == per_file]
+        return entries
+
+    def resolve_pointer(self, fingerprint: str, pointer: str) -> Any:
+        """
+        JSON Pointer が指す値を返します。/modules/<n>/... の場合はそのモジュールだけを読み込みます。
+        設計書または値が存在しない場合は KeyError を送出します。
+        """
+        tokens = parse_json_pointer(pointer)
+        if tokens and tokens[0] == MODULES_KEY:
+            index = self.index(fingerprint)
+            if index is None:
+                raise KeyError(fingerprint)
+            if len(tokens) == 1:
+                entries = index
+            elif tokens[1].isdigit() and int(tokens[1]) < len(index):
+                entries = [index[int(tokens[1])]]
+            else:
+                raise KeyError(tokens[1])
+            modules = self.read_modules(fingerprint, entries)
+            if modules is None:
+                raise KeyError(fingerprint)
+            return modules if len(tokens) == 1 else resolve_tokens(modules[0], tokens[2:])
+        if not tokens:
+            document = self.get(fingerprint)
+            if document is None:
+                raise KeyError(fingerprint)
+            return document
+        skeleton = self.skeleton(fingerprint)
+        if skeleton is None:
+            raise KeyError(fingerprint)
+        return resolve_tokens(skeleton, tokens)
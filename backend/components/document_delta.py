@@ -0,0 +1,97 @@
+from typing import Any, Dict, List
+from components.document_cache import MODULES_KEY, module_key
+
+# 差分の形式
+DELTA_JSON_PATCH = "json-patch"
+DELTA_MODULES = "modules"
+DELTA_FORMATS = (DELTA_JSON_PATCH, DELTA_MODULES)
+
+
+def _escape(token: str) -> str:
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _diff_values(path: str, old: Any, new: Any, ops: List[Dict[str, Any]]) -> None:
+    """辞書はキーごとに再帰的に比較し、それ以外（リスト・スカラー）は値が異なれば置き換えます。"""
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                _diff_values(f"{path}/{_escape(key)}", old[key], value, ops)
+        return
+    ops.append({"op": "replace", "path": path, "value": new})
+
+
+def json_patch(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    2つの設計書の差分を RFC 6902 の JSON Patch として返します。
+    モジュールはキー（モジュールID・ファイルパス）で対応付けるため、設計書の大きさに対して線形時間で計算できます。
+    """
+    ops: List[Dict[str, Any]] = []
+    old_top = {key: value for key, value in old.items() if key != MODULES_KEY}
+    new_top = {key: value for key, value in new.items() if key != MODULES_KEY}
+    _diff_values("", old_top, new_top, ops)
+
+    old_modules = old.get(MODULES_KEY, [])
+    new_modules = new.get(MODULES_KEY, [])
+    old_by_key = {module_key(module): module for module in old_modules}
+    new_keys = [module_key(module) for module in new_modules]
+    new_key_set = set(new_keys)
+
+    # 残るモジュールの相対的な順序が変わった場合は、モジュールの一覧をまとめて置き換える
+    surviving = [module_key(module) for module in old_modules if module_key(module) in new_key_set]
+    if surviving != [key for key in new_keys if key in old_by_key]:
+        ops.append({"op": "replace", "path": f"/{MODULES_KEY}", "value": new_modules})
+        return ops
+
+    # 削除は後ろから行い、前のモジュールの位置がずれないようにする
+    for index in range(len(old_modules) - 1, -1, -1):
+        if module_key(old_modules[index]) not in new_key_set:
+            ops.append({"op": "remove", "path": f"/{MODULES_KEY}/{index}"})
+    # 削除後の一覧の先頭から順に、新しい設計書と同じ並びになるよう追加・更新する
+    for index, (key, module) in enumerate(zip(new_keys, new_modules)):
+        previous = old_by_key.get(key)
+        if previous is None:
+            ops.append({"op": "add", "path": f"/{MODULES_KEY}/{index}", "value": module})
+        else:
+            _diff_values(f"/{MODULES_KEY}/{index}", previous, module, ops)
+    return ops
+
+
+def module_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    モジュール単位の差分。追加・変更されたモジュールは全体を、削除されたモジュールはキーだけを返します。
+    モジュールの並びとモジュール以外の項目の変更も含みます。
+    """
+    old_modules = {module_key(module): module for module in old.get(MODULES_KEY, [])}
+    new_modules = {module_key(module): module for module in new.get(MODULES_KEY, [])}
+    added = [module for key, module in new_modules.items() if key not in old_modules]
+    changed = [module for key, module in new_modules.items() if key in old_modules and old_modules[key] != module]
+    removed = [key for key in old_modules if key not in new_modules]
+    top_level = {
+        key: value for key, value in new.items()
+        if key != MODULES_KEY and old.get(key) != value
+    }
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "unchanged": len(new_modules) - len(added) - len(changed),
+        "order": list(new_modules),
+        "top_level": top_level,
+        "removed_top_level": [key for key in old if key != MODULES_KEY and key not in new],
+    }
+
+
+def document_delta(old: Dict[str, Any], new: Dict[str, Any], delta_format: str) -> Any:
+    if delta_format == DELTA_JSON_PATCH:
+        return json_patch(old, new)
+    if delta_format == DELTA_MODULES:
+        return module_delta(old, new)
+    raise ValueError(f"Unsupported delta format: {delta_format}")
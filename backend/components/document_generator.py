@@ -1,29 +1,106 @@
-import requests
+import os
 import json
-from typing import List, Dict, Any
-from utils.logger import setup_logger
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Dict, Any, Optional
+from utils.logger import sample, setup_logger
+from components.upstream_scheduler import get_scheduler
+from components.single_flight import SingleFlight
+from components.shared_cache import SharedCache
+from components.run_checkpoint import RunCheckpoint
+from components.cancellation import CancellationToken, OperationCancelled
+from components.module_registry import get_module_registry
+from utils.lazy_import import lazy_import
 
 logger = setup_logger(__name__)
 
+# 同一テンプレートの同時取得を1回のAPI呼び出しにまとめる（プロセス共通）
+_template_fetch_flight = SingleFlight("template-fetch")
+
+# 取得済みテンプレートのキャッシュ（module_id → template）
+_template_cache = SharedCache("template", ttl=float(os.getenv("TEMPLATE_CACHE_TTL", "3600")), l1_max_entries=256)
+
+class TemplateUnavailableError(Exception):
+    """Raised when the templates of some modules could not be fetched; the document would be incomplete."""
+
+    def __init__(self, module_ids: List[int]):
+        super().__init__(f"Templates could not be fetched for modules: {module_ids}")
+        self.module_ids = module_ids
+
+
 class DocumentGenerator:
-    def __init__(self, lingu_key: str):
+    TEMPLATE_VERSION = "1.0"
+
+    def __init__(self, lingu_key: str, checkpoint: Optional[RunCheckpoint] = None,
+                 cancel_token: Optional[CancellationToken] = None):
+        """
+        :param lingu_key: LinguStruct license key
+        :param checkpoint: Run checkpoint; fetched templates are saved to it so a resumed run does not refetch them
+        :param cancel_token: When cancelled, pending and queued template fetches are aborted
+        """
         self.lingu_key = lingu_key
+        self.checkpoint = checkpoint
+        self.cancel_token = cancel_token or CancellationToken()
 
     def fetch_template(self, module_id: int) -> Dict[str, Any]:
         """Fetch the structure of individual template files like m1.json, m2.json from API."""
+        cached = _template_cache.get(module_id)
+        if cached is None and self.checkpoint is not None:
+            cached = self.checkpoint.get("template", module_id)
+        if cached is not None:
+            return cached
+        while True:
+            try:
+                template_data = _template_fetch_flight.do(module_id, self._fetch_template_uncoalesced, module_id)
+                break
+            except OperationCancelled:
+                # The shared fetch belonged to a request that was cancelled; retry unless this one was too
+                if self.cancel_token.cancelled:
+                    raise
+        if template_data:
+            _template_cache.set(module_id, template_data)
+            if self.checkpoint is not None:
+                self.checkpoint.put("template", module_id, template_data)
+        return template_data
+
+    def fetch_templates(self, module_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Fetch the templates of several modules concurrently, bounded by the LinguStruct concurrency limit.
+        Templates do not depend on each other, so every distinct module is fetched at once.
+        """
+        unique_ids = sorted(set(module_ids))
+        if not unique_ids:
+            return {}
+        max_workers = max(1, min(len(unique_ids), get_scheduler().max_concurrency("lingustruct")))
+        # Run each fetch in the caller's context so request/run IDs stay on the worker threads' log lines
+        contexts = [contextvars.copy_context() for _ in unique_ids]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            templates = list(executor.map(lambda context, module_id: context.run(self.fetch_template, module_id),
+                                          contexts, unique_ids))
+        return dict(zip(unique_ids, templates))
+
+    @classmethod
+    def template_versions(cls) -> Dict[str, str]:
+        """Versions of the templates and the module registry the generated document is built against."""
+        return {"template_version": cls.TEMPLATE_VERSION, "module_registry": get_module_registry().version}
+
+    def _fetch_template_uncoalesced(self, module_id: int) -> Dict[str, Any]:
         url = f"https://lingustruct.onrender.com/lingu_struct/modules/{module_id}"
         headers = {
             "LINGUSTRUCT_LICENSE_KEY": self.lingu_key
         }
         
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
+            response = get_scheduler().call(
+                "lingustruct", self._request_template, url, headers, self.cancel_token.timeout(),
+                cancel_token=self.cancel_token
+            )
             template_data = response.json()["data"]
             logger.info(f"Template for module {module_id} loaded successfully from API.")
             return template_data
-        except requests.HTTPError as http_err:
-            if response.status_code == 404:
+        except OSError as http_err:  # requests.RequestException (including HTTPError) subclasses OSError
+            response = getattr(http_err, "response", None)
+            if response is not None and response.status_code == 404:
                 logger.warning(f"Template for module {module_id} not found: {http_err}")
             else:
                 logger.error(f"HTTP error occurred when fetching module {module_id}: {http_err}")
@@ -32,26 +109,34 @@ class DocumentGenerator:
             logger.error(f"Failed to load template for module {module_id}: {e}")
             return None
 
+    @staticmethod
+    def _request_template(url: str, headers: Dict[str, str], timeout: Optional[float] = None) -> Any:
+        response = lazy_import("requests").get(url, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response
+
     def generate_final_document(self, mapped_data: List[Dict[str, Any]], project_id: str, version: str) -> Dict[str, Any]:
         """
         Generate the final design document.
+        Raises TemplateUnavailableError if any module's template is missing, instead of returning a document without it.
         """
         try:
             modules_with_fields = []
+            templates = self.fetch_templates(module["id"] for module in mapped_data if isinstance(module, dict))
+            missing = sorted(module_id for module_id, template_data in templates.items() if not template_data)
+            if missing:
+                raise TemplateUnavailableError(missing)
             for module in mapped_data:
+                self.cancel_token.raise_if_cancelled()
                 if not isinstance(module, dict):
                     logger.error(f"Module is not a dictionary: {module}")
                     continue
 
                 module_id = module["id"]
-                template_data = self.fetch_template(module_id)
-                if not template_data:
-                    logger.warning(f"Skipping module {module_id} due to missing template.")
-                    continue
-
+                template_data = templates[module_id]
                 module["fields"] = template_data.get("fields", {})
                 modules_with_fields.append(module)
-                logger.debug(f"Module {module_id} fields populated.")
+                logger.debug("Module %s fields populated.", module_id, extra=sample(100))
 
             # Add relationships
             relationships = self.generate_relationships(modules_with_fields)
@@ -74,7 +159,7 @@ class DocumentGenerator:
                 "meta": {
                     "document_type": "system_design_document",
                     "description": "This document defines the modular structure, dependencies, and adaptive components of the system.",
-                    "template_version": "1.0"
+                    "template_version": self.TEMPLATE_VERSION
                 },
                 "project_id": project_id,
                 "version": version,
@@ -89,40 +174,17 @@ class DocumentGenerator:
             logger.info("Final document generated successfully.")
             return final_document
 
+        except TemplateUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"Failed to generate final document: {e}", exc_info=True)
             raise
 
     def generate_relationships(self, modules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Define relationships between modules.
+        Derive the relationships between the modules in the document from the module registry's dependencies.
         """
-        relationships = [
-            {
-                "source": 1,
-                "target": 2,
-                "type": "sequential",
-                "description": "Meta information must be processed before defining the architecture."
-            },
-            {
-                "source": 2,
-                "target": 3,
-                "type": "dependency",
-                "description": "The architecture module depends on dependency resolution strategies."
-            },
-            {
-                "source": 4,
-                "target": 8,
-                "type": "feedback",
-                "description": "Error handling strategies affect property order processing."
-            },
-            {
-                "source": 5,
-                "target": 10,
-                "type": "influences",
-                "description": "Priority management influences the technology stack selection."
-            }
-        ]
+        relationships = get_module_registry().relationships(module["id"] for module in modules)
         logger.debug("Relationships defined.")
         return relationships
 
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from components.shared_cache import SharedCache
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# ローカルのクローン（<LOCAL_REPOS_DIR>/<owner>/<name>）がある場合は git log から一括で収集する
+LOCAL_REPOS_DIR = os.getenv("LOCAL_REPOS_DIR", "")
+# git log で遡るコミット数の上限（churn の集計範囲）
+FILE_METADATA_GIT_MAX_COMMITS = int(os.getenv("FILE_METADATA_GIT_MAX_COMMITS", "1000"))
+GIT_TIMEOUT = float(os.getenv("GIT_TIMEOUT", "30"))
+
+# ファイル一覧から得たメタデータ（(repo, branch) → {path: {size, last_modified, churn}}）
+_file_metadata_cache = SharedCache("file-metadata", ttl=float(os.getenv("FILE_METADATA_TTL", "600")), l1_max_entries=64)
+
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?$')
+_KEY_VALUE = re.compile(r'^(size|bytes|last_modified|modified|updated_at|churn|commits)[=:](.+)$', re.IGNORECASE)
+_KEY_ALIASES = {
+    "bytes": "size",
+    "modified": "last_modified",
+    "updated_at": "last_modified",
+    "commits": "churn",
+}
+
+
+def parse_listing_line(line: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    ファイル一覧の1行をパスとメタデータに分解します。
+    パスに続く列のうち、整数はサイズ、ISO 8601 の日時は最終更新日時、key=value 形式はその値として扱います。
+
+    :return: (パス, {size, last_modified, churn} のうち読み取れたもの)
+    """
+    tokens = line.strip().split()
+    metadata: Dict[str, Any] = {}
+    for token in tokens[1:]:
+        token = token.strip("(),;[]")
+        match = _KEY_VALUE.match(token)
+        if match:
+            key = match.group(1).lower()
+            key = _KEY_ALIASES.get(key, key)
+            value = match.group(2)
+            if key in ("size", "churn"):
+                if value.isdigit():
+                    metadata[key] = int(value)
+            else:
+                metadata[key] = value
+        elif token.isdigit() and "size" not in metadata:
+            metadata["size"] = int(token)
+        elif _ISO_DATE.match(token) and "last_modified" not in metadata:
+            metadata["last_modified"] = token
+    return tokens[0], metadata
+
+
+def parse_listing(content: str) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+    """ファイル一覧の出力からパスの一覧と、メタデータを読み取れたパスのメタデータを返します。"""
+    paths = []
+    metadata = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        path, values = parse_listing_line(line)
+        paths.append(path)
+        if values:
+            metadata[path] = values
+    return paths, metadata
+
+
+def remember_listing_metadata(repo_name: str, branch_name: str, metadata: Dict[str, Dict[str, Any]]) -> None:
+    """
+    ファイル一覧から得たメタデータを保存し、以降の設計書生成で使えるようにします。
+    一覧にメタデータの列がなかった場合も空の辞書を保存する（メタデータがないことも結果として扱う）。
+    """
+    _file_metadata_cache.set((repo_name, branch_name), metadata)
+
+
+def forget_listing_metadata(repo_name: str, branch_name: str) -> None:
+    """ブランチが更新された場合に、保存済みのメタデータを破棄します。"""
+    _file_metadata_cache.delete((repo_name, branch_name))
+
+
+def local_repo_path(repo_name: str) -> Optional[str]:
+    if not LOCAL_REPOS_DIR:
+        return None
+    path = os.path.join(LOCAL_REPOS_DIR, *repo_name.split("/"))
+    return path if os.path.exists(os.path.join(path, ".git")) else None
+
+
+def _git(repo_path: str, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-C", repo_path, *args], capture_output=True, text=True, check=True, timeout=GIT_TIMEOUT
+    ).stdout
+
+
+def _resolve_ref(repo_path: str, branch_name: str) -> str:
+    """ブランチ名をローカルのクローンで参照できる名前にします（なければ origin/<branch>）。"""
+    for ref in (branch_name, f"origin/{branch_name}"):
+        try:
+            _git(repo_path, "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}")
+            return ref
+        except subprocess.CalledProcessError:
+            continue
+    raise ValueError(f"Branch {branch_name} not found in {repo_path}")
+
+
+def local_tree_sha(repo_path: str, branch_name: str) -> str:
+    """ブランチの先頭のツリーのSHA"""
+    return _git(repo_path, "rev-parse", f"{_resolve_ref(repo_path, branch_name)}^{{tree}}").strip()
+
+
+def local_file_paths(repo_path: str, branch_name: str) -> List[str]:
+    """ブランチの先頭に含まれるファイルのパス"""
+    return _git(repo_path, "ls-tree", "-r", "--name-only", _resolve_ref(repo_path, branch_name)).splitlines()
+
+
+def git_metadata(repo_path: str, branch_name: str) -> Dict[str, Dict[str, Any]]:
+    """
+    ローカルのクローンから、ls-tree 1回でサイズを、log --name-only 1回で最終更新日時とコミット数を収集します。
+    """
+    ref = _resolve_ref(repo_path, branch_name)
+    listing = _git(repo_path, "ls-tree", "-r", "-l", ref)
+    log = _git(repo_path, "log", f"-n{FILE_METADATA_GIT_MAX_COMMITS}", "--name-only", "--format=%x00%cI", ref, "--")
+
+    metadata: Dict[str, Dict[str, Any]] = {}
+    for line in listing.splitlines():
+        # "<mode> <type> <object> <size>\t<path>"
+        info, _, path = line.partition("\t")
+        size = info.split()[-1] if info else "-"
+        if size.isdigit():
+            metadata[path] = {"size": int(size)}
+    # コミットは新しい順に並ぶため、最初に現れた日時が最終更新日時になる
+    for commit in log.split("\x00")[1:]:
+        lines = commit.strip("\n").splitlines()
+        if not lines:
+            continue
+        committed_at = lines[0]
+        for path in lines[1:]:
+            if not path:
+                continue
+            entry = metadata.get(path)
+            if entry is None:
+                continue  # 削除・リネームされたファイル
+            entry.setdefault("last_modified", committed_at)
+            entry["churn"] = entry.get("churn", 0) + 1
+    return metadata
+
+
+def collect_file_metadata(repo_name: str, branch_name: str, file_paths: Iterable[str],
+                          fetch_listing_metadata: Optional[Callable[[], Dict[str, Dict[str, Any]]]] = None
+                          ) -> Dict[str, Dict[str, Any]]:
+    """
+    選択されたファイルのメタデータを、ファイルごとの追加リクエストなしで返します。
+    ローカルのクローンがあれば git から、なければファイル一覧の取得時に保存したものを使います。
+    保存したものがない（期限切れ・push で破棄された）場合は fetch_listing_metadata で一覧を取得し直します。
+    一覧を取得した直後かどうかで設計書（とフィンガープリント）が変わらないよう、保存の有無に関係なく同じ結果にする。
+
+    :param fetch_listing_metadata: ファイル一覧を取得し直してメタデータを返す関数（失敗した場合は例外を送出する）
+    """
+    metadata = None
+    repo_path = local_repo_path(repo_name)
+    if repo_path is not None:
+        try:
+            metadata = git_metadata(repo_path, branch_name)
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            logger.warning(f"Could not collect file metadata from {repo_path}: {e}")
+    if metadata is None:
+        metadata = _file_metadata_cache.get((repo_name, branch_name))
+    if metadata is None and fetch_listing_metadata is not None:
+        metadata = fetch_listing_metadata()  # 失敗した場合は例外をそのまま呼び出し元に返す
+    metadata = metadata or {}
+    return {path: metadata[path] for path in file_paths if path in metadata}
+
+
+def estimate_total_bytes(repo_name: str, branch_name: str, file_paths: List[str], default_size: int) -> int:
+    """
+    選択されたファイルの合計バイト数を見積もります（アドミッション制御のコスト見積もり用）。
+    メタデータにサイズがあるファイルはその値、それ以外は default_size で計算し、ファイルの内容は読み込まない。
+    """
+    metadata = collect_file_metadata(repo_name, branch_name, file_paths)
+    return sum(metadata.get(file_path, {}).get("size", default_size) for file_path in file_paths)
+
+
+def metadata_digest(file_metadata: Dict[str, Dict[str, Any]]) -> str:
+    """メタデータの内容を表すハッシュ（設計書のフィンガープリントに含める）"""
+    encoded = json.dumps(file_metadata, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
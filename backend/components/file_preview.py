@@ -0,0 +1,154 @@
+import os
+import posixpath
+from typing import Any, Dict, List, Optional, Tuple
+from components.data_fetcher import DataFetcher
+from components.document_cache import content_hash
+from components.parser import EXTENSION_TO_LANGUAGE, Parser
+from components.pipeline import parse_cached
+from components.single_flight import SingleFlight
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 範囲を指定しない場合、および1回の応答で返す内容の最大バイト数
+PREVIEW_MAX_BYTES = int(os.getenv("PREVIEW_MAX_BYTES", "262144"))
+# この文字数を超えるファイルは構文情報を返さない
+PREVIEW_PARSE_MAX_CHARS = int(os.getenv("PREVIEW_PARSE_MAX_CHARS", "1048576"))
+# ディレクトリを展開したときに先読みするファイル数の上限
+PREVIEW_PREFETCH_MAX_FILES = int(os.getenv("PREVIEW_PREFETCH_MAX_FILES", "50"))
+# 内容を表示できないため先読みしない拡張子
+BINARY_EXTENSIONS = {
+    "png", "jpg", "jpeg", "gif", "bmp", "ico", "webp", "pdf", "zip", "gz", "tar", "jar", "exe", "dll", "so",
+    "dylib", "woff", "woff2", "ttf", "otf", "eot", "mp3", "mp4", "mov", "wasm", "pyc", "class",
+}
+
+# 同じディレクトリの先読みを1回にまとめる（プロセス共通）
+_prefetch_flight = SingleFlight("preview-prefetch")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def _char_boundary(data: bytes, offset: int) -> int:
+    """UTF-8 の文字の途中を指すバイト位置を、その文字の先頭まで戻します。"""
+    while 0 < offset < len(data) and (data[offset] & 0xC0) == 0x80:
+        offset -= 1
+    return offset
+
+
+def slice_content(content: str, start_line: Optional[int] = None, end_line: Optional[int] = None,
+                  start_byte: Optional[int] = None, end_byte: Optional[int] = None) -> Tuple[str, Dict[str, Any], bool]:
+    """
+    ファイル内容の一部を切り出します。行の範囲（1始まり、終端を含む）またはバイトの範囲（終端を含まない）を指定でき、
+    どちらも指定しない場合は先頭から返します。いずれの場合も PREVIEW_MAX_BYTES を超える分は切り詰めます。
+    バイトの範囲は文字の途中で切れないよう、文字の先頭に揃えます。
+
+    :return: (切り出した内容, 実際に返した範囲, 切り詰めたかどうか)
+    """
+    data = content.encode("utf-8")
+    if start_line is not None or end_line is not None:
+        lines = content.splitlines(keepends=True)
+        first = max(start_line or 1, 1)
+        last = min(end_line or len(lines), len(lines))
+        if first > max(len(lines), 1) or last < first - 1:
+            raise RangeNotSatisfiable(f"Line range {start_line}-{end_line} is outside the file ({len(lines)} lines)")
+        selected: List[str] = []
+        size = 0
+        truncated = False
+        for line in lines[first - 1:last]:
+            size += len(line.encode("utf-8"))
+            if selected and size > PREVIEW_MAX_BYTES:
+                truncated = True
+                break
+            selected.append(line)
+        return "".join(selected), {"start_line": first, "end_line": first + len(selected) - 1}, truncated
+
+    start = max(start_byte or 0, 0)
+    end = len(data) if end_byte is None else min(end_byte, len(data))
+    if start > len(data) or end < start:
+        raise RangeNotSatisfiable(f"Byte range {start_byte}-{end_byte} is outside the file ({len(data)} bytes)")
+    truncated = end - start > PREVIEW_MAX_BYTES
+    if truncated:
+        end = start + PREVIEW_MAX_BYTES
+    start, end = _char_boundary(data, start), _char_boundary(data, end)
+    return data[start:end].decode("utf-8"), {"start_byte": start, "end_byte": end}, truncated
+
+
+def syntax_metadata(parser: Parser, file_path: str, content: str, file_hash: str) -> Dict[str, Any]:
+    """言語とシンボル（関数・クラスなど）。パース結果はパースキャッシュから取得する"""
+    file_type = file_path.rsplit(".", 1)[-1].lower() if "." in file_path else ""
+    language = EXTENSION_TO_LANGUAGE.get(file_type)
+    metadata: Dict[str, Any] = {"file_type": file_type, "language": language}
+    if language is None or len(content) > PREVIEW_PARSE_MAX_CHARS:
+        return metadata
+    parsed = parse_cached(parser, file_path, content, file_hash)
+    if "error" not in parsed:
+        metadata["engine"] = parser.engine_for(file_type)
+        metadata["symbols"] = parsed
+    return metadata
+
+
+def preview_file(fetcher: DataFetcher, parser: Parser, repo_name: str, branch_name: str, file_path: str,
+                 start_line: Optional[int] = None, end_line: Optional[int] = None,
+                 start_byte: Optional[int] = None, end_byte: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    1ファイルの内容（または一部）と構文情報を返します。内容はまずコンテンツキャッシュから探し、
+    ない場合だけ上流から取得してキャッシュに保存します。取得できない場合は None。
+    """
+    contents = DataFetcher.cached_contents(repo_name, branch_name, [file_path])
+    cached = file_path in contents
+    if not cached:
+        contents = fetcher.fetch_files_content(repo_name, branch_name, [file_path])
+    content = contents.get(file_path)
+    if content is None:
+        return None
+
+    file_hash = content_hash(content)
+    text, content_range, truncated = slice_content(content, start_line, end_line, start_byte, end_byte)
+    return {
+        "path": file_path,
+        "hash": file_hash,
+        "size": len(content.encode("utf-8")),
+        "total_lines": len(content.splitlines()),
+        "content": text,
+        "range": content_range,
+        "truncated": truncated,
+        "cached": cached,
+        "syntax": syntax_metadata(parser, file_path, content, file_hash),
+    }
+
+
+def sibling_paths(file_paths: List[str], directory: str) -> List[str]:
+    """ディレクトリ直下のファイル（サブディレクトリの中は含まない）"""
+    directory = directory.strip("/")
+    return [
+        path for path in file_paths
+        if posixpath.dirname(path.strip("/")) == directory
+        and path.rsplit(".", 1)[-1].lower() not in BINARY_EXTENSIONS
+    ]
+
+
+def prefetch_directory(fetcher: DataFetcher, parser: Parser, repo_name: str, branch_name: str, directory: str) -> int:
+    """
+    ディレクトリ直下のファイルの内容を先読みしてコンテンツキャッシュに保存し、構文情報もパースキャッシュに載せます。
+    同じディレクトリの先読みが実行中の場合はその完了を待ちます。
+
+    :return: 新たに取得したファイル数
+    """
+    def prefetch() -> int:
+        listing = fetcher.fetch_file_listing(repo_name, branch_name)
+        if listing is None:
+            return 0
+        siblings = sibling_paths(listing[1], directory)[:PREVIEW_PREFETCH_MAX_FILES]
+        cached = DataFetcher.cached_contents(repo_name, branch_name, siblings)
+        missing = [path for path in siblings if path not in cached]
+        if not missing:
+            return 0
+        fetched = fetcher.fetch_files_content(repo_name, branch_name, missing)
+        for path, content in fetched.items():
+            syntax_metadata(parser, path, content, content_hash(content))
+        logger.info("Prefetched %d files under %s/ for %s@%s", len(fetched), directory.strip("/"), repo_name, branch_name)
+        return len(fetched)
+
+    return _prefetch_flight.do((repo_name, branch_name, directory.strip("/")), prefetch)
@@ -0,0 +1,117 @@
+import os
+import posixpath
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from components.manifest_analyzer import ManifestAnalyzer
+from components.parser import EXTENSION_TO_LANGUAGE
+from components.symbol_index import resolve_import
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 時間予算のうち、マッピングとドキュメント生成のために残しておく秒数
+BUDGET_GENERATION_RESERVE_SECONDS = float(os.getenv("BUDGET_GENERATION_RESERVE_SECONDS", "5"))
+
+# エントリーポイントとみなすファイル名（拡張子を除く）。プログラムの言語のファイルに限る
+ENTRY_POINT_STEMS = {"main", "app", "index", "server", "__main__", "manage", "wsgi", "asgi", "cli", "run", "lib", "mod"}
+_PROGRAM_LANGUAGES = {"python", "javascript", "typescript", "rust", "go"}
+
+# 重要度の段（小さいほど先に処理する）
+TIER_PROJECT = 0  # README とマニフェスト
+TIER_ENTRY_POINT = 1
+TIER_OTHER = 2
+
+
+def file_tier(file_path: str) -> int:
+    name = posixpath.basename(file_path)
+    if name.lower().startswith("readme") or ManifestAnalyzer.is_manifest(file_path):
+        return TIER_PROJECT
+    stem, _, extension = name.rpartition(".")
+    if stem.lower() in ENTRY_POINT_STEMS and EXTENSION_TO_LANGUAGE.get(extension.lower()) in _PROGRAM_LANGUAGES:
+        return TIER_ENTRY_POINT
+    return TIER_OTHER
+
+
+class ImportGraph:
+    def __init__(self, file_paths: Iterable[str]):
+        """
+        選択されたファイル間のインポートの辺。インポート先を選択範囲のファイルに解決し、
+        ファイルごとの被インポート数（入次数）を数えます。
+
+        :param file_paths: 選択されたファイルのパス（解決先の候補）
+        """
+        self.known_paths: Set[str] = set(file_paths)
+        self.known_dirs: Set[str] = set()
+        for path in self.known_paths:
+            directory = posixpath.dirname(path)
+            while directory and directory not in self.known_dirs:
+                self.known_dirs.add(directory)
+                directory = posixpath.dirname(directory)
+        self._edges: Dict[str, Set[str]] = {}
+        self._in_degree: Counter = Counter()
+
+    def add(self, importer: str, targets: Iterable[str]) -> None:
+        """ファイルのインポートを登録します。同じファイルを再度登録した場合は置き換える。"""
+        resolved = set()
+        for target in targets:
+            path = resolve_import(importer, target, self.known_paths, self.known_dirs)
+            # パッケージのディレクトリに解決されたインポートはファイルの入次数に数えない
+            if path is not None and path != importer and path in self.known_paths:
+                resolved.add(path)
+        self._in_degree.subtract(self._edges.get(importer, ()))
+        self._in_degree.update(resolved)
+        self._edges[importer] = resolved
+
+    def in_degree(self, file_path: str) -> int:
+        return self._in_degree[file_path]
+
+
+def rank_files(file_paths: Iterable[str], graph: ImportGraph, sizes: Optional[Dict[str, int]] = None) -> List[str]:
+    """
+    ファイルを重要度の高い順に並べます。README・マニフェスト、エントリーポイント、その他の順で、
+    同じ段の中は被インポート数の多い順、サイズの大きい順（不明なものは後）、浅い階層の順。
+    """
+    sizes = sizes or {}
+
+    def key(file_path: str) -> Tuple:
+        return (file_tier(file_path), -graph.in_degree(file_path), -sizes.get(file_path, 0),
+                file_path.count("/"), file_path)
+
+    return sorted(file_paths, key=key)
+
+
+class GenerationBudget:
+    def __init__(self, seconds: Optional[float] = None, upstream_calls: Optional[int] = None):
+        """
+        予算付きの生成。時間か上流呼び出し回数（ファイル内容の取得リクエスト数）の予算を使い切ると、
+        残りのファイルを後回しにして、それまでに処理したファイルで設計書を生成します。
+        時間予算のうち BUDGET_GENERATION_RESERVE_SECONDS はマッピングとドキュメント生成のために残します。
+
+        :param seconds: 時間予算（秒）
+        :param upstream_calls: ファイル内容の取得リクエスト数の上限（1回で最大 FETCH_BATCH_SIZE ファイル）
+        """
+        self.seconds = seconds
+        self.upstream_calls = upstream_calls
+        self.deadline = time.monotonic() + max(0.0, seconds - BUDGET_GENERATION_RESERVE_SECONDS) if seconds else None
+        self.calls_used = 0
+
+    def key(self) -> Tuple[Optional[float], Optional[int]]:
+        return self.seconds, self.upstream_calls
+
+    def charge(self, calls: int) -> None:
+        self.calls_used += calls
+
+    def calls_left(self) -> Optional[int]:
+        if self.upstream_calls is None:
+            return None
+        return max(0, self.upstream_calls - self.calls_used)
+
+    def time_left(self, expected_seconds: float = 0.0) -> bool:
+        """次の処理（見込み expected_seconds 秒）を期限内に終えられるか"""
+        return self.deadline is None or time.monotonic() + expected_seconds < self.deadline
+
+    def affordable_files(self, batch_size: int) -> Optional[int]:
+        """残りの呼び出し回数で取得できるファイル数（回数の予算がなければ None）"""
+        calls_left = self.calls_left()
+        return None if calls_left is None else calls_left * batch_size
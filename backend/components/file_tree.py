@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Tuple
+from components.shared_cache import SharedCache
+from components.ttl_cache import TTLCache
+
+# ファイル一覧の形式
+TREE_FORMAT_NESTED = "nested"
+TREE_FORMAT_COMPACT = "compact"
+TREE_FORMATS = (TREE_FORMAT_NESTED, TREE_FORMAT_COMPACT)
+COMPACT_TREE_VERSION = "compact-v1"
+
+# ノードの種類（compact 形式の types の1文字）
+NODE_DIRECTORY = "d"
+NODE_FILE = "f"
+
+# ブランチのファイル一覧（(repo, branch) → {tree_sha, paths}）。Push の Webhook で破棄される
+FILE_LISTING_TTL = float(os.getenv("FILE_LISTING_TTL", "300"))
+_listing_cache = SharedCache("file-listing", ttl=FILE_LISTING_TTL, l1_max_entries=32)
+# ツリーのSHAごとのエンコード済みの応答（(repo, branch, tree_sha, format) → JSONのバイト列）
+_payload_cache = TTLCache(max_entries=int(os.getenv("FILE_TREE_PAYLOAD_CACHE", "32")), ttl=FILE_LISTING_TTL)
+
+
+def listing_digest(file_paths: List[str]) -> str:
+    """ツリーのSHAが得られない場合に、ファイル一覧の内容から代わりの識別子を作ります。"""
+    digest = hashlib.sha1()
+    for path in file_paths:
+        digest.update(path.encode("utf-8"))
+        digest.update(b"\n")
+    return f"listing-{digest.hexdigest()}"
+
+
+def cached_listing(repo_name: str, branch_name: str) -> Any:
+    """保存済みのファイル一覧 {tree_sha, paths}。なければ None。"""
+    return _listing_cache.get((repo_name, branch_name))
+
+
+def remember_listing(repo_name: str, branch_name: str, tree_sha: str, file_paths: List[str]) -> None:
+    _listing_cache.set((repo_name, branch_name), {"tree_sha": tree_sha, "paths": file_paths})
+
+
+def forget_listing(repo_name: str, branch_name: str) -> None:
+    """ブランチが更新された場合に、保存済みのファイル一覧を破棄します。"""
+    _listing_cache.delete((repo_name, branch_name))
+
+
+def _tree_nodes(file_paths: List[str]) -> Dict[str, Any]:
+    """パスの一覧を入れ子の辞書（名前 → 子の辞書、ファイルは None）にします。"""
+    tree: Dict[str, Any] = {}
+    for path in file_paths:
+        parts = path.strip("/").split("/")
+        current = tree
+        for part in parts[:-1]:
+            child = current.get(part)
+            if child is None:
+                child = current[part] = {}
+            current = child
+        current.setdefault(parts[-1], None)
+    return tree
+
+
+def build_compact_tree(file_paths: List[str]) -> Dict[str, Any]:
+    """
+    ファイル一覧を平坦な並列配列で表します。ノードは深さ優先の行きがけ順（入れ子形式と同じ順序）に並び、
+    i 番目のノードの名前は names[name[i]]、親は parent[i]（ルート直下は -1）、種類は types[i]（d / f）です。
+    親は必ず子より前に現れるため、先頭から1回走査するだけでツリーやフルパスを組み立てられます。
+    """
+    names: List[str] = []
+    name_ids: Dict[str, int] = {}
+    name_index: List[int] = []
+    parents: List[int] = []
+    types: List[str] = []
+
+    # 再帰の深さに依存しないよう、明示的なスタックで行きがけ順に走査する
+    pending: List[Tuple[int, str, Any]] = [
+        (-1, name, children) for name, children in reversed(list(_tree_nodes(file_paths).items()))
+    ]
+    while pending:
+        parent, name, children = pending.pop()
+        name_id = name_ids.get(name)
+        if name_id is None:
+            name_id = name_ids[name] = len(names)
+            names.append(name)
+        index = len(parents)
+        name_index.append(name_id)
+        parents.append(parent)
+        if children is None:
+            types.append(NODE_FILE)
+            continue
+        types.append(NODE_DIRECTORY)
+        for child_name, grandchildren in reversed(list(children.items())):
+            pending.append((index, child_name, grandchildren))
+
+    return {
+        "format": COMPACT_TREE_VERSION,
+        "names": names,
+        "name": name_index,
+        "parent": parents,
+        "types": "".join(types),
+    }
+
+
+def encoded_tree(repo_name: str, branch_name: str, tree_sha: str, tree_format: str, build: Any) -> bytes:
+    """
+    ファイル一覧の応答をJSONのバイト列で返します。同じツリーのSHAと形式の応答は再計算しません。
+
+    :param build: 応答の本体（辞書）を作る関数
+    """
+    key = (repo_name, branch_name, tree_sha, tree_format)
+    payload = _payload_cache.get(key)
+    if payload is None:
+        payload = json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        _payload_cache.set(key, payload)
+    return payload
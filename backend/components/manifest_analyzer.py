@@ -0,0 +1,262 @@
+import json
+import re
+import tomllib
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+from utils.lazy_import import lazy_import
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_REQUIREMENT = re.compile(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(.*)$')
+_GO_REQUIRE = re.compile(r'^\s*(?:require\s+)?([^\s()]+)\s+(v[^\s]+)')
+_YARN_ENTRY = re.compile(r'^"?((?:@[^@/"]+/)?[^@"]+)@')
+_PNPM_KEY = re.compile(r'^/?((?:@[^@/]+/)?[^@/]+)[@/]([^(/]+)')
+
+
+class YamlError(ValueError):
+    """YAMLの構文エラー"""
+
+
+@lru_cache(maxsize=1)
+def _yaml_loader():
+    # yaml は起動時間を短くするため初回使用時に読み込む。libyaml が利用可能であればCローダーを使う（大きなロックファイルで数十倍速い）
+    yaml = lazy_import("yaml")
+    return yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(content: str) -> Any:
+    """Cローダーを優先してYAMLを読み込みます。構文エラーは YamlError（ValueError）として送出します。"""
+    yaml, loader = _yaml_loader()
+    try:
+        return yaml.load(content, Loader=loader)
+    except yaml.YAMLError as e:
+        raise YamlError(str(e)) from e
+
+
+def _basename(path: str) -> str:
+    return path.rsplit("/", 1)[-1]
+
+
+def _version_of(spec: Any) -> str:
+    """'^1.0' / {'version': '1.0'} / {'git': ...} などから版の文字列を取り出します。"""
+    if isinstance(spec, str):
+        return spec
+    if isinstance(spec, dict):
+        return str(spec.get("version") or spec.get("git") or spec.get("path") or "*")
+    return "*"
+
+
+def _merge_sections(data: Dict[str, Any], keys) -> Dict[str, str]:
+    declared = {}
+    for key in keys:
+        section = data.get(key)
+        if isinstance(section, dict):
+            for name, spec in section.items():
+                declared[name] = _version_of(spec)
+    return declared
+
+
+def _parse_requirement_lines(lines) -> Dict[str, str]:
+    declared = {}
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line or line.startswith("-"):
+            continue
+        match = _REQUIREMENT.match(line)
+        if match:
+            declared[match.group(1)] = match.group(2).split(";", 1)[0].strip() or "*"
+    return declared
+
+
+def _analyze_package_json(content: str) -> Dict[str, Any]:
+    data = json.loads(content)
+    return {
+        "ecosystem": "node",
+        "declared": _merge_sections(data, ("dependencies", "devDependencies", "peerDependencies", "optionalDependencies")),
+        "resolved": {},
+    }
+
+
+def _analyze_package_lock(content: str) -> Dict[str, Any]:
+    data = json.loads(content)
+    resolved = {}
+    packages = data.get("packages")
+    if isinstance(packages, dict):
+        # lockfileVersion 2/3: キーは "node_modules/<name>"（ネストあり）
+        for key, info in packages.items():
+            if key and isinstance(info, dict) and "version" in info:
+                resolved[key.rsplit("node_modules/", 1)[-1]] = info["version"]
+    else:
+        # lockfileVersion 1
+        for name, info in (data.get("dependencies") or {}).items():
+            if isinstance(info, dict) and "version" in info:
+                resolved[name] = info["version"]
+    return {"ecosystem": "node", "declared": {}, "resolved": resolved}
+
+
+def _analyze_yarn_lock(content: str) -> Dict[str, Any]:
+    resolved = {}
+    current: Optional[str] = None
+    for line in content.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        if not line.startswith(" "):
+            match = _YARN_ENTRY.match(line)
+            current = match.group(1) if match else None
+        elif current and line.strip().startswith("version"):
+            resolved[current] = line.split(None, 1)[1].strip().strip('"')
+            current = None
+    return {"ecosystem": "node", "declared": {}, "resolved": resolved}
+
+
+def _analyze_pnpm_lock(content: str) -> Dict[str, Any]:
+    data = load_yaml(content) or {}
+    resolved = {}
+    for key in (data.get("packages") or {}):
+        match = _PNPM_KEY.match(str(key))
+        if match:
+            resolved[match.group(1)] = match.group(2)
+    declared = {}
+    for importer in (data.get("importers") or {"": data}).values():
+        if isinstance(importer, dict):
+            for name, spec in _merge_sections(importer, ("dependencies", "devDependencies")).items():
+                declared[name] = spec
+    return {"ecosystem": "node", "declared": declared, "resolved": resolved}
+
+
+def _analyze_requirements(content: str) -> Dict[str, Any]:
+    return {"ecosystem": "python", "declared": _parse_requirement_lines(content.splitlines()), "resolved": {}}
+
+
+def _analyze_pyproject(content: str) -> Dict[str, Any]:
+    data = tomllib.loads(content)
+    project = data.get("project", {})
+    lines = list(project.get("dependencies", []))
+    for group in project.get("optional-dependencies", {}).values():
+        lines.extend(group)
+    declared = _parse_requirement_lines(lines)
+    poetry = data.get("tool", {}).get("poetry", {})
+    declared.update(_merge_sections(poetry, ("dependencies", "dev-dependencies")))
+    for group in poetry.get("group", {}).values():
+        declared.update(_merge_sections(group, ("dependencies",)))
+    declared.pop("python", None)
+    return {"ecosystem": "python", "declared": declared, "resolved": {}}
+
+
+def _analyze_pipfile(content: str) -> Dict[str, Any]:
+    data = tomllib.loads(content)
+    return {"ecosystem": "python", "declared": _merge_sections(data, ("packages", "dev-packages")), "resolved": {}}
+
+
+def _analyze_pipfile_lock(content: str) -> Dict[str, Any]:
+    data = json.loads(content)
+    resolved = {}
+    for section in ("default", "develop"):
+        for name, info in (data.get(section) or {}).items():
+            resolved[name] = _version_of(info).lstrip("=")
+    return {"ecosystem": "python", "declared": {}, "resolved": resolved}
+
+
+def _analyze_toml_packages(ecosystem: str) -> Callable[[str], Dict[str, Any]]:
+    """poetry.lock / Cargo.lock の [[package]] テーブルを読む解析関数を返します。"""
+    def analyze(content: str) -> Dict[str, Any]:
+        data = tomllib.loads(content)
+        resolved = {
+            package["name"]: package.get("version", "*")
+            for package in data.get("package", [])
+            if isinstance(package, dict) and "name" in package
+        }
+        return {"ecosystem": ecosystem, "declared": {}, "resolved": resolved}
+    return analyze
+
+
+def _analyze_cargo_toml(content: str) -> Dict[str, Any]:
+    data = tomllib.loads(content)
+    declared = _merge_sections(data, ("dependencies", "dev-dependencies", "build-dependencies"))
+    declared.update(_merge_sections(data.get("workspace", {}), ("dependencies",)))
+    return {"ecosystem": "rust", "declared": declared, "resolved": {}}
+
+
+def _analyze_go_mod(content: str) -> Dict[str, Any]:
+    declared = {}
+    in_block = False
+    for line in content.splitlines():
+        stripped = line.split("//", 1)[0].strip()
+        if stripped.startswith("require ("):
+            in_block = True
+            continue
+        if in_block and stripped == ")":
+            in_block = False
+            continue
+        if in_block or stripped.startswith("require "):
+            match = _GO_REQUIRE.match(stripped)
+            if match:
+                declared[match.group(1)] = match.group(2)
+    return {"ecosystem": "go", "declared": declared, "resolved": {}}
+
+
+def _analyze_go_sum(content: str) -> Dict[str, Any]:
+    resolved = {}
+    for line in content.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            resolved[parts[0]] = parts[1].split("/", 1)[0]
+    return {"ecosystem": "go", "declared": {}, "resolved": resolved}
+
+
+MANIFEST_ANALYZERS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+    "package.json": _analyze_package_json,
+    "package-lock.json": _analyze_package_lock,
+    "npm-shrinkwrap.json": _analyze_package_lock,
+    "yarn.lock": _analyze_yarn_lock,
+    "pnpm-lock.yaml": _analyze_pnpm_lock,
+    "requirements.txt": _analyze_requirements,
+    "pyproject.toml": _analyze_pyproject,
+    "Pipfile": _analyze_pipfile,
+    "Pipfile.lock": _analyze_pipfile_lock,
+    "poetry.lock": _analyze_toml_packages("python"),
+    "Cargo.toml": _analyze_cargo_toml,
+    "Cargo.lock": _analyze_toml_packages("rust"),
+    "go.mod": _analyze_go_mod,
+    "go.sum": _analyze_go_sum,
+}
+
+
+class ManifestAnalyzer:
+    """
+    パッケージマニフェストとロックファイルから宣言済み・解決済みの依存関係を抽出します。
+    JSONは標準のjsonモジュール、YAMLはCローダー、TOMLはtomllib、その他は行単位で解析します。
+    """
+
+    @staticmethod
+    def manifest_type(file_path: str) -> Optional[str]:
+        name = _basename(file_path)
+        if name in MANIFEST_ANALYZERS:
+            return name
+        if name.startswith("requirements") and name.endswith(".txt"):
+            return "requirements.txt"
+        return None
+
+    @classmethod
+    def is_manifest(cls, file_path: str) -> bool:
+        return cls.manifest_type(file_path) is not None
+
+    @classmethod
+    def analyze(cls, file_path: str, content: str) -> Optional[Dict[str, Any]]:
+        """
+        マニフェストを解析します。マニフェストでない場合や解析に失敗した場合はNoneを返します。
+
+        :return: {"manifest_type", "ecosystem", "declared": {name: version}, "resolved": {name: version}}
+        """
+        manifest_type = cls.manifest_type(file_path)
+        if not manifest_type:
+            return None
+        try:
+            result = MANIFEST_ANALYZERS[manifest_type](content)
+        except (ValueError, tomllib.TOMLDecodeError, AttributeError, TypeError) as e:
+            logger.warning(f"Could not analyze manifest {file_path}: {e}")
+            return None
+        result["manifest_type"] = manifest_type
+        logger.debug("Analyzed manifest %s: %d declared, %d resolved.", file_path, len(result["declared"]), len(result["resolved"]))
+        return result
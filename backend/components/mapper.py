@@ -1,378 +1,154 @@
+import hashlib
 import json
 from typing import Dict, Any, List, Optional
-from utils.logger import setup_logger
+from utils.logger import sample, setup_logger
 import os
-import requests
+from components.upstream_scheduler import get_scheduler, UpstreamError
+from components.dependency_table import DependencyTable, KIND_EXTERNAL, KIND_STANDARD, KIND_CUSTOM
+from components.parser import EXTENSION_TO_LANGUAGE
+from components.shared_cache import SharedCache
+from components.cancellation import CancellationToken
+from components.module_registry import BUILDER_PER_FILE, get_module_registry
+from utils.lazy_import import lazy_import
+from collections import Counter
 
 logger = setup_logger(__name__)
 
+# LinguStruct APIから取得したキーマッピングのキャッシュ（api_url → key_mapping）
+_key_mapping_cache = SharedCache("key-mapping", ttl=float(os.getenv("KEY_MAPPING_CACHE_TTL", "3600")), l1_max_entries=16)
+
 class Mapper:
-    def __init__(self, api_url: str, license_key: str):
+    def __init__(self, api_url: str, license_key: str, cancel_token: Optional[CancellationToken] = None):
         """
         コンストラクタはLinguStruct APIからkey_mapping.jsonを取得します。
 
         :param api_url: LinguStruct APIのkey_mappingエンドポイントURL
         :param license_key: APIアクセスに必要なライセンスキー
+        :param cancel_token: キャンセルされると、キーマッピングの取得とマッピング処理を中断する
         """
+        self.cancel_token = cancel_token or CancellationToken()
         # LinguStruct APIからkey_mapping.jsonを取得
         try:
             headers = {
                 'accept': 'application/json',
                 'LINGUSTRUCT_LICENSE_KEY': license_key
             }
-            logger.info(f"Fetching key mapping from API: {api_url}")
-            response = requests.get(api_url, headers=headers)
-            response.raise_for_status()  # HTTPエラーがあれば例外を発生させる
-            self.key_mapping = response.json()
-            logger.info("Key mapping loaded successfully from API.")
-        except requests.exceptions.RequestException as e:
+            cached = _key_mapping_cache.get(api_url)
+            if cached is not None:
+                self.key_mapping = cached
+                logger.info("Key mapping loaded from cache.")
+            else:
+                logger.info(f"Fetching key mapping from API: {api_url}")
+                self.key_mapping = get_scheduler().call(
+                    "lingustruct", self._request_key_mapping, api_url, headers, self.cancel_token.timeout(),
+                    cancel_token=self.cancel_token
+                )
+                _key_mapping_cache.set(api_url, self.key_mapping)
+                logger.info("Key mapping loaded successfully from API.")
+        except (OSError, UpstreamError) as e:  # requests.RequestException は OSError のサブクラス
             logger.error(f"Failed to fetch key mapping from API: {e}")
             self.key_mapping = {}
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON format received from API: {e}")
             self.key_mapping = {}
 
-        # モジュールマッピング
-        self.section_to_module = {
-            "Meta Information": 1,
-            "Technology Stack": 10,
-            "Dependency Analysis": 17,
-            "Error Handling": 18,
-            "CSS Module": 19,  # 新規追加
-            "Generic File Information": 16,  # 新規追加
-            # 他のモジュールも必要に応じて追加
-        }
+        # キーマッピングの内容に基づくバージョン（設計書のフィンガープリントに利用）
+        self.key_mapping_version = hashlib.sha256(
+            json.dumps(self.key_mapping, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
 
-        # ファイルタイプマッピング
-        self.filetype_to_module = {
-            "json": "Generic File Information",
-            "python": "Python Module",
-            "typescript": "TypeScript Module",
-            "rust": "Rust Module",
-            "go": "Go Module",
-            "javascript": "JavaScript Module",
-            "markdown": "Meta Information",  # README.mdなどに対応
-            "css": "CSS Module",  # 新規追加
-            # その他のファイルタイプも必要に応じて追加
-        }
+        # モジュールの定義（ID・依存関係・フィールドなど）は起動時に読み込んだレジストリから取得する
+        self.registry = get_module_registry()
 
-        # モジュール名からフィールド定義へのマッピング
-        self.module_to_fields = {
-            "Meta Information": {
-                "t_v": {
-                    "type": "string",
-                    "label": "Template Version",
-                    "priority": 1,
-                    "required": True
-                },
-                "p_n": {
-                    "type": "string",
-                    "label": "Project Name",
-                    "priority": 2,
-                    "required": True
-                },
-                "p_v": {
-                    "type": "string",
-                    "label": "Project Version",
-                    "priority": 3,
-                    "required": True
-                },
-                "desc": {
-                    "type": "string",
-                    "label": "Description",
-                    "priority": 4,
-                    "required": True
-                },
-                "scale": {
-                    "type": "string",
-                    "enum": [
-                        "s",
-                        "m",
-                        "l",
-                        "e"
-                    ],
-                    "label": "Scale",
-                    "priority": 5,
-                    "required": True
-                }
-            },
-            "Technology Stack": {
-                "v": {
-                    "type": "string",
-                    "label": "Technology Version",
-                    "priority": 1,
-                    "required": True
-                },
-                "languages": {
-                    "type": "array",
-                    "items": {
-                        "type": "string"
-                    },
-                    "label": "Programming Languages",
-                    "priority": 2,
-                    "required": True
-                },
-                "frameworks": {
-                    "type": "array",
-                    "items": {
-                        "type": "string"
-                    },
-                    "label": "Frameworks",
-                    "priority": 3,
-                    "required": False
-                },
-                "tools": {
-                    "type": "array",
-                    "items": {
-                        "type": "string"
-                    },
-                    "label": "Development Tools",
-                    "priority": 4,
-                    "required": False
-                }
-            },
-            "Dependency Analysis": {
-                "dep_tree": {
-                    "type": "object",
-                    "label": "Dependency Tree",
-                    "priority": 1,
-                    "required": True,
-                    "properties": {
-                        "file": {
-                            "type": "string",
-                            "label": "File Path",
-                            "priority": 1,
-                            "required": True
-                        },
-                        "standard_libraries": {
-                            "type": "array",
-                            "items": {
-                                "type": "string"
-                            },
-                            "label": "Standard Libraries",
-                            "priority": 2,
-                            "required": False
-                        },
-                        "external_libraries": {
-                            "type": "array",
-                            "items": {
-                                "type": "string"
-                            },
-                            "label": "External Libraries",
-                            "priority": 3,
-                            "required": False
-                        },
-                        "custom_modules": {
-                            "type": "array",
-                            "items": {
-                                "type": "string"
-                            },
-                            "label": "Custom Modules",
-                            "priority": 4,
-                            "required": False
-                        },
-                        "dependencies": {
-                            "type": "array",
-                            "items": {
-                                "type": "string"
-                            },
-                            "label": "Dependencies",
-                            "priority": 5,
-                            "required": False
-                        }
-                    }
-                }
-            },
-            "Error Handling": {
-                "error_type": {
-                    "type": "string",
-                    "label": "Error Type",
-                    "enum": [
-                        "Runtime",
-                        "Logic",
-                        "Network",
-                        "Validation",
-                        "Unknown"
-                    ],
-                    "priority": 1,
-                    "required": True
-                },
-                "recovery_strategy": {
-                    "type": "string",
-                    "label": "Recovery Strategy",
-                    "enum": [
-                        "Retry",
-                        "Fallback",
-                        "Abort",
-                        "Log Only",
-                        "Ignore"
-                    ],
-                    "priority": 2,
-                    "required": False
-                },
-                "logging": {
-                    "type": "boolean",
-                    "label": "Enable Logging",
-                    "priority": 3,
-                    "required": False
-                },
-                "notification": {
-                    "type": "string",
-                    "label": "Notification Method",
-                    "enum": [
-                        "Email",
-                        "Slack",
-                        "Webhook",
-                        "None"
-                    ],
-                    "priority": 4,
-                    "required": False
-                }
-            },
-            "CSS Module": {
-                "selectors": {
-                    "type": "array",
-                    "items": {
-                        "type": "string"
-                    },
-                    "label": "CSS Selectors",
-                    "priority": 1,
-                    "required": False
-                }
-            },
-            "Generic File Information": {
-                "file_name": {
-                    "type": "string",
-                    "label": "File Name",
-                    "priority": 1,
-                    "required": True
-                },
-                "file_type": {
-                    "type": "string",
-                    "label": "File Type",
-                    "priority": 2,
-                    "required": True
-                },
-                "size": {
-                    "type": "integer",
-                    "label": "File Size (bytes)",
-                    "priority": 3,
-                    "required": False
-                },
-                "last_modified": {
-                    "type": "string",
-                    "format": "date-time",
-                    "label": "Last Modified",
-                    "priority": 4,
-                    "required": False
-                }
-            }
-            # Add more module fields as needed
-        }
+    @staticmethod
+    def _request_key_mapping(api_url: str, headers: Dict[str, str], timeout: Optional[float] = None) -> Dict[str, Any]:
+        response = lazy_import("requests").get(api_url, headers=headers, timeout=timeout)
+        response.raise_for_status()  # HTTPエラーがあれば例外を発生させる
+        return response.json()
 
-    def map_data_to_modules(self, parsed_data: Dict[str, Any], dependencies: Dict[str, Dict[str, List[str]]], project_meta: Dict[str, Any]) -> Dict[str, Any]:
+    def map_data_to_modules(self, parsed_data: Dict[str, Any], dependencies: Dict[str, Dict[str, List[str]]], project_meta: Dict[str, Any],
+                            file_metadata: Optional[Dict[str, Dict[str, Any]]] = None,
+                            summaries: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         データをテンプレートのモジュールに割り当てます。
 
         :param parsed_data: 各ファイルからパースされたデータ
         :param dependencies: 各ファイルの依存関係
         :param project_meta: プロジェクトのメタ情報
+        :param file_metadata: 各ファイルのサイズ・最終更新日時・コミット数（分かるものだけ）
+        :param summaries: 各ファイルの要約（ファイルごとのモジュールの purpose になる。ないファイルは既定の purpose）
         :return: 完成した設計書のデータ構造
         """
+        file_metadata = file_metadata or {}
+        summaries = summaries or {}
+        self.cancel_token.raise_if_cancelled()
         modules = []
 
-        # モジュール1: Meta Information
-        meta_module = self._create_meta_information_module(project_meta)
-        modules.append(meta_module)
-        logger.debug("Added Meta Information module.")
-
-        # モジュール10: Technology Stack
-        tech_stack_module = self._create_technology_stack_module(parsed_data)
-        modules.append(tech_stack_module)
-        logger.debug("Added Technology Stack module.")
-
-        # モジュール17: Dependency Analysis
-        dependency_module = self._create_dependency_analysis_module(dependencies)
-        modules.append(dependency_module)
-        logger.debug("Added Dependency Analysis module.")
-
-        # モジュール18: Error Handling
-        error_handling_module = self._create_error_handling_module()
-        modules.append(error_handling_module)
-        logger.debug("Added Error Handling module.")
-
-        # モジュール19: CSS Module (新規追加)
-        css_module = self._create_css_module(parsed_data)
-        if css_module:
-            modules.append(css_module)
-            logger.debug("Added CSS Module.")
-
-        # モジュール16: Generic File Information (ファイルごとに追加)
-        generic_module_id = self.section_to_module.get("Generic File Information")
-        if not generic_module_id:
-            logger.error("Generic File Information module ID is not defined.")
-            # Alternatively, define a default ID or raise an error
-            raise ValueError("Generic File Information module ID is not defined.")
-
-        # 他のファイルごとのモジュールを追加
+        # ファイルごとの依存関係を列指向テーブルに変換（集計は一括で行う）
+        dependency_table = DependencyTable.from_dependencies(dependencies)
+
+        # プロジェクト全体のモジュール（Meta Information, Technology Stack など）を依存先から順に作成し、優先度順に並べる
+        builders = {
+            "meta_information": lambda module_id: self._create_meta_information_module(module_id, project_meta),
+            "technology_stack": lambda module_id: self._create_technology_stack_module(module_id, parsed_data, dependency_table),
+            "dependency_analysis": lambda module_id: self._create_dependency_analysis_module(module_id, dependency_table),
+            "error_handling": self._create_error_handling_module,
+            "css": lambda module_id: self._create_css_module(module_id, parsed_data),
+        }
+        for module_id, builder in self.registry.project_builders():
+            module = builders[builder](module_id)
+            if module:
+                modules.append(module)
+                logger.debug("Added %s module.", module["name"])
+        modules.sort(key=lambda module: module["priority"])
+
+        # ファイルごとのモジュールを追加
+        added_ids = {module["id"] for module in modules}
         for file_path, data in parsed_data.items():
-            # ファイル拡張子からファイルタイプを判定
+            self.cancel_token.raise_if_cancelled()
+            # ファイル拡張子からモジュールを判定（対応がなければ Generic File Information）
             file_type = file_path.split('.')[-1].lower()
-            module_name = self.filetype_to_module.get(file_type, "Generic File Information")
-            module_id = self.section_to_module.get(module_name)
-
-            if not module_id:
-                logger.warning(f"No module ID found for module name: {module_name}")
-                continue
+            module_id = self.registry.module_for_file_type(file_type)
+            module_name = self.registry.name(module_id)
+            fields = self.registry.fields(module_id)
 
-            if module_name == "Generic File Information":
+            if self.registry.get(module_id).get("builder") == BUILDER_PER_FILE:
                 # Create a unique entry for each file
                 mapped_content = self._map_fields(data)
-                fields = self.module_to_fields.get(module_name, {})
 
                 # Add additional file-specific fields
                 mapped_content["file_name"] = os.path.basename(file_path)
                 mapped_content["file_type"] = file_type
-                # Assuming 'size' and 'last_modified' are available; if not, they can be omitted or fetched elsewhere
+                # ファイル一覧または git log から一括で収集した値（分からない項目は省略する）
+                for key, value in file_metadata.get(file_path, {}).items():
+                    if key in fields:
+                        mapped_content[key] = value
 
                 module = {
-                    "id": module_id,
-                    "name": module_name,
-                    "path": f"lingustruct/templates/m{module_id}.json",
-                    "schema": f"lingustruct/templates/m{module_id}_s.json",
-                    "dependencies": self.get_module_dependencies(module_id),
-                    "purpose": self.get_module_purpose(module_name),
-                    "category": self.get_module_category(module_name),
-                    "priority": module_id,
+                    **self.registry.describe(module_id),
                     "content": mapped_content,
-                    "fields": fields
+                    "fields": fields,
+                    "file_path": file_path
                 }
+                if file_path in summaries:
+                    module["purpose"] = summaries[file_path]
                 modules.append(module)
-                logger.debug(f"Added {module_name} module for file: {file_path}")
+                logger.debug("Added %s module for file: %s", module_name, file_path, extra=sample(100))
             else:
                 # For non-generic modules, skip if already added
-                if any(mod["id"] == module_id for mod in modules):
-                    logger.debug(f"Module {module_name} already added. Skipping.")
+                if module_id in added_ids:
+                    logger.debug("Module %s already added. Skipping.", module_name, extra=sample(100))
                     continue
 
                 # For other modules, map as usual
-                mapped_content = self._map_fields(data)
-                fields = self.module_to_fields.get(module_name, {})
-
                 module = {
-                    "id": module_id,
-                    "name": module_name,
-                    "path": f"lingustruct/templates/m{module_id}.json",
-                    "schema": f"lingustruct/templates/m{module_id}_s.json",
-                    "dependencies": self.get_module_dependencies(module_id),
-                    "purpose": self.get_module_purpose(module_name),
-                    "category": self.get_module_category(module_name),
-                    "priority": module_id,
-                    "content": mapped_content,
+                    **self.registry.describe(module_id),
+                    "content": self._map_fields(data),
                     "fields": fields
                 }
                 modules.append(module)
-                logger.debug(f"Added {module_name} module for file: {file_path}")
+                added_ids.add(module_id)
+                logger.debug("Added %s module for file: %s", module_name, file_path, extra=sample(100))
 
         # Optional: Add relationships based on dependencies
         relationships = self._create_relationships(dependencies)
@@ -393,118 +169,92 @@ class Mapper:
 
         return final_data
 
-    def _create_meta_information_module(self, project_meta: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_meta_information_module(self, module_id: int, project_meta: Dict[str, Any]) -> Dict[str, Any]:
         """
         Meta Informationモジュールを作成します。
 
+        :param module_id: モジュールのID
         :param project_meta: プロジェクトのメタ情報
         :return: Meta Informationモジュールの辞書
         """
         # フィールドのキーをマッピング
         mapped_meta = self._map_fields(project_meta)
-        fields = self.module_to_fields.get("Meta Information", {})
+        fields = self.registry.fields(module_id)
         return {
-            "id": self.section_to_module["Meta Information"],
-            "name": "Meta Information",
-            "path": "lingustruct/templates/m1.json",
-            "schema": "lingustruct/templates/m1_s.json",
-            "dependencies": [],
-            "purpose": "Defines the metadata and project scope.",
-            "category": "Metadata",
-            "priority": 1,
+            **self.registry.describe(module_id),
             "content": mapped_meta,
             "fields": fields
         }
 
-    def _create_technology_stack_module(self, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_technology_stack_module(self, module_id: int, parsed_data: Dict[str, Any], dependency_table: DependencyTable) -> Dict[str, Any]:
         """
         Technology Stackモジュールを作成します。
 
+        :param module_id: モジュールのID
         :param parsed_data: 各ファイルからパースされたデータ
+        :param dependency_table: 列指向の依存関係テーブル
         :return: Technology Stackモジュールの辞書
         """
-        tech_stack_content = {
-            "languages": set(),
-            "frameworks": set(),
-            "tools": set(),
-        }
-        for file_path, file_data in parsed_data.items():
-            # Collect languages based on file type
-            file_type = file_path.split('.')[-1].lower()
-            language = self._map_language(file_type)
+        # 拡張子ごとにまとめてから言語名に変換
+        extension_counts = Counter(file_path.rsplit('.', 1)[-1].lower() for file_path in parsed_data)
+        languages = set()
+        for file_type in extension_counts:
+            language = self._map_language(EXTENSION_TO_LANGUAGE.get(file_type, file_type))
             if language:
-                tech_stack_content["languages"].add(language)
+                languages.add(language)
 
-            # Collect external libraries and custom modules as tools
-            external_libraries = file_data.get("external_libraries", [])
-            custom_modules = file_data.get("custom_modules", [])
-            tech_stack_content["tools"].update(external_libraries)
-            tech_stack_content["tools"].update(custom_modules)
+        # 外部ライブラリを一括で集計し、既知のフレームワークとそれ以外のツールに分類
+        # （ロックファイルだけが選択されたエコシステムは、その解決済みパッケージを外部ライブラリとして扱う）
+        external_libraries = dependency_table.distinct(KIND_EXTERNAL) | dependency_table.lockfile_packages()
+        frameworks = dependency_table.frameworks()
+        tools = external_libraries.difference(frameworks)
+        resolved_versions = dependency_table.resolved_versions()
 
-            # If frameworks are part of external libraries, you might need to separate them
-            # For simplicity, assuming frameworks are identified separately
-            # You can implement additional logic to classify frameworks if needed
-
-        # Optionally, define frameworks based on known frameworks
-        known_frameworks = {"FastAPI", "React", "Django", "Flask", "Express", "Vue", "Angular"}
-        tech_stack_content["frameworks"] = tech_stack_content["tools"].intersection(known_frameworks)
-        tech_stack_content["tools"] = tech_stack_content["tools"].difference(known_frameworks)
-
-        fields = self.module_to_fields.get("Technology Stack", {})
+        fields = self.registry.fields(module_id)
 
         return {
-            "id": self.section_to_module["Technology Stack"],
-            "name": "Technology Stack",
-            "path": "lingustruct/templates/m10.json",
-            "schema": "lingustruct/templates/m10_s.json",
-            "dependencies": [1],
-            "purpose": "Describes the languages, frameworks, and tools used in the project.",
-            "category": "Technology",
-            "priority": 10,
+            **self.registry.describe(module_id),
             "content": {
-                "languages": sorted(list(tech_stack_content["languages"])),
-                "frameworks": sorted(list(tech_stack_content["frameworks"])),
-                "tools": sorted(list(tech_stack_content["tools"]))
+                "languages": sorted(languages),
+                "frameworks": sorted(set(frameworks.values())),
+                "tools": sorted(tools),
+                # ロックファイルで解決済みのバージョン（分かるものだけ）
+                "versions": {name: resolved_versions[name] for name in sorted(external_libraries) if name in resolved_versions}
             },
             "fields": fields
         }
 
-    def _create_dependency_analysis_module(self, dependencies: Dict[str, Dict[str, List[str]]]) -> Dict[str, Any]:
+    def _create_dependency_analysis_module(self, module_id: int, dependency_table: DependencyTable, top_n: int = 10) -> Dict[str, Any]:
         """
         Dependency Analysisモジュールを作成します。
 
-        :param dependencies: 各ファイルの依存関係
+        :param module_id: モジュールのID
+        :param dependency_table: 列指向の依存関係テーブル
+        :param top_n: 使用数上位として報告するライブラリ数
         :return: Dependency Analysisモジュールの辞書
         """
-        # フィールドのキーをマッピング
-        dep_tree = {}
-        for file, deps in dependencies.items():
-            dep_tree[file] = {
-                "standard_libraries": deps.get("standard_libraries", []),
-                "external_libraries": deps.get("external_libraries", []),
-                "custom_modules": deps.get("custom_modules", []),
-                "dependencies": deps.get("dependencies", [])
-            }
+        dep_tree = dependency_table.to_dep_tree()
 
-        fields = self.module_to_fields.get("Dependency Analysis", {})
+        fields = self.registry.fields(module_id)
 
         return {
-            "id": self.section_to_module["Dependency Analysis"],
-            "name": "Dependency Analysis",
-            "path": "lingustruct/templates/m17.json",
-            "schema": "lingustruct/templates/m17_s.json",
-            "dependencies": [16],  # Generic File Information に依存
-            "purpose": "Tracks dependency relationships between files.",
-            "category": "Dependency Analysis",
-            "priority": 17,
+            **self.registry.describe(module_id),
             "content": dep_tree,
+            "summary": {
+                "library_usage": dict(dependency_table.usage_counts(KIND_EXTERNAL)),
+                "top_external_libraries": dependency_table.top_n(KIND_EXTERNAL, top_n),
+                "top_standard_libraries": dependency_table.top_n(KIND_STANDARD, top_n),
+                "top_custom_modules": dependency_table.top_n(KIND_CUSTOM, top_n),
+                "declared_dependencies": dependency_table.declared_versions()
+            },
             "fields": fields
         }
 
-    def _create_error_handling_module(self) -> Dict[str, Any]:
+    def _create_error_handling_module(self, module_id: int) -> Dict[str, Any]:
         """
         Error Handlingモジュールを作成します。
 
+        :param module_id: モジュールのID
         :return: Error Handlingモジュールの辞書
         """
         # デフォルトのエラーハンドリング内容を使用
@@ -516,48 +266,35 @@ class Mapper:
         }
         # フィールドのキーをマッピング
         mapped_error_handling = self._map_fields(error_handling_content)
-        fields = self.module_to_fields.get("Error Handling", {})
+        fields = self.registry.fields(module_id)
         return {
-            "id": self.section_to_module["Error Handling"],
-            "name": "Error Handling",
-            "path": "lingustruct/templates/m18.json",
-            "schema": "lingustruct/templates/m18_s.json",
-            "dependencies": [],
-            "purpose": "Defines the method for handling errors.",
-            "category": "Error Management",
-            "priority": 18,
+            **self.registry.describe(module_id),
             "content": mapped_error_handling,
             "fields": fields
         }
 
-    def _create_css_module(self, parsed_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def _create_css_module(self, module_id: int, parsed_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         CSS Moduleを作成します。
 
+        :param module_id: モジュールのID
         :param parsed_data: 各ファイルからパースされたデータ
         :return: CSS Moduleの辞書またはNone
         """
         css_selectors = set()
         for file_path, file_data in parsed_data.items():
             file_type = file_path.split('.')[-1].lower()
-            if file_type == "css":
+            if self.registry.module_for_file_type(file_type) == module_id:
                 selectors = file_data.get("selectors", [])
                 css_selectors.update(selectors)
         
         if not css_selectors:
             return None
 
-        fields = self.module_to_fields.get("CSS Module", {})
+        fields = self.registry.fields(module_id)
 
         return {
-            "id": self.section_to_module["CSS Module"],
-            "name": "CSS Module",
-            "path": "lingustruct/templates/m19.json",
-            "schema": "lingustruct/templates/m19_s.json",
-            "dependencies": [],
-            "purpose": "Describes the CSS selectors used in the project.",
-            "category": "Style",
-            "priority": 19,
+            **self.registry.describe(module_id),
             "content": {
                 "selectors": sorted(list(css_selectors))
             },
@@ -571,97 +308,7 @@ class Mapper:
         :param module_id: モジュールのID
         :return: 依存モジュールのIDリスト
         """
-        dependencies = []
-        # 各モジュールの依存関係を定義
-        if module_id == 2:
-            dependencies = [1]
-        elif module_id == 3:
-            dependencies = [1, 2]
-        elif module_id == 4:
-            dependencies = [1]
-        elif module_id == 5:
-            dependencies = [1]
-        elif module_id == 6:
-            dependencies = [1]
-        elif module_id == 7:
-            dependencies = [1, 2]
-        elif module_id == 8:
-            dependencies = [1, 2, 3]
-        elif module_id == 9:
-            dependencies = [1]
-        elif module_id == 10:
-            dependencies = [1]
-        elif module_id in [11, 12, 13, 14, 15]:
-            dependencies = [1, 10]
-        elif module_id == 16:
-            dependencies = []
-        elif module_id == 17:
-            dependencies = [16]
-        elif module_id == 18:
-            dependencies = []
-        elif module_id == 19:
-            dependencies = []
-        return dependencies
-
-    def get_module_purpose(self, module_name: str) -> str:
-        """
-        モジュール名に基づいてpurposeを返します。
-
-        :param module_name: モジュール名
-        :return: モジュールのpurpose
-        """
-        purposes = {
-            "Meta Information": "Defines the metadata and project scope.",
-            "Architecture Information": "Describes the system's architecture and components.",
-            "Dependency Resolution": "Specifies the dependency resolution strategy between modules.",
-            "Error Handling": "Defines error handling strategies for different system components.",
-            "Priority Management": "Manages task priorities across the system.",
-            "Abbreviations and Glossary": "Defines abbreviations and key terms used in the project.",
-            "Term Mappings": "Maps key concepts to implementation patterns and dependencies.",
-            "Property Order Definition": "Defines the order in which properties are processed and prioritized.",
-            "Version Control": "Specifies the versioning strategy for the project.",
-            "Technology Stack": "Describes the languages, frameworks, and tools used in the project.",
-            "TypeScript Module": "Describes key aspects of TypeScript files in the project.",
-            "Python Module": "Describes key aspects of Python files in the project.",
-            "Rust Module": "Describes key aspects of Rust files in the project.",
-            "Go Module": "Describes key aspects of Go files in the project.",
-            "JavaScript Module": "Describes key aspects of JavaScript files in the project.",
-            "CSS Module": "Describes key aspects of CSS files in the project.",
-            "Generic File Information": "Stores general file metadata.",
-            "Dependency Analysis": "Tracks dependency relationships between files.",
-            "Error Handling": "Defines the method for handling errors."
-        }
-        return purposes.get(module_name, "")
-
-    def get_module_category(self, module_name: str) -> str:
-        """
-        モジュール名に基づいてcategoryを返します。
-
-        :param module_name: モジュール名
-        :return: モジュールのcategory
-        """
-        categories = {
-            "Meta Information": "Metadata",
-            "Architecture Information": "Architecture",
-            "Dependency Resolution": "Configuration",
-            "Error Handling": "Error Management",
-            "Priority Management": "Task Management",
-            "Abbreviations and Glossary": "Documentation",
-            "Term Mappings": "Mapping",
-            "Property Order Definition": "Configuration",
-            "Version Control": "Versioning",
-            "Technology Stack": "Technology",
-            "TypeScript Module": "File Specific",
-            "Python Module": "File Specific",
-            "Rust Module": "File Specific",
-            "Go Module": "File Specific",
-            "JavaScript Module": "File Specific",
-            "CSS Module": "File Specific",
-            "Generic File Information": "General",
-            "Dependency Analysis": "Dependency Analysis",
-            "Error Handling": "Error Management"
-        }
-        return categories.get(module_name, "")
+        return self.registry.dependencies(module_id)
 
     def _map_fields(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -705,10 +352,9 @@ class Mapper:
 
         # Assign unique IDs to file-specific modules
         # For 'Generic File Information', since it can represent multiple files, assign module ID to each file
-        generic_module_id = self.section_to_module.get("Generic File Information")
-        if generic_module_id:
-            for file_path in dependencies.keys():
-                file_to_module_id[file_path] = generic_module_id
+        generic_module_id = self.registry.default_file_module
+        for file_path in dependencies.keys():
+            file_to_module_id[file_path] = generic_module_id
 
         # Create relationships based on dependencies
         for source_file, deps in dependencies.items():
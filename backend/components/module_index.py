@@ -0,0 +1,151 @@
+import re
+import sys
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set
+from components.manifest_analyzer import ManifestAnalyzer
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# インデックスの構造や分類規則を変更した場合はインクリメントする
+INDEX_VERSION = 2
+
+NODE_BUILTIN_MODULES = frozenset({
+    "assert", "async_hooks", "buffer", "child_process", "cluster", "console", "constants",
+    "crypto", "dgram", "diagnostics_channel", "dns", "domain", "events", "fs", "http", "http2",
+    "https", "inspector", "module", "net", "os", "path", "perf_hooks", "process", "punycode",
+    "querystring", "readline", "repl", "stream", "string_decoder", "sys", "timers", "tls",
+    "trace_events", "tty", "url", "util", "v8", "vm", "wasi", "worker_threads", "zlib", "test",
+})
+
+# 配布パッケージ名とimport名が異なる代表的なPythonパッケージ
+PYTHON_DISTRIBUTION_ALIASES = {
+    "pyyaml": "yaml",
+    "python-dotenv": "dotenv",
+    "beautifulsoup4": "bs4",
+    "pillow": "PIL",
+    "scikit-learn": "sklearn",
+    "opencv-python": "cv2",
+    "python-dateutil": "dateutil",
+    "psycopg2-binary": "psycopg2",
+    "protobuf": "google",
+}
+
+# TypeScript/JavaScriptでよく使われるリポジトリ内パスのエイリアス
+LOCAL_ALIAS_PREFIXES = ("@/", "~/", "#/", "src/")
+
+@lru_cache(maxsize=1)
+def python_stdlib_index() -> FrozenSet[str]:
+    """実行中のPythonの標準ライブラリ名（トップレベル）のインデックス。プロセスごとに1回だけ構築されます。"""
+    names = frozenset(sys.stdlib_module_names) | frozenset(sys.builtin_module_names)
+    logger.debug("Built Python stdlib index: %d modules", len(names))
+    return names
+
+
+def normalize_package_name(name: str) -> str:
+    """PEP 503 に従ってパッケージ名を正規化します。"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def index_version() -> str:
+    """インデックスのバージョン文字列（分類結果のキャッシュキーに利用）"""
+    return f"{INDEX_VERSION}-py{sys.version_info.major}.{sys.version_info.minor}"
+
+
+class ModuleResolver:
+    def __init__(self, local_modules: FrozenSet[str], python_packages: FrozenSet[str], node_packages: FrozenSet[str], manifests: Dict[str, Optional[Dict[str, Any]]] = None):
+        """
+        選択されたファイル群に対する依存関係の分類器。
+        すべての判定は事前構築した集合へのO(1)の参照で行われます。
+        """
+        self.local_modules = local_modules
+        self.python_packages = python_packages
+        self.node_packages = node_packages
+        self.manifests = manifests or {}  # 解析済みマニフェスト（ファイルごとの再解析を避ける）
+        self.python_stdlib = python_stdlib_index()
+
+    @classmethod
+    def from_selection(cls, file_contents: Dict[str, str], file_paths: Optional[Iterable[str]] = None) -> "ModuleResolver":
+        """
+        選択されたファイルのパスとマニフェスト（requirements.txt / pyproject.toml / package.json / ロックファイル）から分類器を構築します。
+
+        :param file_contents: マニフェストを含むファイルの内容
+        :param file_paths: 選択されたすべてのパス（省略時は file_contents のキー）
+        """
+        python_packages: Set[str] = set()
+        node_packages: Set[str] = set()
+        manifests = {}
+        for file_path, content in file_contents.items():
+            if not ManifestAnalyzer.is_manifest(file_path):
+                continue
+            manifest = manifests[file_path] = ManifestAnalyzer.analyze(file_path, content)
+            if not manifest:
+                continue
+            if manifest["ecosystem"] == "python":
+                python_packages.update(manifest["declared"], manifest["resolved"])
+            elif manifest["ecosystem"] == "node":
+                node_packages.update(manifest["declared"], manifest["resolved"])
+
+        resolved_python = set()
+        for package in python_packages:
+            normalized = normalize_package_name(package)
+            resolved_python.add(normalized)
+            alias = PYTHON_DISTRIBUTION_ALIASES.get(normalized)
+            if alias:
+                resolved_python.add(normalize_package_name(alias))
+
+        return cls(
+            local_modules=build_local_module_index(file_paths if file_paths is not None else file_contents.keys()),
+            python_packages=frozenset(resolved_python),
+            node_packages=frozenset(node_packages),
+            manifests=manifests,
+        )
+
+    def classify_python(self, module_name: str) -> str:
+        """
+        Pythonのトップレベルモジュール名を "standard" / "custom" / "external" に分類します。
+        """
+        if module_name in self.python_stdlib:
+            return "standard"
+        if module_name in self.local_modules and normalize_package_name(module_name) not in self.python_packages:
+            return "custom"
+        return "external"
+
+    def classify_node(self, specifier: str) -> str:
+        """
+        TypeScript/JavaScriptのimport指定子を "standard" / "custom" / "external" に分類します。
+        """
+        if specifier.startswith((".", "/")) or specifier.startswith(LOCAL_ALIAS_PREFIXES):
+            return "custom"
+        bare = specifier[5:] if specifier.startswith("node:") else specifier
+        if bare.split("/", 1)[0] in NODE_BUILTIN_MODULES:
+            return "standard"
+        package = package_name_from_specifier(specifier)
+        if package in self.node_packages:
+            return "external"
+        # マニフェストに宣言されておらず、リポジトリ内のディレクトリ名で始まるパスはパスエイリアスとみなす
+        if package.split("/", 1)[0] in self.local_modules:
+            return "custom"
+        return "external"
+
+
+def package_name_from_specifier(specifier: str) -> str:
+    """'@scope/pkg/sub' → '@scope/pkg', 'pkg/sub' → 'pkg'"""
+    parts = specifier.split("/")
+    if specifier.startswith("@") and len(parts) > 1:
+        return "/".join(parts[:2])
+    return parts[0]
+
+
+def build_local_module_index(file_paths: Iterable[str]) -> FrozenSet[str]:
+    """
+    選択されたファイルのパスからリポジトリ内のモジュール名（ディレクトリ名とファイル名の語幹）を収集します。
+    """
+    names = set()
+    for path in file_paths:
+        parts = path.strip("/").split("/")
+        names.update(parts[:-1])
+        stem = parts[-1].split(".", 1)[0]
+        if stem and stem != "__init__":
+            names.add(stem)
+    return frozenset(names)
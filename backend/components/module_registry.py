@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# モジュール定義のファイル（既定は components/module_registry.json）
+MODULE_REGISTRY_PATH = os.getenv(
+    "MODULE_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "module_registry.json")
+)
+
+# Mapper がモジュールを作る方法。per_file はファイルごとに1つ、それ以外はプロジェクト全体で1つ
+BUILDER_PER_FILE = "per_file"
+BUILDERS = ("meta_information", "technology_stack", "dependency_analysis", "error_handling", "css", BUILDER_PER_FILE)
+
+
+class ModuleRegistryError(ValueError):
+    pass
+
+
+class ModuleRegistry:
+    def __init__(self, definition: Dict[str, Any]):
+        """
+        設計書のモジュール（ID・名前・目的・カテゴリ・依存関係・フィールド定義・対応する拡張子）の一覧。
+        読み込み時に定義を検証し、依存先が先に来る順序（Mapper がモジュールを作る順序）を求めておきます。
+
+        :param definition: module_registry.json の内容
+        """
+        self.modules: Dict[int, Dict[str, Any]] = {}
+        for module in definition.get("modules", []):
+            module_id = module.get("id")
+            if not isinstance(module_id, int) or module_id in self.modules:
+                raise ModuleRegistryError(f"Module id must be a unique integer: {module_id!r}")
+            if not module.get("name"):
+                raise ModuleRegistryError(f"Module {module_id} has no name")
+            self.modules[module_id] = module
+
+        for module_id, module in self.modules.items():
+            for dependency in module.get("dependencies", []):
+                if dependency not in self.modules:
+                    raise ModuleRegistryError(f"Module {module_id} depends on unknown module {dependency}")
+            builder = module.get("builder")
+            if builder is not None and builder not in BUILDERS:
+                raise ModuleRegistryError(f"Module {module_id} has unknown builder {builder!r}")
+
+        self.default_file_module: int = definition.get("default_file_module")
+        if self.modules.get(self.default_file_module, {}).get("builder") != BUILDER_PER_FILE:
+            raise ModuleRegistryError(f"default_file_module must be a per_file module: {self.default_file_module!r}")
+        self._file_types: Dict[str, int] = {}
+        for module_id, module in self.modules.items():
+            for file_type in module.get("file_types", []):
+                if file_type in self._file_types:
+                    raise ModuleRegistryError(f"File type {file_type} is mapped to more than one module")
+                self._file_types[file_type] = module_id
+
+        self.order = self._topological_order()
+
+        self.version = hashlib.sha256(json.dumps(definition, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def _topological_order(self) -> List[int]:
+        """
+        依存先が先に来る順序を返します。依存先がすべて並んだモジュールの中では優先度順。
+        循環がある場合は ModuleRegistryError。
+        """
+        remaining = {module_id: set(module.get("dependencies", [])) for module_id, module in self.modules.items()}
+        order: List[int] = []
+        while remaining:
+            level = sorted((module_id for module_id, deps in remaining.items() if not deps), key=self.priority)
+            if not level:
+                raise ModuleRegistryError(f"Module dependencies contain a cycle: {sorted(remaining)}")
+            for module_id in level:
+                del remaining[module_id]
+            for deps in remaining.values():
+                deps.difference_update(level)
+            order.extend(level)
+        return order
+
+    def get(self, module_id: int) -> Optional[Dict[str, Any]]:
+        return self.modules.get(module_id)
+
+    def module_for_file_type(self, file_type: str) -> int:
+        """拡張子に対応するモジュールのID（対応がなければ default_file_module）"""
+        return self._file_types.get(file_type, self.default_file_module)
+
+    def name(self, module_id: int) -> str:
+        return self.modules[module_id]["name"]
+
+    def priority(self, module_id: int) -> int:
+        return self.modules[module_id].get("priority", module_id)
+
+    def dependencies(self, module_id: int) -> List[int]:
+        module = self.modules.get(module_id)
+        return list(module.get("dependencies", [])) if module else []
+
+    def fields(self, module_id: int) -> Dict[str, Any]:
+        module = self.modules.get(module_id)
+        return module.get("fields", {}) if module else {}
+
+    def built_modules(self) -> List[int]:
+        """Mapper が作るモジュール（依存先が先に来る順）"""
+        return [module_id for module_id in self.order if self.modules[module_id].get("builder") is not None]
+
+    def project_builders(self) -> List[Tuple[int, str]]:
+        """プロジェクト全体で1つ作るモジュールと、その作り方（依存先が先に来る順）"""
+        return [
+            (module_id, self.modules[module_id]["builder"]) for module_id in self.built_modules()
+            if self.modules[module_id]["builder"] != BUILDER_PER_FILE
+        ]
+
+    def describe(self, module_id: int) -> Dict[str, Any]:
+        """設計書のモジュールに共通する項目"""
+        module = self.modules[module_id]
+        return {
+            "id": module_id,
+            "name": module["name"],
+            "path": f"lingustruct/templates/m{module_id}.json",
+            "schema": f"lingustruct/templates/m{module_id}_s.json",
+            "dependencies": self.dependencies(module_id),
+            "purpose": module.get("purpose", ""),
+            "category": module.get("category", ""),
+            "priority": self.priority(module_id),
+        }
+
+    def relationships(self, module_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """
+        設計書に含まれるモジュールの間の依存関係。依存先を source、依存するモジュールを target とします。
+        """
+        present = set(module_ids)
+        relationships = []
+        for module_id in self.order:
+            if module_id not in present:
+                continue
+            for dependency in self.dependencies(module_id):
+                if dependency in present:
+                    relationships.append({
+                        "source": dependency,
+                        "target": module_id,
+                        "type": "dependency",
+                        "description": f"{self.name(module_id)} depends on {self.name(dependency)}."
+                    })
+        return relationships
+
+
+_registry: Optional[ModuleRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def load_module_registry(path: str = MODULE_REGISTRY_PATH) -> ModuleRegistry:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            definition = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ModuleRegistryError(f"Could not load module registry from {path}: {e}") from e
+    return ModuleRegistry(definition)
+
+
+def get_module_registry() -> ModuleRegistry:
+    """プロセス共通のモジュール定義。初回の呼び出し（起動時）に読み込んで検証する"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = load_module_registry()
+            logger.info(f"Module registry loaded: {len(_registry.modules)} modules "
+                        f"(version {_registry.version})")
+        return _registry
@@ -1,6 +1,8 @@
 import json
+import os
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from components.tree_sitter_engine import get_tree_sitter_engine
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -22,12 +24,39 @@ EXTENSION_TO_LANGUAGE = {
 # サポートされる言語名
 SUPPORTED_LANGUAGES = {"json", "python", "typescript", "rust", "go", "javascript", "markdown", "css"}
 
+# パースエンジン: "regex"（既定）または "tree-sitter"（tree_sitter と各言語の文法パッケージが必要）
+PARSER_ENGINE = os.getenv("PARSER_ENGINE", "regex")
+
+
+def parser_engine() -> str:
+    """実際に使われるパースエンジン名（パース結果や設計書のキャッシュキーに利用）"""
+    if PARSER_ENGINE == "tree-sitter" and get_tree_sitter_engine() is not None:
+        return "tree-sitter"
+    return "regex"
+
+
 class Parser:
-    def __init__(self):
-        pass
+    def __init__(self, engine: Optional[str] = None):
+        """
+        :param engine: パースエンジン（省略時は環境変数 PARSER_ENGINE）。tree-sitter が使えない言語は正規表現で解析する
+        """
+        engine = engine or PARSER_ENGINE
+        self.tree_sitter = get_tree_sitter_engine() if engine == "tree-sitter" else None
+
+    def engine_for(self, file_type: str) -> str:
+        """指定した拡張子のファイルに使われるパースエンジン名"""
+        if self.tree_sitter is not None and self.tree_sitter.supports(file_type):
+            return "tree-sitter"
+        return "regex"
 
     def parse_file(self, file_path: str, file_content: str, file_type: str) -> Dict[str, Any]:
-        logger.info(f"Parsing file: {file_path} of type: {file_type}")
+        logger.debug("Parsing file: %s of type: %s", file_path, file_type)
+
+        if self.engine_for(file_type) == "tree-sitter":
+            try:
+                return self.tree_sitter.parse(file_path, file_content, file_type)
+            except Exception as e:
+                logger.warning(f"tree-sitter failed to parse {file_path}; falling back to regex parser: {e}")
 
         # 拡張子から言語名を取得
         language = EXTENSION_TO_LANGUAGE.get(file_type)
@@ -73,7 +102,7 @@ class Parser:
             functions = re.findall(r'def (\w+)\(', file_content)
             classes = re.findall(r'class (\w+)\(', file_content)
             imports = re.findall(r'from (\S+) import', file_content) + re.findall(r'import (\S+)', file_content)
-            logger.debug(f"Parsed Python code: {len(functions)} functions, {len(classes)} classes, {len(imports)} imports.")
+            logger.debug("Parsed Python code: %d functions, %d classes, %d imports.", len(functions), len(classes), len(imports))
             return {
                 "functions": functions,
                 "classes": classes,
@@ -88,7 +117,7 @@ class Parser:
             interfaces = re.findall(r'interface (\w+)', file_content)
             functions = re.findall(r'function (\w+)\(', file_content)
             classes = re.findall(r'class (\w+)\(', file_content)
-            logger.debug(f"Parsed TypeScript code: {len(interfaces)} interfaces, {len(functions)} functions, {len(classes)} classes.")
+            logger.debug("Parsed TypeScript code: %d interfaces, %d functions, %d classes.", len(interfaces), len(functions), len(classes))
             return {
                 "interfaces": interfaces,
                 "functions": functions,
@@ -104,7 +133,7 @@ class Parser:
             structs = re.findall(r'struct (\w+)', file_content)
             enums = re.findall(r'enum (\w+)', file_content)
             imports = re.findall(r'use (\S+);', file_content)
-            logger.debug(f"Parsed Rust code: {len(functions)} functions, {len(structs)} structs, {len(enums)} enums, {len(imports)} imports.")
+            logger.debug("Parsed Rust code: %d functions, %d structs, %d enums, %d imports.", len(functions), len(structs), len(enums), len(imports))
             return {
                 "functions": functions,
                 "structs": structs,
@@ -120,7 +149,7 @@ class Parser:
             functions = re.findall(r'func (\w+)\(', file_content)
             structs = re.findall(r'type (\w+) struct', file_content)
             imports = re.findall(r'import\s+"([^"]+)"', file_content)
-            logger.debug(f"Parsed Go code: {len(functions)} functions, {len(structs)} structs, {len(imports)} imports.")
+            logger.debug("Parsed Go code: %d functions, %d structs, %d imports.", len(functions), len(structs), len(imports))
             return {
                 "functions": functions,
                 "structs": structs,
@@ -135,7 +164,7 @@ class Parser:
             functions = re.findall(r'function (\w+)\(', file_content)
             classes = re.findall(r'class (\w+)\s+{', file_content)
             imports = re.findall(r'import .* from [\'"]([^\'"]+)[\'"]', file_content)
-            logger.debug(f"Parsed JavaScript code: {len(functions)} functions, {len(classes)} classes, {len(imports)} imports.")
+            logger.debug("Parsed JavaScript code: %d functions, %d classes, %d imports.", len(functions), len(classes), len(imports))
             return {
                 "functions": functions,
                 "classes": classes,
@@ -148,7 +177,7 @@ class Parser:
     def parse_markdown(self, file_content: str) -> Dict[str, Any]:
         try:
             headers = re.findall(r'^(#+)\s+(.*)', file_content, re.MULTILINE)
-            logger.debug(f"Parsed Markdown: {len(headers)} headers.")
+            logger.debug("Parsed Markdown: %d headers.", len(headers))
             return {"headers": headers}
         except Exception as e:
             logger.error(f"Error parsing Markdown: {e}")
@@ -158,7 +187,7 @@ class Parser:
         try:
             # 基本的なCSSのパース例（必要に応じて詳細な解析を追加）
             selectors = re.findall(r'([^{]+){', file_content)
-            logger.debug(f"Parsed CSS: {len(selectors)} selectors.")
+            logger.debug("Parsed CSS: %d selectors.", len(selectors))
             return {"selectors": selectors}
         except Exception as e:
             logger.error(f"Error parsing CSS file: {e}")
@@ -0,0 +1,559 @@
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import time
+import uuid
+from typing import Any, Dict, List, MutableMapping, Optional, Tuple
+from components.api_clients import get_api_clients
+from components.data_fetcher import DataFetcher
+from components.parser import Parser, parser_engine
+from components.mapper import Mapper
+from components.document_generator import DocumentGenerator, TemplateUnavailableError
+from components.manifest_analyzer import ManifestAnalyzer
+from components.module_index import ModuleResolver, index_version
+from components.file_metadata import collect_file_metadata, local_repo_path, local_tree_sha, metadata_digest
+from components.file_priority import GenerationBudget, ImportGraph, rank_files
+from components.summarizer import FILE_SUMMARIES, FileSummarizer, summary_version
+from components.document_cache import PIPELINE_VERSION, DocumentCache, compute_fingerprint, content_hash
+from components.run_checkpoint import RunCheckpoint, CheckpointMismatchError, InvalidRunIdError, open_checkpoint
+from components.cancellation import CancellationToken, OperationCancelled, REASON_DEADLINE_EXCEEDED
+from components.shared_cache import SharedCache
+from components.symbol_index import extract_imports, get_symbol_index
+from components.spill_store import SpillableStore
+from components.temp_storage_manager import TempStorageManager
+from utils.logger import capped, set_log_context, setup_logger
+
+logger = setup_logger(__name__)
+
+KEY_MAPPING_API_URL = "https://lingustruct.onrender.com/lingu_struct/key_mapping"  # APIエンドポイントURL
+
+# 0より大きい場合はアウトオブコアモードで実行し、中間結果がこの量（MB）を超えるとディスクに退避する
+PIPELINE_MEMORY_BUDGET_MB = float(os.getenv("PIPELINE_MEMORY_BUDGET_MB", "0"))
+
+document_cache = DocumentCache()
+
+# パース結果のキャッシュ（(engine, file_type, content_hash) → parsed）。パーサーの出力形式を変えた場合は名前空間を更新する
+_parse_cache = SharedCache("parse-v1", ttl=float(os.getenv("PARSE_CACHE_TTL", "86400")), l1_max_entries=5000)
+
+# リビジョンごとの生成済み設計書の索引の有効秒数
+REVISION_INDEX_TTL = float(os.getenv("REVISION_INDEX_TTL", str(7 * 24 * 3600)))
+# push webhook で受け取ったブランチの先頭のコミット（(repo, branch) → sha）
+_branch_heads = SharedCache("branch-head", ttl=REVISION_INDEX_TTL, l1_max_entries=1000)
+# (repo, branch, commit, 選択, リビジョン, バージョン) → 設計書のフィンガープリント。
+# ファイルの内容を取得せずに、事前生成（または以前に生成）された設計書を見つけるために使う
+_revision_index = SharedCache("revision-document", ttl=REVISION_INDEX_TTL, l1_max_entries=10000)
+
+
+class PipelineError(Exception):
+    """パイプラインがHTTPエラーとして返すべき失敗"""
+
+    def __init__(self, status_code: int, detail: str, run_id: Optional[str] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.run_id = run_id
+
+
+def run_design_document_pipeline(env: Dict[str, str], repo_name: str, branch_name: str, selected_files: List[str],
+                                 commit_sha: Optional[str] = None, run_id: Optional[str] = None,
+                                 cancel_token: Optional[CancellationToken] = None,
+                                 budget: Optional[GenerationBudget] = None) -> Tuple[Dict[str, Any], str, str, List[str]]:
+    """
+    ファイル取得から設計書生成までのパイプラインを実行します。
+    入力のフィンガープリントが一致する設計書がキャッシュにあれば、それを返します。
+    各ステージの結果は実行IDごとにチェックポイントとして保存され、失敗・中断した実行を同じ実行IDで
+    再度呼び出すと、未完了の処理だけをやり直します。
+    予算付きの場合は重要度の高いファイルから処理し、予算内で処理できたファイルだけで設計書を生成します。
+    後回しにしたファイルは、同じ実行IDで再度呼び出すと処理されます。
+
+    :param env: load_environment() で読み込んだ環境変数
+    :param repo_name: リポジトリ名
+    :param branch_name: ブランチ名
+    :param selected_files: 対象ファイルのパス
+    :param commit_sha: 対象のコミット（指定された場合はフィンガープリントに含める）
+    :param run_id: 再開する実行ID（省略時は新しい実行として開始）
+    :param cancel_token: クライアントの切断や期限切れで処理を中断するためのトークン
+    :param budget: 時間・上流呼び出し回数の予算（省略時はすべてのファイルを処理する）
+    :return: (最終的な設計書, フィンガープリント, 実行ID, 後回しにしたファイル)
+    """
+    cancel_token = cancel_token or CancellationToken()
+    try:
+        checkpoint = open_checkpoint(env['USER_ID'], run_id)
+    except InvalidRunIdError as e:
+        raise PipelineError(400, str(e))
+    set_log_context(run_id=checkpoint.run_id)
+    try:
+        checkpoint.bind({
+            "repo": repo_name,
+            "branch": branch_name,
+            "commit": commit_sha,
+            "files": sorted(set(selected_files)),
+        })
+    except CheckpointMismatchError as e:
+        raise PipelineError(409, str(e), run_id=checkpoint.run_id)
+
+    # コンポーネントの初期化
+    api_clients = get_api_clients(
+        groq_api_key=env['GROQ_API_KEY'],
+        toolhouse_api_key=env['TOOLHOUSE_API_KEY'],
+        lingu_key=env['LINGUSTRUCT_LICENSE_KEY'],
+        user_id=env['USER_ID']
+    )
+    try:
+        fetcher = DataFetcher(api_clients, cancel_token=cancel_token)
+        mapper = Mapper(api_url=KEY_MAPPING_API_URL, license_key=env['LINGUSTRUCT_LICENSE_KEY'], cancel_token=cancel_token)
+        # 同じリビジョン・同じ選択の設計書が生成済みであれば、ファイルの内容を取得せずに返す
+        revision_key = _revision_key(repo_name, branch_name, commit_sha, selected_files, mapper)
+        indexed = _indexed_document(revision_key)
+        if indexed is not None:
+            checkpoint.complete()
+            return indexed[0], indexed[1], checkpoint.run_id, []
+        if PIPELINE_MEMORY_BUDGET_MB > 0 or budget is not None:
+            final_document, fingerprint, deferred_files = _run_chunked(
+                env, fetcher, mapper, checkpoint, repo_name, branch_name, selected_files, commit_sha, budget
+            )
+        else:
+            final_document, fingerprint = _run_in_memory(env, fetcher, mapper, checkpoint, repo_name, branch_name, selected_files, commit_sha)
+            deferred_files = []
+    except PipelineError as e:
+        e.run_id = checkpoint.run_id
+        raise
+    except OperationCancelled as e:
+        # チェックポイントは残し、同じ実行IDで再開できるようにする
+        logger.info(f"Run {checkpoint.run_id} cancelled: {e.reason}")
+        status_code = 504 if e.reason == REASON_DEADLINE_EXCEEDED else 499
+        raise PipelineError(status_code, f"Design document generation cancelled: {e.reason}", run_id=checkpoint.run_id)
+    except Exception as e:
+        logger.error(f"Run {checkpoint.run_id} failed; it can be resumed with the same run_id: {e}", exc_info=True)
+        raise PipelineError(500, "Internal Server Error", run_id=checkpoint.run_id) from e
+
+    if deferred_files:
+        # 後回しにしたファイルを同じ実行IDで処理できるよう、チェックポイントは残す
+        logger.info(f"Run {checkpoint.run_id} deferred {len(deferred_files)} files; resume it with the same run_id.")
+    else:
+        checkpoint.complete()
+        if revision_key is not None and document_cache.contains(fingerprint):
+            _revision_index.set(revision_key, fingerprint)
+    return final_document, fingerprint, checkpoint.run_id, deferred_files
+
+
+def record_branch_head(repo_name: str, branch_name: str, head_sha: Optional[str]) -> None:
+    """push webhook で受け取ったブランチの先頭のコミットを記録します（不明な場合は記録を消す）。"""
+    if head_sha:
+        _branch_heads.set((repo_name, branch_name), head_sha)
+    else:
+        _branch_heads.delete((repo_name, branch_name))
+
+
+def _branch_revision(repo_name: str, branch_name: str) -> Optional[str]:
+    """
+    ブランチの現在のリビジョン。ローカルのクローンがあればツリーのSHA、なければ push webhook で受け取った
+    先頭のコミット。どちらも分からない場合は None（索引は使わない）。
+    """
+    repo_path = local_repo_path(repo_name)
+    if repo_path is not None:
+        try:
+            return f"tree:{local_tree_sha(repo_path, branch_name)}"
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            logger.warning(f"Could not resolve the tree of {repo_name}@{branch_name}: {e}")
+    head_sha = _branch_heads.get((repo_name, branch_name))
+    return f"head:{head_sha}" if head_sha else None
+
+
+def _revision_key(repo_name: str, branch_name: str, commit_sha: Optional[str], selected_files: List[str],
+                  mapper: Mapper) -> Optional[Tuple[str, ...]]:
+    revision = _branch_revision(repo_name, branch_name)
+    if revision is None:
+        return None
+    selection = hashlib.sha256("\n".join(sorted(set(selected_files))).encode("utf-8")).hexdigest()
+    versions = {**DocumentGenerator.template_versions(), "pipeline": PIPELINE_VERSION, "key_mapping": mapper.key_mapping_version,
+                "module_index": index_version(), "parser": parser_engine(), "summaries": summary_version()}
+    versions_digest = hashlib.sha256(json.dumps(versions, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return repo_name, branch_name, commit_sha or "", selection, revision, versions_digest
+
+
+def _indexed_document(revision_key: Optional[Tuple[str, ...]]) -> Optional[Tuple[Dict[str, Any], str]]:
+    if revision_key is None:
+        return None
+    fingerprint = _revision_index.get(revision_key)
+    if fingerprint is None:
+        return None
+    document = document_cache.get(fingerprint)
+    if document is None:
+        return None
+    logger.info(f"Serving design document for revision {revision_key[4]} from cache: {fingerprint}")
+    return document, fingerprint
+
+
+def _run_in_memory(env: Dict[str, str], fetcher: DataFetcher, mapper: Mapper, checkpoint: RunCheckpoint, repo_name: str,
+                   branch_name: str, selected_files: List[str], commit_sha: Optional[str]) -> Tuple[Dict[str, Any], str]:
+    # 前回の実行で処理済みのファイルは取得もパースもしない
+    records = checkpoint.get_many("file", selected_files)
+    pending = [path for path in selected_files if path not in records]
+
+    # データ取得
+    files_content = _fetch_contents(fetcher, checkpoint, repo_name, branch_name, pending)
+
+    if not files_content and not records:
+        logger.warning("Selected files content could not be fetched")
+        raise PipelineError(404, "Selected files content could not be fetched")
+
+    # 入力のフィンガープリントを計算し、キャッシュ済みの設計書があれば再計算しない
+    file_hashes = {file_path: record["hash"] for file_path, record in records.items()}
+    file_hashes.update({file_path: content_hash(content) for file_path, content in files_content.items()})
+    file_metadata = _file_metadata(fetcher, checkpoint, repo_name, branch_name, selected_files)
+    fingerprint = _fingerprint(repo_name, branch_name, commit_sha, file_hashes, mapper, file_metadata)
+    cached_document = document_cache.get(fingerprint)
+    if cached_document is not None:
+        logger.info(f"Serving design document from cache: {fingerprint}")
+        return cached_document, fingerprint
+
+    summarizer = _summarizer(fetcher)
+    try:
+        # 依存関係の解析とパース（要約はバッチごとに別スレッドで並行して生成される）
+        if summarizer is not None:
+            for file_path, record in records.items():
+                summarizer.add(file_path, record["hash"])
+        if files_content:
+            resolver = _build_resolver(fetcher, checkpoint, repo_name, branch_name, list(file_hashes), files_content)
+            parser = Parser()
+            for file_path, content in files_content.items():
+                records[file_path] = _process_file(fetcher, parser, resolver, checkpoint, file_path, content)
+                if summarizer is not None:
+                    summarizer.add(file_path, records[file_path]["hash"], content)
+        del files_content
+        _index_symbols(repo_name, branch_name, records)
+
+        parsed_data = {}
+        dependencies = {}
+        for file_path in selected_files:
+            if file_path in records:
+                parsed_data[file_path] = records[file_path]["parsed"]
+                dependencies[file_path] = records[file_path]["deps"]
+        logger.debug("Dependencies of %d files: %s", len(dependencies), capped(dependencies))
+
+        # プロジェクトメタデータの取得（README.mdを解析）
+        project_meta = _project_meta(fetcher, records.get("README.md"))
+
+        final_document, cacheable = _map_and_generate(env, mapper, checkpoint, fingerprint, parsed_data, dependencies,
+                                                      project_meta, file_metadata, summarizer)
+    finally:
+        if summarizer is not None:
+            summarizer.close()
+    if cacheable:
+        document_cache.put(fingerprint, final_document)
+    logger.info("Final document generated successfully.")
+    return final_document, fingerprint
+
+
+def _run_chunked(env: Dict[str, str], fetcher: DataFetcher, mapper: Mapper, checkpoint: RunCheckpoint, repo_name: str,
+                 branch_name: str, selected_files: List[str], commit_sha: Optional[str],
+                 budget: Optional[GenerationBudget] = None) -> Tuple[Dict[str, Any], str, List[str]]:
+    """
+    ファイルをチャンク単位で取得し、取得したチャンクはすぐに依存関係解析とパースを行って生の内容を破棄します。
+    アウトオブコアモード（PIPELINE_MEMORY_BUDGET_MB > 0）では、ファイルごとの中間結果はメモリ予算を超えるとディスクに退避されます。
+    予算付きの場合はチャンクごとに残りのファイルを重要度順に並べ直し、予算を使い切った時点で残りを後回しにします。
+
+    :return: (設計書, フィンガープリント, 後回しにしたファイル)
+    """
+    budget_bytes = int(PIPELINE_MEMORY_BUDGET_MB * 1024 * 1024)
+    storage = TempStorageManager(env['USER_ID'], namespace=f"spill-{uuid.uuid4().hex}")
+    try:
+        if budget_bytes > 0:
+            parsed_data = SpillableStore(storage, "parsed/", budget_bytes // 2)
+            dependencies = SpillableStore(storage, "deps/", budget_bytes // 2)
+        else:
+            parsed_data, dependencies = {}, {}
+        file_hashes: Dict[str, str] = {}
+        project_meta: Dict[str, str] = {}
+        parser = Parser()
+        resolver = None
+        summarizer = _summarizer(fetcher)
+        file_metadata = _file_metadata(fetcher, checkpoint, repo_name, branch_name, selected_files)
+        graph = _import_graph(repo_name, branch_name, selected_files) if budget is not None else None
+        sizes = {path: metadata["size"] for path, metadata in file_metadata.items() if "size" in metadata}
+
+        def collect(file_path: str, record: Dict[str, Any]):
+            nonlocal project_meta
+            file_hashes[file_path] = record["hash"]
+            dependencies[file_path] = record["deps"]
+            parsed_data[file_path] = record["parsed"]
+            if file_path == "README.md":
+                project_meta = _project_meta(fetcher, record)
+            if graph is not None:
+                graph.add(file_path, [target for target, kind in extract_imports(record["deps"]) if kind == "custom"])
+
+        # マニフェストを先に処理する（分類器は選択範囲全体のパスとマニフェストを必要とする）。予算付きでも常に処理する
+        manifest_paths = [path for path in selected_files if ManifestAnalyzer.is_manifest(path)]
+        remaining = [path for path in selected_files if not ManifestAnalyzer.is_manifest(path)]
+        chunk_size = fetcher.batch_size * fetcher.scheduler.max_concurrency("groq")
+        deferred_files: List[str] = []
+        chunk = manifest_paths
+        while chunk or remaining:
+            started = time.monotonic()
+            requests_before = fetcher.fetch_requests
+            records = checkpoint.get_many("file", chunk)
+            pending = [path for path in chunk if path not in records]
+            contents = _fetch_contents(fetcher, checkpoint, repo_name, branch_name, pending, populate_cache=False)
+            if contents and resolver is None:
+                resolver = _build_resolver(fetcher, checkpoint, repo_name, branch_name, selected_files, contents, populate_cache=False)
+            for file_path in chunk:
+                if file_path in contents:
+                    records[file_path] = _process_file(fetcher, parser, resolver, checkpoint, file_path, contents[file_path])
+                if file_path in records:
+                    collect(file_path, records[file_path])
+                    if summarizer is not None:
+                        summarizer.add(file_path, records[file_path]["hash"], contents.get(file_path))
+            _index_symbols(repo_name, branch_name, records)
+            # 生の内容はパース後すぐに解放する
+            del chunk, contents, records
+
+            if budget is None:
+                chunk, remaining = remaining[:chunk_size], remaining[chunk_size:]
+                continue
+            budget.charge(fetcher.fetch_requests - requests_before)
+            if not budget.time_left(time.monotonic() - started):
+                break
+            chunk, remaining, unaffordable = _next_budgeted_chunk(
+                fetcher, checkpoint, repo_name, branch_name, rank_files(remaining, graph, sizes), chunk_size, budget
+            )
+            deferred_files.extend(unaffordable)
+        deferred_files.extend(remaining)
+
+        if not file_hashes:
+            if deferred_files:
+                raise PipelineError(422, "The generation budget was exhausted before any file could be processed")
+            logger.warning("Selected files content could not be fetched")
+            raise PipelineError(404, "Selected files content could not be fetched")
+        if budget_bytes > 0:
+            logger.info(f"Streamed {len(file_hashes)} files; {parsed_data.spilled_count + dependencies.spilled_count} intermediate results spilled to disk.")
+        if deferred_files:
+            logger.info(f"Generation budget exhausted after {len(file_hashes)} files "
+                        f"({budget.calls_used} fetch requests); {len(deferred_files)} files deferred.")
+
+        fingerprint = _fingerprint(repo_name, branch_name, commit_sha, file_hashes, mapper, file_metadata, deferred_files)
+        cached_document = document_cache.get(fingerprint)
+        if cached_document is not None:
+            logger.info(f"Serving design document from cache: {fingerprint}")
+            return cached_document, fingerprint, deferred_files
+
+        final_document, cacheable = _map_and_generate(env, mapper, checkpoint, fingerprint, parsed_data, dependencies,
+                                                      project_meta, file_metadata, summarizer, partial=bool(deferred_files))
+        if cacheable:
+            document_cache.put(fingerprint, final_document)
+        logger.info("Final document generated successfully.")
+        return final_document, fingerprint, deferred_files
+    finally:
+        if summarizer is not None:
+            summarizer.close()
+        storage.clear()
+
+
+def _import_graph(repo_name: str, branch_name: str, selected_files: List[str]) -> ImportGraph:
+    """
+    選択範囲のインポートの辺。シンボル索引にある前回までのインポートで初期化し、処理したファイルの分で更新していく。
+    """
+    graph = ImportGraph(selected_files)
+    try:
+        imports = get_symbol_index().custom_imports(repo_name, branch_name)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Could not read imports from symbol index for {repo_name}@{branch_name}: {e}")
+        return graph
+    for importer, targets in imports.items():
+        graph.add(importer, targets)
+    return graph
+
+
+def _next_budgeted_chunk(fetcher: DataFetcher, checkpoint: RunCheckpoint, repo_name: str, branch_name: str, ranked: List[str],
+                         chunk_size: int, budget: GenerationBudget) -> Tuple[List[str], List[str], List[str]]:
+    """
+    重要度順のファイルから次のチャンクを選びます。取得済みのファイル（チェックポイント・コンテンツキャッシュ）は
+    呼び出し回数の予算を消費しないため、予算を使い切った後も処理します。
+
+    :return: (次のチャンク, 残りのファイル, 予算内で取得できないため後回しにするファイル)
+    """
+    affordable = budget.affordable_files(fetcher.batch_size)
+    if affordable is None:
+        return ranked[:chunk_size], ranked[chunk_size:], []
+    chunk: List[str] = []
+    unaffordable: List[str] = []
+    index = 0
+    while index < len(ranked) and len(chunk) < chunk_size:
+        path = ranked[index]
+        if index % chunk_size == 0:
+            window = ranked[index:index + chunk_size]
+            available = set(DataFetcher.cached_contents(repo_name, branch_name, window))
+            available.update(candidate for candidate in window
+                             if checkpoint.has("file", candidate) or checkpoint.has("content", candidate))
+        index += 1
+        if path in available:
+            chunk.append(path)
+        elif affordable > 0:
+            chunk.append(path)
+            affordable -= 1
+        else:
+            unaffordable.append(path)
+    return chunk, ranked[index:], unaffordable
+
+
+def _fetch_contents(fetcher: DataFetcher, checkpoint: RunCheckpoint, repo_name: str, branch_name: str, file_paths: List[str],
+                    populate_cache: bool = True) -> Dict[str, str]:
+    """チェックポイント済みの内容を優先し、残りを取得してバッチごとにチェックポイントへ保存します。"""
+    if not file_paths:
+        return {}
+    contents = checkpoint.get_many("content", file_paths)
+    missing = [path for path in file_paths if path not in contents]
+    if missing:
+        saved = set()
+
+        def save_batch(batch: Dict[str, str]):
+            checkpoint.put_many("content", batch)
+            saved.update(batch)
+
+        fetched = fetcher.fetch_files_content(repo_name, branch_name, missing, populate_cache=populate_cache, on_batch=save_batch)
+        # コンテンツキャッシュから返された分もチェックポイントに残す
+        checkpoint.put_many("content", {path: content for path, content in fetched.items() if path not in saved})
+        contents.update(fetched)
+    return contents
+
+
+def _build_resolver(fetcher: DataFetcher, checkpoint: RunCheckpoint, repo_name: str, branch_name: str, file_paths: List[str],
+                    contents: Dict[str, str], populate_cache: bool = True) -> ModuleResolver:
+    """
+    選択範囲のマニフェストから分類器を構築します。前回の実行で処理済みのマニフェストは
+    チェックポイント（またはキャッシュ）から内容を読み戻します。
+    """
+    manifest_contents = {path: content for path, content in contents.items() if ManifestAnalyzer.is_manifest(path)}
+    missing = [path for path in file_paths if ManifestAnalyzer.is_manifest(path) and path not in manifest_contents]
+    manifest_contents.update(_fetch_contents(fetcher, checkpoint, repo_name, branch_name, missing, populate_cache=populate_cache))
+    return ModuleResolver.from_selection(manifest_contents, file_paths=file_paths)
+
+
+def parse_cached(parser: Parser, file_path: str, content: str, file_hash: Optional[str] = None) -> Dict[str, Any]:
+    """ファイルをパースします。同じ内容のパース結果はワーカー間で共有する"""
+    file_type = file_path.split('.')[-1].lower()
+    cache_key = (parser.engine_for(file_type), file_type, file_hash or content_hash(content))
+    parsed = _parse_cache.get(cache_key)
+    if parsed is None:
+        parsed = parser.parse_file(file_path, content, file_type)
+        _parse_cache.set(cache_key, parsed)
+    return parsed
+
+
+def _process_file(fetcher: DataFetcher, parser: Parser, resolver: ModuleResolver, checkpoint: RunCheckpoint,
+                  file_path: str, content: str) -> Dict[str, Any]:
+    """1ファイル分の依存関係解析とパースを行い、結果をチェックポイントに保存します。"""
+    fetcher.cancel_token.raise_if_cancelled()
+    file_hash = content_hash(content)
+    record = {
+        "hash": file_hash,
+        "deps": fetcher.analyze_file_dependencies(file_path, content, resolver),
+        "parsed": parse_cached(parser, file_path, content, file_hash),
+    }
+    if file_path == "README.md":
+        record["meta"] = fetcher.extract_meta_information(content)
+    checkpoint.put("file", file_path, record)
+    return record
+
+
+def _index_symbols(repo_name: str, branch_name: str, records: Dict[str, Dict[str, Any]]):
+    """シンボル索引を更新します。索引は補助的なものなので、失敗しても設計書の生成は続ける。"""
+    try:
+        get_symbol_index().update_files(repo_name, branch_name, records)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Could not update symbol index for {repo_name}@{branch_name}: {e}")
+
+
+def _project_meta(fetcher: DataFetcher, readme_record: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    if readme_record is None:
+        return fetcher.extract_meta_information("")
+    return readme_record["meta"]
+
+
+def _fingerprint(repo_name: str, branch_name: str, commit_sha: Optional[str], file_hashes: Dict[str, str], mapper: Mapper,
+                 file_metadata: Dict[str, Dict[str, Any]], deferred_files: Optional[List[str]] = None) -> str:
+    versions = {**DocumentGenerator.template_versions(), "module_index": index_version(), "parser": parser_engine(),
+                "file_metadata": metadata_digest(file_metadata), "summaries": summary_version()}
+    if deferred_files:
+        # 一部のファイルを後回しにした設計書は、すべてを処理した設計書とは別の版として扱う
+        versions["deferred"] = content_hash("\n".join(sorted(deferred_files)))
+    return compute_fingerprint(repo_name, branch_name, commit_sha, file_hashes, mapper.key_mapping_version, versions)
+
+
+def _file_metadata(fetcher: DataFetcher, checkpoint: RunCheckpoint, repo_name: str, branch_name: str,
+                   selected_files: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    ファイルのサイズ・最終更新日時・コミット数。再開した実行では最初に収集した値を使う。
+    保存済みのメタデータが期限切れの場合はファイル一覧を取得し直し、取得できなければ 503 で失敗する。
+    """
+    file_metadata = checkpoint.get("file_metadata", "all")
+    if file_metadata is None:
+        try:
+            file_metadata = collect_file_metadata(
+                repo_name, branch_name, selected_files,
+                fetch_listing_metadata=lambda: fetcher.fetch_listing_metadata(repo_name, branch_name)
+            )
+        except (OperationCancelled, PipelineError):
+            raise
+        except Exception as e:
+            # メタデータなしで生成すると、一覧を取得できたかどうかで設計書とフィンガープリントが変わってしまう
+            logger.warning(f"File listing could not be refetched for metadata: {e}")
+            raise PipelineError(503, "File metadata is temporarily unavailable; retry with the same run_id")
+        checkpoint.put("file_metadata", "all", file_metadata)
+    return file_metadata
+
+
+def _summarizer(fetcher: DataFetcher) -> Optional[FileSummarizer]:
+    """ファイルの要約が有効な場合は要約器を返します。"""
+    if not FILE_SUMMARIES:
+        return None
+    return FileSummarizer(fetcher.api_clients, cancel_token=fetcher.cancel_token)
+
+
+def _map_and_generate(env: Dict[str, str], mapper: Mapper, checkpoint: RunCheckpoint, fingerprint: str,
+                      parsed_data: MutableMapping, dependencies: MutableMapping, project_meta: Dict[str, Any],
+                      file_metadata: Dict[str, Dict[str, Any]], summarizer: Optional[FileSummarizer] = None,
+                      partial: bool = False) -> Tuple[Dict[str, Any], bool]:
+    """
+    マッピングとドキュメント生成を行います。
+    マッピング結果は入力のフィンガープリントとともにチェックポイントに保存し、再開時はフィンガープリントが
+    一致する場合だけ再利用します（前回の実行で取得できなかったファイルを今回取得した場合などはマッピングし直す）。
+
+    :return: (設計書, ドキュメントキャッシュに保存してよいか)。要約が一部のファイルにしか付かなかった設計書は
+             保存しない（次の実行で残りのファイルを要約する）
+    """
+    # マッピング（前回の実行でマッピング済みであれば再利用する）。
+    # 一部のファイルを後回しにした場合は、続きの実行で使わないようマッピング結果をチェックポイントに残さない
+    cacheable = True
+    modules = None
+    mapped = None if partial else checkpoint.get("mapped", "modules")
+    if isinstance(mapped, dict) and mapped.get("fingerprint") == fingerprint:
+        modules = mapped["modules"]
+    elif mapped is not None:
+        logger.info("Checkpointed mapping was made from different inputs; remapping.")
+    if modules is None:
+        # ファイルごとの要約の完了を待つ（要約できなかったファイルは既定の purpose を使う）
+        summaries = summarizer.finish() if summarizer is not None else {}
+        cacheable = summarizer is None or summarizer.complete
+        if not cacheable:
+            logger.info("Some files could not be summarized; the document will not be cached.")
+        mapped_data = mapper.map_data_to_modules(parsed_data, dependencies, project_meta, file_metadata, summaries)
+        modules = mapped_data["modules"]
+        if not partial and cacheable:
+            checkpoint.put("mapped", "modules", {"fingerprint": fingerprint, "modules": modules})
+
+    # ドキュメント生成（取得したテンプレートはチェックポイントに保存される）
+    generator = DocumentGenerator(env['LINGUSTRUCT_LICENSE_KEY'], checkpoint=checkpoint, cancel_token=mapper.cancel_token)
+    try:
+        final_document = generator.generate_final_document(modules, project_id="lingurepo_project", version="1.0")
+    except TemplateUnavailableError as e:
+        # 欠けた設計書をキャッシュしないよう失敗として返す（取得済みのテンプレートはチェックポイントに残り、再開時は欠けた分だけ取得する）
+        logger.warning(str(e))
+        raise PipelineError(503, "Module templates are temporarily unavailable; retry with the same run_id")
+
+    if not final_document:
+        logger.warning("Final document could not be generated")
+        raise PipelineError(500, "Final document could not be generated")
+    return final_document, cacheable
@@ -0,0 +1,158 @@
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+from components.temp_storage_manager import TempStorageManager
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CHECKPOINT_ROOT = "temp_storage"
+CHECKPOINTS_ENABLED = os.getenv("PIPELINE_CHECKPOINTS", "1") == "1"
+# 未完了の実行のチェックポイントを保持する秒数
+CHECKPOINT_MAX_AGE = float(os.getenv("PIPELINE_CHECKPOINT_MAX_AGE", str(24 * 3600)))
+# 実行IDの形式（uuid4().hex）。クライアントが指定するため、パスとして使う前に必ず検証する
+RUN_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class CheckpointMismatchError(Exception):
+    """既存の実行IDが別のリクエスト内容に紐づいている場合の例外"""
+
+
+class InvalidRunIdError(ValueError):
+    """実行IDの形式が不正な場合、またはチェックポイントの領域の外を指す場合の例外"""
+
+
+def validate_run_id(run_id: str) -> str:
+    if not isinstance(run_id, str) or not RUN_ID_PATTERN.fullmatch(run_id):
+        raise InvalidRunIdError(f"Invalid run_id: {run_id!r}")
+    return run_id
+
+
+def _runs_root(user_id: str) -> str:
+    """ユーザーのチェックポイントの領域（temp_storage/<user>/runs）。解決後のパスが領域の外なら InvalidRunIdError"""
+    checkpoint_root = os.path.realpath(CHECKPOINT_ROOT)
+    runs_root = os.path.realpath(os.path.join(checkpoint_root, user_id, "runs"))
+    if os.path.dirname(os.path.dirname(runs_root)) != checkpoint_root:
+        raise InvalidRunIdError(f"Checkpoint directory for user {user_id!r} is outside {CHECKPOINT_ROOT}")
+    return runs_root
+
+
+def _run_dir(user_id: str, run_id: str) -> str:
+    """実行IDごとのチェックポイントのディレクトリ。書き込みや削除の前に、領域の外を指していないことを確認する"""
+    runs_root = _runs_root(user_id)
+    run_dir = os.path.realpath(os.path.join(runs_root, validate_run_id(run_id)))
+    if os.path.dirname(run_dir) != runs_root:
+        raise InvalidRunIdError(f"Checkpoint directory for run {run_id!r} is outside {runs_root}")
+    return run_dir
+
+
+class RunCheckpoint:
+    def __init__(self, user_id: str, run_id: Optional[str] = None):
+        """
+        パイプライン実行ごとのチェックポイント。TempStorageManager のユーザー領域内に実行IDごとの領域を作り、
+        ステージ（取得内容・ファイルごとの解析結果・マッピング結果・テンプレート）単位で保存します。
+
+        :param user_id: ユーザーID
+        :param run_id: 再開する実行ID（省略時は新規に発行）
+        """
+        self.user_id = user_id
+        self.run_id = run_id or uuid.uuid4().hex
+        self.resumed = run_id is not None
+        self.run_dir = _run_dir(user_id, self.run_id)
+        self.storage = TempStorageManager(user_id, namespace=os.path.join("runs", self.run_id), base_root=CHECKPOINT_ROOT)
+
+    def bind(self, request: Dict[str, Any]):
+        """
+        実行IDとリクエスト内容を結び付けます。再開時に内容が異なる場合は CheckpointMismatchError を送出します。
+        """
+        if self.storage.exists("request"):
+            if self.storage.load("request") != request:
+                raise CheckpointMismatchError(f"Run {self.run_id} was started for a different request")
+            logger.info(f"Resuming run {self.run_id} ({len(self.storage.keys())} checkpoints)")
+        else:
+            self.storage.save("request", request)
+
+    def get(self, stage: str, key: Any) -> Optional[Any]:
+        storage_key = f"{stage}/{key}"
+        if not self.storage.exists(storage_key):
+            return None
+        return self.storage.load(storage_key)
+
+    def has(self, stage: str, key: Any) -> bool:
+        return self.storage.exists(f"{stage}/{key}")
+
+    def get_many(self, stage: str, keys: Iterable[Any]) -> Dict[Any, Any]:
+        found = {}
+        for key in keys:
+            value = self.get(stage, key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def put(self, stage: str, key: Any, value: Any):
+        self.storage.save(f"{stage}/{key}", value)
+
+    def put_many(self, stage: str, values: Dict[Any, Any]):
+        for key, value in values.items():
+            self.put(stage, key, value)
+
+    def complete(self):
+        """実行が成功したらチェックポイントを削除します。"""
+        if os.path.realpath(self.storage.base_dir) != _run_dir(self.user_id, self.run_id):
+            raise InvalidRunIdError(f"Refusing to remove {self.storage.base_dir}: not the checkpoint directory of run {self.run_id}")
+        self.storage.clear()
+        logger.debug("Run %s completed; checkpoints removed.", self.run_id)
+
+
+class NullCheckpoint(RunCheckpoint):
+    """チェックポイントを無効にした場合の何もしない実装"""
+
+    def __init__(self, user_id: str, run_id: Optional[str] = None):
+        self.user_id = user_id
+        self.run_id = validate_run_id(run_id) if run_id else uuid.uuid4().hex
+        self.resumed = False
+
+    def bind(self, request: Dict[str, Any]):
+        pass
+
+    def has(self, stage: str, key: Any) -> bool:
+        return False
+
+    def get(self, stage: str, key: Any) -> Optional[Any]:
+        return None
+
+    def put(self, stage: str, key: Any, value: Any):
+        pass
+
+    def complete(self):
+        pass
+
+
+def open_checkpoint(user_id: str, run_id: Optional[str] = None) -> RunCheckpoint:
+    if not CHECKPOINTS_ENABLED:
+        return NullCheckpoint(user_id, run_id)
+    if run_id is not None:
+        _run_dir(user_id, run_id)
+    purge_expired_checkpoints(user_id)
+    return RunCheckpoint(user_id, run_id)
+
+
+def purge_expired_checkpoints(user_id: str):
+    """CHECKPOINT_MAX_AGE を過ぎた未完了の実行を削除します。"""
+    runs_dir = _runs_root(user_id)
+    if not os.path.isdir(runs_dir):
+        return
+    cutoff = time.time() - CHECKPOINT_MAX_AGE
+    for run_id in os.listdir(runs_dir):
+        if not RUN_ID_PATTERN.fullmatch(run_id):
+            continue
+        run_dir = os.path.join(runs_dir, run_id)
+        try:
+            if os.path.getmtime(run_dir) < cutoff:
+                shutil.rmtree(run_dir, ignore_errors=True)
+                logger.info(f"Removed expired checkpoints for run {run_id}")
+        except OSError:
+            continue
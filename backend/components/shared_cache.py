@@ -0,0 +1,278 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+from components.ttl_cache import TTLCache
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 共有キャッシュのバックエンド: "sqlite"（既定）/ "redis" / "memory"（プロセス内のみ）
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join("shared_cache", "cache.db"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# L1（プロセス内）キャッシュの有効秒数の上限。他のワーカーでの削除はこの時間内に反映される
+# L2 が使えない場合（"memory" や初期化の失敗）は L1 だけで保持するため、上限は適用しない
+CACHE_L1_TTL = float(os.getenv("CACHE_L1_TTL", "30"))
+
+# この長さを超える値は圧縮して保存する
+_COMPRESS_THRESHOLD = 1024
+# SQLiteのIN句に渡すキーの最大数
+_SQLITE_BATCH = 500
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+
+def _encode(value: Any) -> bytes:
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) > _COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(data, 3)
+    return _RAW + data
+
+
+def _decode(payload: bytes) -> Any:
+    data = payload[1:]
+    if payload[:1] == _ZLIB:
+        data = zlib.decompress(data)
+    return json.loads(data.decode("utf-8"))
+
+
+class SQLiteCacheBackend:
+    def __init__(self, path: str):
+        """
+        WALモードのSQLiteファイルを使う共有キャッシュ。同一ホスト上の複数ワーカーから読み書きできます。
+
+        :param path: データベースファイルのパス
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)  # ディレクトリを自動作成
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        connection = self._connection()
+        now = time.time()
+        for i in range(0, len(keys), _SQLITE_BATCH):
+            chunk = keys[i:i + _SQLITE_BATCH]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at > ?", (*chunk, now)
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def set_many(self, items: Dict[str, bytes], ttl: float):
+        connection = self._connection()
+        expires_at = time.time() + ttl
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, value, expires_at) for key, value in items.items()]
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def delete(self, key: str):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisCacheBackend:
+    def __init__(self, url: str):
+        """
+        Redis互換サーバーを使う共有キャッシュ（redis パッケージが必要）。
+
+        :param url: 接続先URL（例: redis://localhost:6379/0）
+        """
+        import redis  # 任意の依存パッケージのため、使用時にのみ読み込む
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        return {key: value for key, value in zip(keys, self.client.mget(keys)) if value is not None}
+
+    def set_many(self, items: Dict[str, bytes], ttl: float):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipeline.set(key, value, px=max(1, int(ttl * 1000)))
+        pipeline.execute()
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+
+class SharedCache:
+    def __init__(self, namespace: str, ttl: float, l1_max_entries: int = 10000, backend: Any = None):
+        """
+        プロセス内のL1キャッシュと、ワーカー間で共有するL2キャッシュの2段構成のキャッシュ。
+        値はJSONとして保存されます。L2への読み書きに失敗した場合はL1のみで動作します。
+
+        :param namespace: キーの名前空間（キャッシュの種類ごとに分ける）
+        :param ttl: エントリの有効秒数
+        :param l1_max_entries: L1に保持する最大エントリ数
+        :param backend: L2バックエンド（省略時は初回使用時に get_cache_backend() で決定）
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.l1 = TTLCache(ttl=min(ttl, CACHE_L1_TTL), max_entries=l1_max_entries)
+        self._backend = backend
+
+    @property
+    def backend(self) -> Any:
+        return self._backend if self._backend is not None else get_cache_backend()
+
+    def _l1_ttl(self, ttl: float, backend: Any) -> float:
+        """L1 の有効秒数。L2 がある場合だけ CACHE_L1_TTL を上限にする（L1 のみの場合は呼び出し元の有効秒数）。"""
+        return min(ttl, CACHE_L1_TTL) if backend is not None else ttl
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{json.dumps(key, ensure_ascii=False, separators=(',', ':'))}"
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.l1.get(key)
+        if value is not None:
+            return value
+        backend = self.backend
+        if backend is None:
+            return default
+        try:
+            payload = backend.get(self._key(key))
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {self.namespace}: {e}")
+            return default
+        if payload is None:
+            return default
+        value = _decode(payload)
+        self.l1.set(key, value)
+        return value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """複数のキーをまとめて取得します（L2へは1回の問い合わせ）。見つかったものだけを返します。"""
+        found = {}
+        missing = {}
+        for key in keys:
+            value = self.l1.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing[self._key(key)] = key
+        backend = self.backend
+        if not missing or backend is None:
+            return found
+        try:
+            payloads = backend.get_many(list(missing))
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {self.namespace}: {e}")
+            return found
+        for storage_key, payload in payloads.items():
+            key = missing[storage_key]
+            found[key] = _decode(payload)
+            self.l1.set(key, found[key])
+        return found
+
+    def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None) -> None:
+        """複数のエントリをまとめて保存します（L2へは1回の書き込み）。"""
+        if not items:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        backend = self.backend
+        for key, value in items.items():
+            self.l1.set(key, value, ttl=self._l1_ttl(ttl, backend))
+        if backend is None:
+            return
+        try:
+            backend.set_many({self._key(key): _encode(value) for key, value in items.items()}, ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed for {self.namespace}: {e}")
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        backend = self.backend
+        self.l1.set(key, value, ttl=self._l1_ttl(ttl, backend))
+        if backend is None:
+            return
+        try:
+            backend.set(self._key(key), _encode(value), ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed for {self.namespace}: {e}")
+
+    def delete(self, key: Hashable) -> None:
+        self.l1.delete(key)
+        backend = self.backend
+        if backend is None:
+            return
+        try:
+            backend.delete(self._key(key))
+        except Exception as e:
+            logger.warning(f"Shared cache delete failed for {self.namespace}: {e}")
+
+
+_backend: Any = None
+_backend_initialized = False
+_backend_lock = threading.Lock()
+
+
+def get_cache_backend() -> Any:
+    """
+    環境変数 CACHE_BACKEND に応じたプロセス共通のL2バックエンドを返します。
+    "memory" の場合や初期化に失敗した場合は None（L1のみ）を返します。
+    """
+    global _backend, _backend_initialized
+    with _backend_lock:
+        if not _backend_initialized:
+            _backend_initialized = True
+            try:
+                if CACHE_BACKEND == "sqlite":
+                    _backend = SQLiteCacheBackend(CACHE_SQLITE_PATH)
+                elif CACHE_BACKEND == "redis":
+                    _backend = RedisCacheBackend(CACHE_REDIS_URL)
+                elif CACHE_BACKEND != "memory":
+                    logger.warning(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}; using process-local cache only.")
+            except Exception as e:
+                logger.error(f"Could not initialize {CACHE_BACKEND} cache backend; using process-local cache only: {e}")
+                _backend = None
+            if _backend is not None:
+                logger.info(f"Shared cache backend: {CACHE_BACKEND}")
+        return _backend
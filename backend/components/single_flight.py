@@ -0,0 +1,172 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from components.cancellation import CancellationToken
+from utils.logger import capped, setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        """
+        同一キーの同時呼び出しを1回の実行にまとめます（スレッド用）。
+        先行する呼び出しの完了を後続の呼び出しが待ち、同じ結果（または例外）を受け取ります。
+
+        :param name: ログ出力用の名前
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            logger.debug("[%s] Joining in-flight call for key: %s", self.name, capped(key))
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def do_many(self, keys: Iterable[Hashable], func: Callable[[Tuple[Hashable, ...]], Dict[Hashable, Any]]
+                ) -> Tuple[Dict[Hashable, Any], Dict[Hashable, BaseException]]:
+        """
+        複数のキーをまとめて実行します。実行中でないキーだけを func にまとめて渡し（1回の実行）、
+        他の呼び出しが実行中のキーはその完了を待って結果を受け取ります。
+        func は渡されたキーから結果への辞書を返します（含まれないキーの結果は None）。
+        自身の実行の例外はそのまま送出し、待っていた呼び出しの例外はキーごとに返します。
+
+        :return: (結果が得られたキー → 結果, 待っていた呼び出しが失敗したキー → 例外)
+        """
+        owned: Dict[Hashable, _Call] = {}
+        joined: Dict[Hashable, _Call] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    owned[key] = call
+                else:
+                    joined[key] = call
+
+        results: Dict[Hashable, Any] = {}
+        if owned:
+            try:
+                values = func(tuple(owned))
+                for key, call in owned.items():
+                    call.result = values.get(key)
+                    if call.result is not None:
+                        results[key] = call.result
+            except BaseException as e:
+                for call in owned.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key, call in owned.items():
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                for call in owned.values():
+                    call.event.set()
+
+        errors: Dict[Hashable, BaseException] = {}
+        if joined:
+            logger.debug("[%s] Joining in-flight calls for %d keys", self.name, len(joined))
+        for key, call in joined.items():
+            call.event.wait()
+            if call.error is not None:
+                errors[key] = call.error
+            elif call.result is not None:
+                results[key] = call.result
+        return results, errors
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Future, token: Optional[CancellationToken] = None):
+        self.task = task
+        self.token = token
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    def __init__(self, name: str):
+        """
+        同一キーの同時リクエストを1つのタスクにまとめます（asyncio用）。
+        待機側がキャンセルされても共有タスクは他の待機者のために継続します。
+
+        :param name: ログ出力用の名前
+        """
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._start(key, func())
+        else:
+            logger.info("[%s] Coalescing request into in-flight task for key: %s", self.name, capped(key))
+        return await asyncio.shield(flight.task)
+
+    async def do_cancellable(self, key: Hashable, func: Callable[[CancellationToken], Awaitable[Any]],
+                             deadline: Optional[float] = None) -> Any:
+        """
+        do() と同様ですが、共有タスクにキャンセルトークンを渡します。
+        トークンの期限は待機者の中で最も遅い期限に延長され、すべての待機者が離脱した時点でキャンセルされます。
+
+        :param deadline: この待機者の期限（time.monotonic() 基準、None は期限なし）
+        """
+        flight = self._flights.get(key)
+        # キャンセル済み（終了処理中）のタスクには合流しない
+        if flight is None or flight.token is None or flight.token.cancelled:
+            token = CancellationToken(deadline)
+            flight = self._start(key, func(token), token)
+        else:
+            logger.info("[%s] Coalescing request into in-flight task for key: %s", self.name, capped(key))
+            flight.token.extend_deadline(deadline)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                logger.info("[%s] All waiters left; cancelling in-flight task for key: %s", self.name, capped(key))
+                flight.token.cancel()
+
+    def _start(self, key: Hashable, awaitable: Awaitable[Any], token: Optional[CancellationToken] = None) -> _Flight:
+        flight = _Flight(asyncio.ensure_future(awaitable), token)
+        self._flights[key] = flight
+
+        def _remove(task: asyncio.Future):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            # 待機者がすべて離脱した後の例外は誰も受け取らないため、ここで取得済みにする
+            if not task.cancelled():
+                task.exception()
+
+        flight.task.add_done_callback(_remove)
+        return flight
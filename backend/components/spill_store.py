@@ -0,0 +1,79 @@
+import json
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Set
+from components.temp_storage_manager import TempStorageManager
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SpillableStore(MutableMapping):
+    def __init__(self, storage: TempStorageManager, prefix: str, budget_bytes: int):
+        """
+        メモリ予算を超えた分をディスクに退避する辞書。
+        予算を超えると古いエントリから TempStorageManager に書き出し、参照時に読み戻します。
+
+        :param storage: 退避先
+        :param prefix: 退避時のキーの接頭辞
+        :param budget_bytes: メモリ上に保持するデータ量の上限（JSONバイト数で概算）
+        """
+        self.storage = storage
+        self.prefix = prefix
+        self.budget_bytes = budget_bytes
+        self._memory: Dict[str, Any] = {}
+        self._sizes: Dict[str, int] = {}
+        self._order: Dict[str, None] = {}  # 挿入順を保持するキー集合
+        self._spilled: Set[str] = set()
+        self._bytes = 0
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self._order:
+            del self[key]
+        size = len(json.dumps(value, ensure_ascii=False))
+        self._order[key] = None
+        self._memory[key] = value
+        self._sizes[key] = size
+        self._bytes += size
+        if self._bytes > self.budget_bytes:
+            self._spill()
+
+    def _spill(self):
+        """古い順にディスクへ書き出し、メモリ使用量を予算の半分まで下げます。"""
+        target = self.budget_bytes // 2
+        spilled = 0
+        for key in list(self._memory):
+            if self._bytes <= target:
+                break
+            self.storage.save(self.prefix + key, self._memory.pop(key))
+            self._bytes -= self._sizes.pop(key)
+            self._spilled.add(key)
+            spilled += 1
+        logger.debug("Spilled %d entries of %s to disk (%d on disk).", spilled, self.prefix, len(self._spilled))
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._memory:
+            return self._memory[key]
+        if key in self._spilled:
+            return self.storage.load(self.prefix + key)
+        raise KeyError(key)
+
+    def __delitem__(self, key: str):
+        if key not in self._order:
+            raise KeyError(key)
+        del self._order[key]
+        if key in self._memory:
+            del self._memory[key]
+            self._bytes -= self._sizes.pop(key)
+        else:
+            self._spilled.discard(key)
+            self.storage.delete(self.prefix + key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._order))
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    @property
+    def spilled_count(self) -> int:
+        return len(self._spilled)
@@ -0,0 +1,219 @@
+import contextvars
+import json
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from components.api_clients import APIClients
+from components.cancellation import CancellationToken, OperationCancelled
+from components.shared_cache import SharedCache
+from components.upstream_scheduler import get_scheduler
+from utils.lazy_import import lazy_import
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# "1" の場合、ファイルごとの要約を生成して設計書のファイルごとのモジュールの purpose に使う（既定は無効）
+FILE_SUMMARIES = os.getenv("FILE_SUMMARIES", "0") == "1"
+# OpenAI 互換の Chat Completions API のベースURL。ローカルのモデルサーバー（Ollama, llama.cpp など）に差し替えられる
+GROQ_OPENAI_BASE_URL = "https://api.groq.com/openai/v1"
+SUMMARY_BASE_URL = os.getenv("SUMMARY_BASE_URL", GROQ_OPENAI_BASE_URL)
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "llama3-8b-8192")
+# ベースURLを差し替えた場合のAPIキー（Groq を使う場合は GROQ_API_KEY）
+SUMMARY_API_KEY = os.getenv("SUMMARY_API_KEY", "")
+# 1回のプロンプトに詰めるファイルの合計トークン数（目安）と、1ファイルあたりの上限
+SUMMARY_BATCH_TOKENS = int(os.getenv("SUMMARY_BATCH_TOKENS", "6000"))
+SUMMARY_FILE_MAX_TOKENS = int(os.getenv("SUMMARY_FILE_MAX_TOKENS", "1000"))
+# 1回の実行で行う要約の呼び出し回数の上限（超えた分のファイルは要約しない）
+SUMMARY_MAX_CALLS_PER_RUN = int(os.getenv("SUMMARY_MAX_CALLS_PER_RUN", "20"))
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "60"))
+# 出力トークン数の上限（1ファイルあたり）
+SUMMARY_OUTPUT_TOKENS_PER_FILE = 80
+# プロンプトを変えた場合は更新する（キャッシュ済みの要約を使わなくなる）
+SUMMARY_PROMPT_VERSION = "1"
+
+# トークン数の見積もりに使う1トークンあたりの文字数
+_CHARS_PER_TOKEN = 4
+# ファイルごとの見出し（"### [3] path"）などのオーバーヘッド
+_FILE_OVERHEAD_TOKENS = 16
+_SUMMARY_LINE = re.compile(r'^\s*\[?(\d+)\]?\s*[:.)\-]?\s*(.+?)\s*$')
+
+# 内容のハッシュごとの要約（(model, prompt_version, content_hash) → summary）
+_summary_cache = SharedCache("file-summary", ttl=float(os.getenv("SUMMARY_CACHE_TTL", str(30 * 24 * 3600))), l1_max_entries=20000)
+
+_session = None
+_session_lock = threading.Lock()
+
+SYSTEM_PROMPT = (
+    "You summarize source files for a software design document. "
+    "For each numbered file, write one sentence describing its purpose. "
+    "Answer with exactly one line per file in the form \"[<number>] <summary>\" and nothing else."
+)
+
+
+def summary_version() -> str:
+    """設計書のフィンガープリントに含める要約の設定（無効の場合は "off"）"""
+    return f"{SUMMARY_MODEL}:{SUMMARY_PROMPT_VERSION}" if FILE_SUMMARIES else "off"
+
+
+def _http_session():
+    # 接続をプロセス内で使い回す
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = lazy_import("requests").Session()
+        return _session
+
+
+def _excerpt(content: str) -> str:
+    limit = SUMMARY_FILE_MAX_TOKENS * _CHARS_PER_TOKEN
+    return content if len(content) <= limit else f"{content[:limit]}\n... (truncated)"
+
+
+class FileSummarizer:
+    def __init__(self, api_clients: APIClients, cancel_token: Optional[CancellationToken] = None,
+                 max_calls: int = SUMMARY_MAX_CALLS_PER_RUN):
+        """
+        ファイルごとの1文の要約を生成します。小さなファイルはトークン数の予算内で1つのプロンプトにまとめ、
+        応答はストリーミングで受け取りながら1行ずつキャッシュに保存します。
+        要約は内容のハッシュでキャッシュされるため、変更のないファイルを再度要約することはありません。
+        呼び出しは上流スケジューラーの "summary" プロバイダーでレート制限・同時実行数制御されます。
+
+        :param api_clients: APIクライアント（Groq を使う場合のAPIキー）
+        :param cancel_token: キャンセルされると、実行中・実行予定の要約を中断する
+        :param max_calls: この実行で行う呼び出し回数の上限
+        """
+        self.api_key = SUMMARY_API_KEY or (api_clients.groq_api_key if SUMMARY_BASE_URL == GROQ_OPENAI_BASE_URL else "")
+        self.cancel_token = cancel_token or CancellationToken()
+        self.max_calls = max_calls
+        self.scheduler = get_scheduler()
+        self.summaries: Dict[str, str] = {}
+        self.skipped = 0
+        # 要約を依頼したファイル（キャッシュになかったもの）
+        self._requested: List[str] = []
+        self._pending: List[Tuple[str, str, str]] = []
+        self._pending_tokens = 0
+        self._calls = 0
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.scheduler.max_concurrency("summary"),
+                                            thread_name_prefix="summarizer")
+
+    def add(self, file_path: str, file_hash: str, content: Optional[str] = None) -> None:
+        """
+        要約の対象に加えます。キャッシュ済みであればすぐに結果に加え、そうでなければ予算に達した時点で
+        バッチを送信します（送信は別スレッドで行われ、呼び出し元は待たない）。
+        内容が分からない場合（前回の実行で処理済みのファイル）はキャッシュだけを参照します。
+        """
+        cached = _summary_cache.get((SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, file_hash))
+        if cached is not None:
+            with self._lock:
+                self.summaries[file_path] = cached
+            return
+        if not content or not content.strip():
+            return
+        excerpt = _excerpt(content)
+        tokens = len(excerpt) // _CHARS_PER_TOKEN + _FILE_OVERHEAD_TOKENS
+        if self._pending and self._pending_tokens + tokens > SUMMARY_BATCH_TOKENS:
+            self._submit()
+        self._requested.append(file_path)
+        self._pending.append((file_path, file_hash, excerpt))
+        self._pending_tokens += tokens
+
+    def finish(self) -> Dict[str, str]:
+        """
+        残りのバッチを送信し、すべての要約の完了を待って {パス: 要約} を返します。
+        失敗したバッチのファイルは結果に含めません（設計書は既定の purpose を使う）。
+        """
+        if self._pending:
+            self._submit()
+        try:
+            for future in self._futures:
+                try:
+                    future.result()
+                except OperationCancelled:
+                    raise
+                except Exception as e:
+                    logger.warning(f"File summary batch failed: {e}")
+        finally:
+            self.close()
+        if self.skipped:
+            logger.info(f"Summary call budget ({self.max_calls}) exhausted; {self.skipped} files were not summarized.")
+        return dict(self.summaries)
+
+    @property
+    def complete(self) -> bool:
+        """
+        依頼したすべてのファイルの要約がそろったか（finish() の後に参照する）。
+        呼び出し回数の上限や失敗したバッチのために既定の purpose を使ったファイルがあれば False。
+        """
+        return self.skipped == 0 and all(file_path in self.summaries for file_path in self._requested)
+
+    def close(self) -> None:
+        """送信前・実行中のバッチを破棄します（実行が失敗した場合など）。"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self) -> None:
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        if self._calls >= self.max_calls:
+            self.skipped += len(batch)
+            return
+        self._calls += 1
+        # ワーカースレッドでもリクエストID・実行IDがログに付くよう、呼び出し元のコンテキストで実行する
+        context = contextvars.copy_context()
+        self._futures.append(self._executor.submit(context.run, self._summarize_batch, batch))
+
+    def _summarize_batch(self, batch: List[Tuple[str, str, str]]) -> None:
+        sections = "\n\n".join(
+            f"### [{index}] {file_path}\n{excerpt}" for index, (file_path, _, excerpt) in enumerate(batch, 1)
+        )
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": sections},
+        ]
+
+        def on_line(line: str):
+            match = _SUMMARY_LINE.match(line)
+            if not match:
+                return
+            index = int(match.group(1))
+            if not 1 <= index <= len(batch):
+                return
+            file_path, file_hash, _ = batch[index - 1]
+            summary = match.group(2)
+            _summary_cache.set((SUMMARY_MODEL, SUMMARY_PROMPT_VERSION, file_hash), summary)
+            with self._lock:
+                self.summaries[file_path] = summary
+
+        logger.info(f"Summarizing {len(batch)} files in one request")
+        self.scheduler.call("summary", self._stream_completion, messages, len(batch) * SUMMARY_OUTPUT_TOKENS_PER_FILE,
+                            on_line, cancel_token=self.cancel_token)
+
+    def _stream_completion(self, messages: List[Dict[str, str]], max_tokens: int, on_line: Callable[[str], None]) -> None:
+        """Chat Completions API をストリーミングで呼び出し、応答を1行ずつ on_line に渡します。"""
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        response = _http_session().post(
+            f"{SUMMARY_BASE_URL.rstrip('/')}/chat/completions",
+            json={"model": SUMMARY_MODEL, "messages": messages, "max_tokens": max_tokens, "temperature": 0, "stream": True},
+            headers=headers,
+            stream=True,
+            timeout=self.cancel_token.timeout(SUMMARY_TIMEOUT),
+        )
+        with response:
+            response.raise_for_status()
+            buffer = ""
+            for event in response.iter_lines(decode_unicode=True):
+                self.cancel_token.raise_if_cancelled()
+                if not event or not event.startswith("data:"):
+                    continue
+                data = event[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                buffer += (choices[0].get("delta") or {}).get("content") or ""
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    on_line(line)
+            if buffer.strip():
+                on_line(buffer)
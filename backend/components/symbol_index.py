@@ -0,0 +1,456 @@
+import os
+import posixpath
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from components.parser import EXTENSION_TO_LANGUAGE
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+SYMBOL_INDEX_PATH = os.getenv("SYMBOL_INDEX_PATH", os.path.join("symbol_index", "index.db"))
+
+# パース結果のキーとシンボルの種類の対応
+SYMBOL_KINDS = {
+    "functions": "function",
+    "classes": "class",
+    "interfaces": "interface",
+    "structs": "struct",
+    "enums": "enum",
+}
+
+# 依存関係の分類（custom_modules など）とインポートの種類の対応
+IMPORT_KINDS = {
+    "standard_libraries": "standard",
+    "external_libraries": "external",
+    "custom_modules": "custom",
+}
+
+# ES Modules のインポートを解決する際に試す拡張子
+ES_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".json")
+# パスエイリアス（@/ など）の解決先として試すディレクトリ
+ALIAS_ROOTS = ("src/", "")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    repo TEXT NOT NULL, branch TEXT NOT NULL, path TEXT NOT NULL, hash TEXT NOT NULL, language TEXT,
+    PRIMARY KEY (repo, branch, path)
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    repo TEXT NOT NULL, branch TEXT NOT NULL, name TEXT NOT NULL COLLATE NOCASE, kind TEXT NOT NULL,
+    path TEXT NOT NULL, ordinal INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (repo, branch, name);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols (repo, branch, path);
+CREATE TABLE IF NOT EXISTS imports (
+    repo TEXT NOT NULL, branch TEXT NOT NULL, path TEXT NOT NULL, target TEXT NOT NULL, kind TEXT NOT NULL,
+    resolved TEXT, target_key TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS imports_path ON imports (repo, branch, path);
+CREATE INDEX IF NOT EXISTS imports_target ON imports (repo, branch, target);
+CREATE INDEX IF NOT EXISTS imports_resolved ON imports (repo, branch, resolved);
+"""
+# target_key の追加前に作成されたデータベースでは、列を追加してから索引を作成する
+_TARGET_KEY_INDEX = "CREATE INDEX IF NOT EXISTS imports_target_key ON imports (repo, branch, target_key, resolved)"
+
+
+def extract_symbols(file_path: str, parsed: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    パース結果から (名前, 種類) の一覧を抽出します。JSONファイルのパース結果はデータそのものなので対象外です。
+    """
+    language = EXTENSION_TO_LANGUAGE.get(file_path.rsplit(".", 1)[-1].lower())
+    if language in (None, "json", "css") or not isinstance(parsed, dict) or "error" in parsed:
+        return []
+    symbols = []
+    for key, kind in SYMBOL_KINDS.items():
+        for name in parsed.get(key) or []:
+            if isinstance(name, str):
+                symbols.append((name, kind))
+    for header in parsed.get("headers") or []:
+        # Markdownの見出しは (#の並び, テキスト)
+        if isinstance(header, (list, tuple)) and len(header) == 2:
+            symbols.append((header[1].strip(), f"heading{len(header[0])}"))
+    return symbols
+
+
+def extract_imports(deps: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """依存関係の解析結果から (インポート先, 種類) の一覧を抽出します。マニフェストの宣言は含めません。"""
+    if "manifest_type" in deps:
+        return []
+    imports = []
+    for key, kind in IMPORT_KINDS.items():
+        for target in deps.get(key) or []:
+            imports.append((target, kind))
+    return imports
+
+
+def resolve_import(importer: str, target: str, known_paths: Set[str], known_dirs: Set[str]) -> Optional[str]:
+    """
+    リポジトリ内モジュールへのインポートを、インデックス済みのファイル（またはパッケージのディレクトリ）に解決します。
+
+    :param importer: インポート元のファイルパス
+    :param target: インポート先（'./utils', '@/lib/api', 'components', '..models' など）
+    :param known_paths: インデックス済みのファイルパス
+    :param known_dirs: インデックス済みのファイルを含むディレクトリ
+    :return: 解決先のパス。解決できなければ None
+    """
+    base_dir = posixpath.dirname(importer)
+    if importer.endswith(".py"):
+        if target.startswith("."):
+            level = len(target) - len(target.lstrip("."))
+            for _ in range(level - 1):
+                base_dir = posixpath.dirname(base_dir)
+            module = target[level:]
+            candidate_dirs = [base_dir]
+        else:
+            module = target
+            # 実行時のカレントディレクトリは分からないため、インポート元から上位のディレクトリを順に試す
+            candidate_dirs = []
+            directory = base_dir
+            while True:
+                candidate_dirs.append(directory)
+                if not directory:
+                    break
+                directory = posixpath.dirname(directory)
+        for directory in candidate_dirs:
+            stem = posixpath.join(directory, *module.split(".")) if module else directory
+            for candidate in (f"{stem}.py", posixpath.join(stem, "__init__.py")):
+                if candidate in known_paths:
+                    return candidate
+            if stem and stem in known_dirs:
+                return stem
+        return None
+
+    if target.startswith("."):
+        stems = [posixpath.normpath(posixpath.join(base_dir, target))]
+    elif target.startswith("/"):
+        stems = [target.lstrip("/")]
+    else:
+        prefix = next((alias for alias in ("@/", "~/", "#/") if target.startswith(alias)), "")
+        rest = target[len(prefix):]
+        stems = [root + rest for root in ALIAS_ROOTS]
+    for stem in stems:
+        candidates = [stem] + [stem + ext for ext in ES_EXTENSIONS] + [posixpath.join(stem, "index" + ext) for ext in ES_EXTENSIONS]
+        for candidate in candidates:
+            if candidate in known_paths:
+                return candidate
+    return None
+
+
+def import_target_key(importer: str, target: str) -> str:
+    """
+    インポート先の末尾の名前（'..models' → 'models'、'pkg.sub' → 'sub'、'@/lib/api' → 'api'）。
+    この名前を持つファイルやディレクトリが追加された場合にだけ、未解決のインポートを再解決する。
+    末尾の名前が決まらないインポート（'.'、'..' など）は空文字列で、ファイルが追加されるたびに再解決する。
+    """
+    if importer.endswith(".py"):
+        return target.lstrip(".").rsplit(".", 1)[-1]
+    name = target.rstrip("/").rsplit("/", 1)[-1]
+    return "" if name in (".", "..") else name
+
+
+def path_keys(path: str) -> Set[str]:
+    """ファイルを追加した場合に解決できるようになりうるインポートの末尾の名前（import_target_key の値）"""
+    name = posixpath.basename(path)
+    keys = {name, name.rsplit(".", 1)[0], ""}
+    # パッケージ（__init__.py、index.*）とディレクトリへのインポートは、上位のディレクトリの名前で終わる
+    directory = posixpath.dirname(path)
+    while directory:
+        keys.add(posixpath.basename(directory))
+        directory = posixpath.dirname(directory)
+    return keys
+
+
+class _IndexedPaths:
+    def __init__(self, connection: sqlite3.Connection, repo_name: str, branch_name: str, directories: bool = False):
+        """
+        索引済みのファイルパス（directories=True の場合はそれらを含むディレクトリ）。
+        resolve_import の known_paths / known_dirs として、全件を読み込まずに1件ずつ主キーで問い合わせる。
+        """
+        self._connection = connection
+        self._repo_name = repo_name
+        self._branch_name = branch_name
+        self._directories = directories
+        self._found: Dict[str, bool] = {}
+
+    def __contains__(self, path: str) -> bool:
+        found = self._found.get(path)
+        if found is None:
+            if self._directories:
+                # "<dir>/" 以上 "<dir>0" 未満（"0" は "/" の次の文字）のパスがあれば、そのディレクトリは存在する
+                row = self._connection.execute(
+                    "SELECT 1 FROM files WHERE repo = ? AND branch = ? AND path > ? AND path < ? LIMIT 1",
+                    (self._repo_name, self._branch_name, f"{path}/", f"{path}0")
+                ).fetchone()
+            else:
+                row = self._connection.execute(
+                    "SELECT 1 FROM files WHERE repo = ? AND branch = ? AND path = ?", (self._repo_name, self._branch_name, path)
+                ).fetchone()
+            found = self._found[path] = row is not None
+        return found
+
+
+class SymbolIndex:
+    def __init__(self, path: str = SYMBOL_INDEX_PATH):
+        """
+        リポジトリ・ブランチごとのシンボルとインポートの索引（SQLite、WALモード）。
+        シンボル名 → (ファイル, 種類) の転置インデックスと、ファイル間のインポートの辺を保持します。
+        ファイルは内容のハッシュで管理され、変更されたファイルだけが更新されます。
+
+        :param path: データベースファイルのパス
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)  # ディレクトリを自動作成
+        self._local = threading.local()
+        # 同一プロセス内の書き込みは直列化する（インポートの再解決が他の更新と競合しないように）
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        self._migrate(connection)
+        connection.execute(_TARGET_KEY_INDEX)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection):
+        """target_key の列がないデータベースに列を追加し、既存のインポートの値を埋めます。"""
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(imports)")}
+        if "target_key" in columns:
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(imports)")}
+            if "target_key" not in columns:
+                connection.execute("ALTER TABLE imports ADD COLUMN target_key TEXT NOT NULL DEFAULT ''")
+                rows = connection.execute("SELECT rowid, path, target FROM imports").fetchall()
+                connection.executemany(
+                    "UPDATE imports SET target_key = ? WHERE rowid = ?",
+                    [(import_target_key(path, target), rowid) for rowid, path, target in rows]
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def update_files(self, repo_name: str, branch_name: str, records: Dict[str, Dict[str, Any]]) -> int:
+        """
+        パイプラインのファイルごとの結果（hash, parsed, deps）で索引を更新します。
+        ハッシュが変わっていないファイルは何もしません。
+
+        :return: 更新したファイル数
+        """
+        if not records:
+            return 0
+        with self._write_lock:
+            connection = self._connection()
+            known = dict(connection.execute(
+                "SELECT path, hash FROM files WHERE repo = ? AND branch = ?", (repo_name, branch_name)
+            ).fetchall())
+            changed = {path: record for path, record in records.items() if known.get(path) != record["hash"]}
+            if not changed:
+                return 0
+
+            symbol_rows = []
+            import_rows = []
+            for path, record in changed.items():
+                for ordinal, (name, kind) in enumerate(extract_symbols(path, record.get("parsed"))):
+                    symbol_rows.append((repo_name, branch_name, name, kind, path, ordinal))
+                for target, kind in extract_imports(record.get("deps") or {}):
+                    import_rows.append((repo_name, branch_name, path, target, kind, import_target_key(path, target)))
+
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_paths(connection, repo_name, branch_name, list(changed))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO files (repo, branch, path, hash, language) VALUES (?, ?, ?, ?, ?)",
+                    [(repo_name, branch_name, path, record["hash"], EXTENSION_TO_LANGUAGE.get(path.rsplit(".", 1)[-1].lower()))
+                     for path, record in changed.items()]
+                )
+                connection.executemany(
+                    "INSERT INTO symbols (repo, branch, name, kind, path, ordinal) VALUES (?, ?, ?, ?, ?, ?)", symbol_rows
+                )
+                connection.executemany(
+                    "INSERT INTO imports (repo, branch, path, target, kind, target_key) VALUES (?, ?, ?, ?, ?, ?)",
+                    import_rows
+                )
+                # 更新したファイルのインポートと、更新したファイルによって解決できるようになりうる未解決のインポートを解決する
+                self._resolve_pending(connection, repo_name, branch_name, list(changed))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        logger.debug("Symbol index updated for %s@%s: %d files, %d symbols.", repo_name, branch_name, len(changed), len(symbol_rows))
+        return len(changed)
+
+    def remove_files(self, repo_name: str, branch_name: str, paths: Iterable[str]) -> None:
+        """削除されたファイルを索引から取り除きます。これらを指していたインポートは未解決に戻します。"""
+        paths = list(paths)
+        if not paths:
+            return
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_paths(connection, repo_name, branch_name, paths)
+                # 削除されたファイルを指していたインポートだけを再解決する（パッケージのディレクトリに解決される場合がある）
+                rows = []
+                for path in paths:
+                    rows.extend(connection.execute(
+                        "SELECT rowid, path, target FROM imports WHERE repo = ? AND branch = ? AND resolved = ?",
+                        (repo_name, branch_name, path)
+                    ))
+                connection.executemany("UPDATE imports SET resolved = NULL WHERE rowid = ?", [(row[0],) for row in rows])
+                self._resolve_rows(connection, repo_name, branch_name, rows)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def remove_branch(self, repo_name: str, branch_name: str) -> None:
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for table in ("files", "symbols", "imports"):
+                    connection.execute(f"DELETE FROM {table} WHERE repo = ? AND branch = ?", (repo_name, branch_name))
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _delete_paths(self, connection: sqlite3.Connection, repo_name: str, branch_name: str, paths: List[str]):
+        params = [(repo_name, branch_name, path) for path in paths]
+        for table in ("files", "symbols", "imports"):
+            connection.executemany(f"DELETE FROM {table} WHERE repo = ? AND branch = ? AND path = ?", params)
+
+    def _resolve_pending(self, connection: sqlite3.Connection, repo_name: str, branch_name: str, paths: List[str]):
+        """
+        更新したファイルのインポートと、末尾の名前が更新したファイル（またはその上位のディレクトリ）の名前と一致する
+        未解決のインポートだけを解決します。索引全体のファイルや未解決のインポートは読み込まない。
+        """
+        rows: Dict[int, Tuple[str, str]] = {}
+        for path in paths:
+            for rowid, importer, target in connection.execute(
+                "SELECT rowid, path, target FROM imports WHERE repo = ? AND branch = ? AND path = ? AND kind = 'custom'",
+                (repo_name, branch_name, path)
+            ):
+                rows[rowid] = (importer, target)
+        keys = set()
+        for path in paths:
+            keys.update(path_keys(path))
+        for key in keys:
+            for rowid, importer, target in connection.execute(
+                "SELECT rowid, path, target FROM imports WHERE repo = ? AND branch = ? AND target_key = ? "
+                "AND resolved IS NULL AND kind = 'custom'",
+                (repo_name, branch_name, key)
+            ):
+                rows[rowid] = (importer, target)
+        self._resolve_rows(connection, repo_name, branch_name,
+                           [(rowid, importer, target) for rowid, (importer, target) in rows.items()])
+
+    @staticmethod
+    def _resolve_rows(connection: sqlite3.Connection, repo_name: str, branch_name: str, rows: List[Tuple[int, str, str]]):
+        known_paths = _IndexedPaths(connection, repo_name, branch_name)
+        known_dirs = _IndexedPaths(connection, repo_name, branch_name, directories=True)
+        updates = []
+        for rowid, path, target in rows:
+            resolved = resolve_import(path, target, known_paths, known_dirs)
+            if resolved is not None:
+                updates.append((resolved, rowid))
+        connection.executemany("UPDATE imports SET resolved = ? WHERE rowid = ?", updates)
+
+    def search(self, repo_name: str, branch_name: str, query: str, kind: Optional[str] = None,
+               prefix: bool = True, limit: int = 50) -> List[Dict[str, str]]:
+        """
+        シンボル名で検索します（大文字小文字を区別しない）。
+
+        :param prefix: Trueの場合は前方一致、Falseの場合は完全一致
+        """
+        if prefix:
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            condition, value = "name LIKE ? ESCAPE '\\'", escaped + "%"
+        else:
+            condition, value = "name = ?", query
+        sql = f"SELECT name, kind, path FROM symbols WHERE repo = ? AND branch = ? AND {condition}"
+        params: List[Any] = [repo_name, branch_name, value]
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        sql += " ORDER BY name, path LIMIT ?"
+        params.append(limit)
+        rows = self._connection().execute(sql, params).fetchall()
+        return [{"name": name, "kind": kind, "path": path} for name, kind, path in rows]
+
+    def importers(self, repo_name: str, branch_name: str, target: str) -> List[Dict[str, Optional[str]]]:
+        """
+        指定したファイル（パッケージのディレクトリ経由のインポートを含む）またはモジュール名をインポートしているファイル。
+        """
+        directories = []
+        directory = posixpath.dirname(target)
+        while directory:
+            directories.append(directory)
+            directory = posixpath.dirname(directory)
+        candidates = [target] + directories
+        placeholders = ",".join("?" * len(candidates))
+        rows = self._connection().execute(
+            f"SELECT DISTINCT path, target, kind, resolved FROM imports WHERE repo = ? AND branch = ? "
+            f"AND (target = ? OR resolved IN ({placeholders})) ORDER BY path",
+            (repo_name, branch_name, target, *candidates)
+        ).fetchall()
+        return [{"path": path, "import": name, "kind": kind, "resolved": resolved} for path, name, kind, resolved in rows]
+
+    def custom_imports(self, repo_name: str, branch_name: str) -> Dict[str, List[str]]:
+        """索引済みのファイルごとのリポジトリ内モジュールへのインポート（ファイルパス → インポート先）"""
+        rows = self._connection().execute(
+            "SELECT path, target FROM imports WHERE repo = ? AND branch = ? AND kind = 'custom'", (repo_name, branch_name)
+        ).fetchall()
+        imports: Dict[str, List[str]] = {}
+        for path, target in rows:
+            imports.setdefault(path, []).append(target)
+        return imports
+
+    def outline(self, repo_name: str, branch_name: str, path: str) -> Optional[Dict[str, Any]]:
+        """ファイルのシンボルとインポートの一覧。索引にないファイルの場合は None を返します。"""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT hash, language FROM files WHERE repo = ? AND branch = ? AND path = ?", (repo_name, branch_name, path)
+        ).fetchone()
+        if row is None:
+            return None
+        symbols = connection.execute(
+            "SELECT name, kind FROM symbols WHERE repo = ? AND branch = ? AND path = ? ORDER BY ordinal",
+            (repo_name, branch_name, path)
+        ).fetchall()
+        imports = connection.execute(
+            "SELECT target, kind, resolved FROM imports WHERE repo = ? AND branch = ? AND path = ? ORDER BY target",
+            (repo_name, branch_name, path)
+        ).fetchall()
+        return {
+            "path": path,
+            "hash": row[0],
+            "language": row[1],
+            "symbols": [{"name": name, "kind": kind} for name, kind in symbols],
+            "imports": [{"import": target, "kind": kind, "resolved": resolved} for target, kind, resolved in imports],
+        }
+
+
+_symbol_index: Optional[SymbolIndex] = None
+_symbol_index_lock = threading.Lock()
+
+
+def get_symbol_index() -> SymbolIndex:
+    """プロセス共通の索引を返します（初回使用時にデータベースを開く）。"""
+    global _symbol_index
+    with _symbol_index_lock:
+        if _symbol_index is None:
+            _symbol_index = SymbolIndex()
+        return _symbol_index
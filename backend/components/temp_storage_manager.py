@@ -1,30 +1,145 @@
 import os
 import json
-from typing import Any
+import shutil
+import struct
+import threading
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# レコードヘッダー: 操作種別(1byte), キー長(2byte), ペイロード長(4byte)
+_HEADER = struct.Struct(">BHI")
+_OP_PUT = 1
+_OP_DELETE = 2
+
 
 class TempStorageManager:
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, namespace: Optional[str] = None, shards: int = 16, base_root: str = "temp_storage"):
+        """
+        ユーザーごとの一時保存領域。データは zlib 圧縮した JSON として、キーのハッシュで選んだシャードの
+        ログファイルに追記されます。キーの位置はメモリ上のインデックスで管理し、起動時にログを走査して復元します。
+
+        :param user_id: ユーザーID
+        :param namespace: ユーザー領域内のサブディレクトリ（パイプライン実行IDなど）
+        :param shards: シャード（ログファイル）の数
+        :param base_root: 保存先のルートディレクトリ
+        """
         self.user_id = user_id
-        self.base_dir = os.path.join("temp_storage", self.user_id)
+        self.base_dir = os.path.join(base_root, self.user_id, namespace) if namespace else os.path.join(base_root, self.user_id)
         os.makedirs(self.base_dir, exist_ok=True)  # ディレクトリを自動作成
+        self.shards = shards
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._index: Dict[str, Tuple[int, int, int]] = {}  # key → (shard, offset, length)
+        self._index_lock = threading.Lock()
+        self._load_index()
+
+    def _shard_path(self, shard: int) -> str:
+        return os.path.join(self.base_dir, f"shard_{shard:02d}.log")
+
+    def _shard_for(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % self.shards
+
+    def _load_index(self):
+        """既存のシャードを走査してインデックスを復元します（最後のレコードが有効）。"""
+        for shard in range(self.shards):
+            for op, key, offset, length in self._scan(shard):
+                if op == _OP_PUT:
+                    self._index[key] = (shard, offset, length)
+                else:
+                    self._index.pop(key, None)
+
+    def _scan(self, shard: int) -> Iterator[Tuple[int, str, int, int]]:
+        path = self._shard_path(shard)
+        if not os.path.exists(path):
+            return
+        size = os.path.getsize(path)
+        with open(path, "rb") as file:
+            while True:
+                header = file.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return  # 途中で切れたレコードは無視する
+                op, key_length, payload_length = _HEADER.unpack(header)
+                key_bytes = file.read(key_length)
+                offset = file.tell()
+                if len(key_bytes) < key_length or offset + payload_length > size:
+                    return
+                file.seek(payload_length, os.SEEK_CUR)
+                yield op, key_bytes.decode("utf-8"), offset, payload_length
+
+    def _append(self, shard: int, op: int, key: str, payload: bytes) -> Tuple[int, int]:
+        key_bytes = key.encode("utf-8")
+        with self._locks[shard]:
+            with open(self._shard_path(shard), "ab") as file:
+                file.write(_HEADER.pack(op, len(key_bytes), len(payload)))
+                file.write(key_bytes)
+                offset = file.tell()
+                file.write(payload)
+        return offset, len(payload)
 
     def save(self, key: str, data: Any):
-        """指定されたキーでデータをJSONファイルとして保存"""
-        file_path = os.path.join(self.base_dir, f"{key}.json")
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)  # 必要なディレクトリを作成
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+        """指定されたキーでデータを圧縮して追記保存"""
+        payload = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"), 3)
+        shard = self._shard_for(key)
+        offset, length = self._append(shard, _OP_PUT, key, payload)
+        with self._index_lock:
+            self._index[key] = (shard, offset, length)
 
     def load(self, key: str) -> Any:
-        """指定されたキーに対応するJSONファイルを読み込む"""
-        file_path = os.path.join(self.base_dir, f"{key}.json")
-        if not os.path.exists(file_path):
+        """指定されたキーに対応するデータを読み込む"""
+        with self._index_lock:
+            location = self._index.get(key)
+        if location is None:
             raise FileNotFoundError(f"File not found for key: {key}")
-        with open(file_path, "r", encoding="utf-8") as file:
-            return json.load(file)
+        shard, offset, length = location
+        with open(self._shard_path(shard), "rb") as file:
+            file.seek(offset)
+            payload = file.read(length)
+        return json.loads(zlib.decompress(payload).decode("utf-8"))
 
     def delete(self, key: str):
-        """指定されたキーに対応するファイルを削除"""
-        file_path = os.path.join(self.base_dir, f"{key}.json")
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        """指定されたキーに対応するデータを削除（削除レコードを追記）"""
+        with self._index_lock:
+            if key not in self._index:
+                return
+            del self._index[key]
+        self._append(self._shard_for(key), _OP_DELETE, key, b"")
+
+    def exists(self, key: str) -> bool:
+        with self._index_lock:
+            return key in self._index
+
+    def keys(self, prefix: str = "") -> List[str]:
+        with self._index_lock:
+            return [key for key in self._index if key.startswith(prefix)]
+
+    def compact(self):
+        """有効なレコードだけを残してシャードを書き直します。"""
+        for shard in range(self.shards):
+            with self._locks[shard]:
+                path = self._shard_path(shard)
+                if not os.path.exists(path):
+                    continue
+                with self._index_lock:
+                    live = [(key, loc) for key, loc in self._index.items() if loc[0] == shard]
+                tmp_path = f"{path}.compact"
+                new_locations = {}
+                with open(path, "rb") as source, open(tmp_path, "wb") as target:
+                    for key, (_, offset, length) in live:
+                        source.seek(offset)
+                        payload = source.read(length)
+                        key_bytes = key.encode("utf-8")
+                        target.write(_HEADER.pack(_OP_PUT, len(key_bytes), length))
+                        target.write(key_bytes)
+                        new_locations[key] = ((shard, offset, length), (shard, target.tell(), length))
+                        target.write(payload)
+                os.replace(tmp_path, path)
+                with self._index_lock:
+                    for key, (old, new) in new_locations.items():
+                        # 圧縮中に削除されたキーは復活させない
+                        if self._index.get(key) == old:
+                            self._index[key] = new
+
+    def clear(self):
+        """保存領域ごと削除します。"""
+        with self._index_lock:
+            self._index.clear()
+        shutil.rmtree(self.base_dir, ignore_errors=True)
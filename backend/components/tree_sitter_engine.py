@@ -0,0 +1,281 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from utils.lazy_import import lazy_import
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 再パース用に保持する構文木の最大数（ファイル単位）
+TREE_CACHE_MAX_FILES = int(os.getenv("TREE_SITTER_TREE_CACHE", "256"))
+
+# 拡張子 → (文法名, 文法パッケージ, 言語を返す関数名)
+GRAMMARS = {
+    "py": ("python", "tree_sitter_python", "language"),
+    "js": ("javascript", "tree_sitter_javascript", "language"),
+    "jsx": ("javascript", "tree_sitter_javascript", "language"),
+    "ts": ("typescript", "tree_sitter_typescript", "language_typescript"),
+    "tsx": ("tsx", "tree_sitter_typescript", "language_tsx"),
+    "rs": ("rust", "tree_sitter_rust", "language"),
+    "go": ("go", "tree_sitter_go", "language"),
+}
+
+# 文法ごとのクエリ。キャプチャ名が結果のキーに対応する。
+# 文法のバージョンによって存在しないノード型があるため、パターンは1つずつ検証してから1つのクエリにまとめる
+_JS_PATTERNS = [
+    "(function_declaration name: (identifier) @function)",
+    "(generator_function_declaration name: (identifier) @function)",
+    "(variable_declarator name: (identifier) @function value: (arrow_function))",
+    "(variable_declarator name: (identifier) @function value: (function_expression))",
+    "(variable_declarator name: (identifier) @function value: (function))",
+    "(method_definition name: (property_identifier) @method)",
+    "(import_statement source: (string) @import)",
+]
+QUERIES = {
+    "python": [
+        "(function_definition name: (identifier) @function)",
+        "(class_definition name: (identifier) @class)",
+        "(import_statement name: (dotted_name) @import)",
+        "(import_statement name: (aliased_import name: (dotted_name) @import))",
+        "(import_from_statement module_name: (dotted_name) @import)",
+        "(import_from_statement module_name: (relative_import) @import)",
+    ],
+    "javascript": _JS_PATTERNS + [
+        "(class_declaration name: (identifier) @class)",
+    ],
+    "typescript": _JS_PATTERNS + [
+        "(class_declaration name: (type_identifier) @class)",
+        "(abstract_class_declaration name: (type_identifier) @class)",
+        "(interface_declaration name: (type_identifier) @interface)",
+    ],
+    "rust": [
+        "(function_item name: (identifier) @function)",
+        "(function_signature_item name: (identifier) @function)",
+        "(struct_item name: (type_identifier) @struct)",
+        "(enum_item name: (type_identifier) @enum)",
+        "(use_declaration argument: (_) @import)",
+    ],
+    "go": [
+        "(function_declaration name: (identifier) @function)",
+        "(method_declaration name: (field_identifier) @method)",
+        "(type_spec name: (type_identifier) @struct type: (struct_type))",
+        "(import_spec path: (interpreted_string_literal) @import)",
+    ],
+}
+QUERIES["tsx"] = QUERIES["typescript"]
+
+# 正規表現パーサーと同じ結果の形（文法名 → キャプチャ名 → 結果のキー）
+RESULT_KEYS = {
+    "python": {"function": "functions", "class": "classes", "import": "dependencies"},
+    "javascript": {"function": "functions", "method": "functions", "class": "classes", "import": "dependencies"},
+    "typescript": {"interface": "interfaces", "function": "functions", "method": "functions", "class": "classes"},
+    "rust": {"function": "functions", "struct": "structs", "enum": "enums", "import": "dependencies"},
+    "go": {"function": "functions", "method": "functions", "struct": "structs", "import": "dependencies"},
+}
+RESULT_KEYS["tsx"] = RESULT_KEYS["typescript"]
+
+_CLASS_NODE_TYPES = {"class_declaration", "abstract_class_declaration", "class"}
+
+
+def _point(data: bytes, offset: int) -> Tuple[int, int]:
+    """バイト位置を (行, 列) に変換します（列もバイト単位）。"""
+    row = data.count(b"\n", 0, offset)
+    return row, offset - (data.rfind(b"\n", 0, offset) + 1)
+
+
+def _common_prefix(a: bytes, b: bytes) -> int:
+    # スライスの比較（memcmp）による二分探索。1バイトずつ比較するより大きなファイルで速い
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a: bytes, b: bytes, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class TreeSitterEngine:
+    def __init__(self, tree_sitter: Any):
+        """
+        tree-sitter の文法による構文解析エンジン。結果は Parser の正規表現パーサーと同じ形で返します。
+        文法ごとのクエリは1つにまとめられ、1回の走査ですべてのシンボルとインポートを抽出します。
+        同じファイルを再パースする場合は前回の構文木を編集して差分だけを解析し直します。
+
+        :param tree_sitter: tree_sitter モジュール
+        """
+        self.ts = tree_sitter
+        self._languages: Dict[str, Any] = {}
+        self._queries: Dict[str, Any] = {}
+        self._unavailable = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Parser オブジェクトはスレッドごとに持つ
+        self._trees: "OrderedDict[Tuple[str, str], Tuple[bytes, Any]]" = OrderedDict()
+        self._trees_lock = threading.Lock()
+
+    def supports(self, file_type: str) -> bool:
+        grammar = GRAMMARS.get(file_type)
+        return grammar is not None and self._language(grammar[0]) is not None
+
+    def _language(self, name: str) -> Optional[Any]:
+        with self._lock:
+            if name in self._languages:
+                return self._languages[name]
+            if name in self._unavailable:
+                return None
+            _, package, function = next(grammar for grammar in GRAMMARS.values() if grammar[0] == name)
+            try:
+                try:
+                    language = self.ts.Language(getattr(lazy_import(package), function)())
+                except ImportError:
+                    # 旧来の一括パッケージ（tree_sitter_languages）
+                    language = lazy_import("tree_sitter_languages").get_language(name)
+                self._queries[name] = self._build_query(name, language)
+            except Exception as e:
+                logger.warning(f"tree-sitter grammar for {name} is not available; using regex parser: {e}")
+                self._unavailable.add(name)
+                return None
+            self._languages[name] = language
+            return language
+
+    def _compile(self, language: Any, source: str) -> Any:
+        query_class = getattr(self.ts, "Query", None)
+        if query_class is not None:
+            try:
+                return query_class(language, source)
+            except TypeError:
+                pass
+        return language.query(source)
+
+    def _build_query(self, name: str, language: Any) -> Any:
+        valid = []
+        for pattern in QUERIES[name]:
+            try:
+                self._compile(language, pattern)
+                valid.append(pattern)
+            except Exception:
+                logger.debug("Skipping query pattern unsupported by the %s grammar: %s", name, pattern)
+        return self._compile(language, "\n".join(valid))
+
+    def _parser(self, name: str) -> Any:
+        parsers = getattr(self._local, "parsers", None)
+        if parsers is None:
+            parsers = self._local.parsers = {}
+        parser = parsers.get(name)
+        if parser is None:
+            language = self._languages[name]
+            try:
+                parser = self.ts.Parser(language)
+            except TypeError:
+                parser = self.ts.Parser()
+                parser.set_language(language)
+            parsers[name] = parser
+        return parser
+
+    def _parse_tree(self, name: str, file_path: str, data: bytes) -> Any:
+        key = (file_path, name)
+        # 構文木は編集されるため、使用中は他のスレッドから取得できないようキャッシュから取り出しておく
+        with self._trees_lock:
+            previous = self._trees.pop(key, None)
+        if previous is not None and previous[0] == data:
+            tree = previous[1]
+        elif previous is not None:
+            old_data, old_tree = previous
+            start = _common_prefix(old_data, data)
+            suffix = _common_suffix(old_data, data, min(len(old_data), len(data)) - start)
+            old_end, new_end = len(old_data) - suffix, len(data) - suffix
+            old_tree.edit(
+                start_byte=start, old_end_byte=old_end, new_end_byte=new_end,
+                start_point=_point(data, start), old_end_point=_point(old_data, old_end), new_end_point=_point(data, new_end),
+            )
+            tree = self._parser(name).parse(data, old_tree)
+        else:
+            tree = self._parser(name).parse(data)
+        with self._trees_lock:
+            self._trees[key] = (data, tree)
+            while len(self._trees) > TREE_CACHE_MAX_FILES:
+                self._trees.popitem(last=False)
+        return tree
+
+    def _captures(self, name: str, node: Any) -> List[Tuple[Any, str]]:
+        query = self._queries[name]
+        cursor_class = getattr(self.ts, "QueryCursor", None)
+        captures = cursor_class(query).captures(node) if cursor_class is not None else query.captures(node)
+        if isinstance(captures, dict):
+            items = [(captured, capture) for capture, nodes in captures.items() for captured in nodes]
+        else:
+            items = list(captures)
+        items.sort(key=lambda item: item[0].start_byte)
+        return items
+
+    def parse(self, file_path: str, file_content: str, file_type: str) -> Dict[str, Any]:
+        """ファイルを解析し、正規表現パーサーと同じ形の結果を返します。"""
+        name = GRAMMARS[file_type][0]
+        data = file_content.encode("utf-8")
+        tree = self._parse_tree(name, file_path, data)
+        keys = RESULT_KEYS[name]
+        result: Dict[str, List[str]] = {key: [] for key in dict.fromkeys(keys.values())}
+        for node, capture in self._captures(name, tree.root_node):
+            key = keys.get(capture)
+            if key is None:
+                continue
+            text = data[node.start_byte:node.end_byte].decode("utf-8", errors="replace")
+            if capture == "import":
+                text = "".join(text.split()).strip("'\"`")
+            elif capture == "method":
+                owner = self._method_owner(name, node, data)
+                if owner is None:
+                    continue
+                text = f"{owner}.{text}"
+            result[key].append(text)
+        return result
+
+    def _method_owner(self, name: str, node: Any, data: bytes) -> Optional[str]:
+        """メソッドが属する型・クラスの名前。クラス以外（オブジェクトリテラルなど）のメソッドは None。"""
+        if name == "go":
+            receiver = node.parent.child_by_field_name("receiver")
+            if receiver is None:
+                return None
+            text = data[receiver.start_byte:receiver.end_byte].decode("utf-8", errors="replace")
+            # "(s *Server)" → "Server", "(l List[T])" → "List"
+            return text.strip("()").split()[-1].lstrip("*").split("[", 1)[0]
+        body = node.parent.parent if node.parent is not None else None
+        if body is None or body.type != "class_body" or body.parent is None:
+            return None
+        owner = body.parent
+        if owner.type not in _CLASS_NODE_TYPES:
+            return None
+        owner_name = owner.child_by_field_name("name")
+        if owner_name is None:
+            return None
+        return data[owner_name.start_byte:owner_name.end_byte].decode("utf-8", errors="replace")
+
+
+_engine: Optional[TreeSitterEngine] = None
+_engine_initialized = False
+_engine_lock = threading.Lock()
+
+
+def get_tree_sitter_engine() -> Optional[TreeSitterEngine]:
+    """プロセス共通のエンジンを返します。tree_sitter がインストールされていない場合は None。"""
+    global _engine, _engine_initialized
+    with _engine_lock:
+        if not _engine_initialized:
+            _engine_initialized = True
+            try:
+                _engine = TreeSitterEngine(lazy_import("tree_sitter"))
+            except ImportError as e:
+                logger.warning(f"tree-sitter is not installed; using regex parser: {e}")
+        return _engine
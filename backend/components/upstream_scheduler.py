@@ -0,0 +1,337 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+from components.cancellation import CancellationToken
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# プロバイダーごとのデフォルト設定（環境変数 UPSTREAM_<PROVIDER>_<KEY> で上書き可能）
+PROVIDER_DEFAULTS = {
+    "groq": {"rate": 4.0, "burst": 8, "max_concurrency": 8},
+    "toolhouse": {"rate": 8.0, "burst": 16, "max_concurrency": 16},
+    "lingustruct": {"rate": 10.0, "burst": 20, "max_concurrency": 16},
+    # ファイルの要約（Groq またはローカルのモデルサーバー）。取得用の groq とは別に予算を持つ
+    "summary": {"rate": 1.0, "burst": 4, "max_concurrency": 4},
+}
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTION_NAMES = {
+    "ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout",
+    "APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError",
+}
+
+
+class UpstreamError(Exception):
+    """上流呼び出しがリトライ後も失敗した場合の例外"""
+
+
+class CircuitOpenError(UpstreamError):
+    """サーキットブレーカーが開いているため呼び出しを拒否した場合の例外"""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        """
+        トークンバケット方式のレートリミッター。
+
+        :param rate: 1秒あたりに補充されるトークン数
+        :param capacity: バケットの最大容量（バースト許容量）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, cancel_token: Optional[CancellationToken] = None) -> None:
+        """トークンを1つ取得するまでブロックします。キャンセルされた場合は待機を打ち切ります。"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if cancel_token is not None:
+                cancel_token.sleep(wait)
+            else:
+                time.sleep(wait)
+
+    def drain(self) -> None:
+        """429受信時にバケットを空にし、即時の再送を抑制します。"""
+        with self.lock:
+            self.tokens = 0.0
+            self.updated_at = time.monotonic()
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """
+        連続失敗が閾値を超えた場合に呼び出しを一時的に遮断します。
+        HALF_OPEN では1件の試行（プローブ）だけを通し、その結果で CLOSED か OPEN に戻ります。
+
+        :param failure_threshold: OPENに遷移する連続失敗回数
+        :param recovery_timeout: OPENからHALF_OPENに遷移するまでの秒数
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self.probing:
+                    return False
+                self.probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self.probing = False
+
+    def release_probe(self) -> None:
+        """失敗として数えない結果（429 や再試行しないエラー）でプローブが終わった場合に、次の呼び出しにプローブを譲ります。"""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        """
+        AIMD（加算増加・乗算減少）方式で同時実行数を調整します。
+        429を受けると上限を半減し、成功が続くと1ずつ増やします。
+        """
+        self.limit = initial
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, cancel_token: Optional[CancellationToken] = None) -> None:
+        with self.condition:
+            while self.in_flight >= self.limit:
+                if cancel_token is None:
+                    self.condition.wait()
+                else:
+                    # キャンセルは通知されないため、一定間隔で確認する
+                    self.condition.wait(timeout=0.25)
+                    cancel_token.raise_if_cancelled()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+    def on_success(self) -> None:
+        with self.condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify()
+
+    def on_rate_limited(self) -> None:
+        with self.condition:
+            self.limit = max(self.minimum, self.limit // 2)
+            self.successes = 0
+
+
+class ProviderState:
+    def __init__(self, name: str, rate: float, burst: int, max_concurrency: int):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+        self.limiter = AdaptiveConcurrencyLimiter(initial=max(1, max_concurrency // 2), maximum=max_concurrency)
+        self.max_concurrency = max_concurrency
+
+
+class UpstreamScheduler:
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        上流API（Groq / Toolhouse / LinguStruct）呼び出しの共通スケジューラー。
+        プロバイダーごとのレート制限、リトライ、サーキットブレーカー、適応的な同時実行数制御を行います。
+
+        :param max_retries: 最大リトライ回数
+        :param base_delay: 指数バックオフの基準秒数
+        :param max_delay: バックオフの最大秒数
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.providers: Dict[str, ProviderState] = {}
+        self.lock = threading.Lock()
+
+    def provider(self, name: str) -> ProviderState:
+        with self.lock:
+            if name not in self.providers:
+                defaults = PROVIDER_DEFAULTS.get(name, {"rate": 5.0, "burst": 10, "max_concurrency": 8})
+                prefix = f"UPSTREAM_{name.upper()}_"
+                self.providers[name] = ProviderState(
+                    name,
+                    rate=float(os.getenv(prefix + "RATE", defaults["rate"])),
+                    burst=int(os.getenv(prefix + "BURST", defaults["burst"])),
+                    max_concurrency=int(os.getenv(prefix + "MAX_CONCURRENCY", defaults["max_concurrency"])),
+                )
+            return self.providers[name]
+
+    def max_concurrency(self, name: str) -> int:
+        return self.provider(name).max_concurrency
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """プロバイダーごとの同時実行数とサーキットブレーカーの状態。"""
+        with self.lock:
+            providers = list(self.providers.values())
+        return {
+            provider.name: {
+                "concurrency_limit": provider.limiter.limit,
+                "in_flight": provider.limiter.in_flight,
+                "circuit": provider.breaker.state,
+            }
+            for provider in providers
+        }
+
+    def call(self, provider_name: str, func: Callable[..., Any], *args,
+             cancel_token: Optional[CancellationToken] = None, **kwargs) -> Any:
+        """
+        上流呼び出しを実行します。再試行可能なエラーはジッター付き指数バックオフでリトライし、
+        Retry-After ヘッダーがあればその値を優先します。
+
+        :param provider_name: プロバイダー名（"groq", "toolhouse", "lingustruct"）
+        :param func: 実行する呼び出し
+        :param cancel_token: キャンセルされた場合、待機中・リトライ待ちの呼び出しを OperationCancelled で中断する
+        :return: 呼び出しの戻り値
+        """
+        provider = self.provider(provider_name)
+        attempt = 0
+        while True:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if not provider.breaker.allow():
+                raise CircuitOpenError(f"Circuit breaker is open for provider: {provider_name}")
+
+            provider.bucket.acquire(cancel_token)
+            provider.limiter.acquire(cancel_token)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                status = _extract_status_code(e)
+                if status == 429:
+                    provider.limiter.on_rate_limited()
+                    provider.bucket.drain()
+                # 429 はトークンバケットと同時実行数の制御で扱うため、遮断の判定には 5xx と接続エラーだけを数える
+                if _is_outage(e, status):
+                    provider.breaker.record_failure()
+                else:
+                    provider.breaker.release_probe()
+                if not _is_retryable(e, status):
+                    raise
+                if attempt >= self.max_retries:
+                    raise UpstreamError(f"{provider_name} call failed after {attempt + 1} attempts: {e}") from e
+                delay = self._backoff_delay(attempt, _extract_retry_after(e))
+                logger.warning(f"Retryable error from {provider_name} (status={status}), retrying in {delay:.2f}s: {e}")
+                attempt += 1
+                if cancel_token is not None:
+                    cancel_token.sleep(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            finally:
+                provider.limiter.release()
+
+            provider.breaker.record_success()
+            provider.limiter.on_success()
+            return result
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """フルジッター付き指数バックオフの待機秒数を計算します。"""
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def _extract_status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _extract_retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception, status: Optional[int]) -> bool:
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in RETRYABLE_EXCEPTION_NAMES
+
+
+def _is_outage(error: Exception, status: Optional[int]) -> bool:
+    """プロバイダーの障害とみなすエラー（5xx と接続エラー）"""
+    if status is not None:
+        return status >= 500
+    return type(error).__name__ in RETRYABLE_EXCEPTION_NAMES and type(error).__name__ != "RateLimitError"
+
+
+_scheduler: Optional[UpstreamScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> UpstreamScheduler:
+    """プロセス共通のスケジューラーを返します。"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UpstreamScheduler(
+                max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "5")),
+                base_delay=float(os.getenv("UPSTREAM_BASE_DELAY", "0.5")),
+                max_delay=float(os.getenv("UPSTREAM_MAX_DELAY", "30")),
+            )
+        return _scheduler
@@ -0,0 +1,82 @@
+import os
+import time
+from typing import Any, Dict, Optional
+from components.api_clients import get_api_clients
+from components.config import load_environment
+from components.mapper import Mapper
+from components.document_generator import DocumentGenerator
+from components.pipeline import KEY_MAPPING_API_URL
+from utils.lazy_import import lazy_import
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 起動時にSDKの読み込み・キーマッピング・テンプレートの取得を済ませておく（既定は無効）
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "0") == "1"
+
+# 起動時に読み込んでおく重いモジュール
+WARMUP_MODULES = ("groq", "toolhouse", "requests", "yaml")
+
+
+class WarmupState:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.status = "pending" if enabled else "disabled"
+        self.started_at: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.templates_loaded = 0
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        # ウォームアップは最適化のため、失敗しても受け付けは開始する
+        return self.status in ("disabled", "done", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "duration_seconds": round(self.duration, 3) if self.duration is not None else None,
+            "templates_loaded": self.templates_loaded,
+            "error": self.error,
+        }
+
+
+warmup_state = WarmupState(STARTUP_WARMUP)
+
+
+def run_warmup() -> None:
+    """
+    重いSDKの読み込み、APIクライアントの生成、キーマッピングと全モジュールIDのテンプレートの取得を行い、
+    結果を共有キャッシュに載せます。初回リクエストがこれらの待ち時間を負担しないようにするためのものです。
+    """
+    warmup_state.status = "running"
+    warmup_state.started_at = time.monotonic()
+    try:
+        env = load_environment()
+        for module_name in WARMUP_MODULES:
+            lazy_import(module_name)
+
+        api_clients = get_api_clients(
+            groq_api_key=env['GROQ_API_KEY'],
+            toolhouse_api_key=env['TOOLHOUSE_API_KEY'],
+            lingu_key=env['LINGUSTRUCT_LICENSE_KEY'],
+            user_id=env['USER_ID']
+        )
+        api_clients.groq
+        api_clients.toolhouse
+
+        # キーマッピングはコンストラクタで取得され、キャッシュされる
+        mapper = Mapper(api_url=KEY_MAPPING_API_URL, license_key=env['LINGUSTRUCT_LICENSE_KEY'])
+        module_ids = mapper.registry.built_modules()
+
+        templates = DocumentGenerator(env['LINGUSTRUCT_LICENSE_KEY']).fetch_templates(module_ids)
+        warmup_state.templates_loaded = sum(1 for template in templates.values() if template)
+
+        warmup_state.status = "done"
+        logger.info(f"Warm-up finished: {warmup_state.templates_loaded}/{len(module_ids)} templates loaded.")
+    except Exception as e:
+        warmup_state.status = "failed"
+        warmup_state.error = str(e)
+        logger.error(f"Warm-up failed: {e}", exc_info=True)
+    finally:
+        warmup_state.duration = time.monotonic() - warmup_state.started_at
@@ -0,0 +1,182 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 設定されている場合は X-Hub-Signature-256 ヘッダーの署名を検証する
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# 選択ごとに保持する設計書の版の数（差分の基準として使える）
+DOCUMENT_HISTORY = int(os.getenv("DOCUMENT_HISTORY", "5"))
+
+
+class WebhookError(Exception):
+    """Webhookのペイロードや署名が不正な場合の例外"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class PushEvent:
+    def __init__(self, repo_name: str, branch_name: str, commit_sha: Optional[str], changed_paths: List[str],
+                 removed_paths: List[str], deleted: bool = False):
+        """
+        ブランチへのpushイベント。
+
+        :param repo_name: リポジトリ名（owner/name）
+        :param branch_name: ブランチ名
+        :param commit_sha: push後のコミット
+        :param changed_paths: 追加・変更されたパス
+        :param removed_paths: 削除されたパス
+        :param deleted: ブランチ自体が削除された場合はTrue
+        """
+        self.repo_name = repo_name
+        self.branch_name = branch_name
+        self.commit_sha = commit_sha
+        self.changed_paths = changed_paths
+        self.removed_paths = removed_paths
+        self.deleted = deleted
+
+    @property
+    def touched_paths(self) -> List[str]:
+        return self.changed_paths + self.removed_paths
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> Optional["PushEvent"]:
+        """
+        GitHub形式のpushペイロード、またはローカル検証用の簡易形式からイベントを作成します。
+        ブランチ以外（タグなど）へのpushの場合は None を返します。
+
+        簡易形式: {"repo_name": ..., "branch_name": ..., "commit_sha": ..., "changed_paths": [...], "removed_paths": [...]}
+        """
+        if "repo_name" in payload:
+            try:
+                return cls(
+                    payload["repo_name"], payload["branch_name"], payload.get("commit_sha"),
+                    list(payload.get("changed_paths", [])), list(payload.get("removed_paths", [])),
+                    bool(payload.get("deleted", False)),
+                )
+            except KeyError as e:
+                raise WebhookError(422, f"Missing field in push payload: {e}")
+
+        ref = payload.get("ref", "")
+        repository = payload.get("repository") or {}
+        repo_name = repository.get("full_name")
+        if not repo_name or not ref:
+            raise WebhookError(422, "Push payload must contain ref and repository.full_name")
+        if not ref.startswith("refs/heads/"):
+            return None
+
+        changed: Dict[str, None] = {}
+        removed: Dict[str, None] = {}
+        for commit in payload.get("commits") or []:
+            for path in (commit.get("added") or []) + (commit.get("modified") or []):
+                changed[path] = None
+                removed.pop(path, None)
+            for path in commit.get("removed") or []:
+                removed[path] = None
+                changed.pop(path, None)
+        return cls(
+            repo_name, ref[len("refs/heads/"):], payload.get("after"),
+            list(changed), list(removed), bool(payload.get("deleted", False)),
+        )
+
+
+def verify_signature(body: bytes, signature: Optional[str]) -> None:
+    """WEBHOOK_SECRET が設定されている場合、HMAC-SHA256 署名を検証します。"""
+    if not WEBHOOK_SECRET:
+        return
+    if not signature or not signature.startswith("sha256="):
+        raise WebhookError(401, "Missing webhook signature")
+    expected = hmac.new(WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature[len("sha256="):]):
+        raise WebhookError(401, "Invalid webhook signature")
+
+
+class TrackedSelections:
+    def __init__(self, base_dir: Optional[str] = None):
+        """
+        設計書を生成したことのある (repo, branch, 選択ファイル) の組を記録します。
+        pushイベントを受けた際に、どの設計書を事前に再生成するかの判断に使います。
+
+        :param base_dir: 保存先ディレクトリ（既定は環境変数 TRACKED_SELECTIONS_DIR または tracked_selections）
+        """
+        self.base_dir = base_dir or os.getenv("TRACKED_SELECTIONS_DIR", "tracked_selections")
+        os.makedirs(self.base_dir, exist_ok=True)  # ディレクトリを自動作成
+        self._lock = threading.Lock()
+
+    def _path(self, repo_name: str, branch_name: str) -> str:
+        digest = hashlib.sha256(f"{repo_name}\0{branch_name}".encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.base_dir, f"{digest}.json")
+
+    def _read(self, path: str) -> Dict[str, Any]:
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read tracked selections {path}: {e}")
+            return {}
+
+    def _write(self, path: str, data: Dict[str, Any]):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def add(self, repo_name: str, branch_name: str, selected_files: List[str], pin_commit: bool,
+            document_id: Optional[str] = None) -> Optional[str]:
+        """
+        選択を記録します。
+
+        :param pin_commit: コミットを指定して生成された場合はTrue（再生成時はpush後のコミットを指定する）
+        :param document_id: 生成された設計書のID（選択ごとに直近の版を DOCUMENT_HISTORY 件まで保持する）
+        :return: この選択に対して前回生成された設計書のID（なければ None）
+        """
+        files = sorted(set(selected_files))
+        selection_id = hashlib.sha256("\n".join(files).encode("utf-8")).hexdigest()[:16]
+        path = self._path(repo_name, branch_name)
+        with self._lock:
+            data = self._read(path)
+            selections = data.setdefault("selections", {})
+            selection = selections.get(selection_id)
+            if selection is None:
+                selection = selections[selection_id] = {"files": files}
+            selection.update(pin_commit=pin_commit, last_requested_at=time.time())
+            history = selection.setdefault("documents", [])
+            previous = next((document for document in reversed(history) if document != document_id), None)
+            if document_id is not None:
+                if document_id in history:
+                    history.remove(document_id)
+                history.append(document_id)
+                del history[:-DOCUMENT_HISTORY]
+            data.update(repo=repo_name, branch=branch_name)
+            self._write(path, data)
+        return previous
+
+    def documents(self, repo_name: str, branch_name: str, selected_files: List[str]) -> List[str]:
+        """選択に対して生成された設計書のID（古い順）"""
+        files = sorted(set(selected_files))
+        selection_id = hashlib.sha256("\n".join(files).encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            selections = self._read(self._path(repo_name, branch_name)).get("selections", {})
+        return list(selections.get(selection_id, {}).get("documents", []))
+
+    def list(self, repo_name: str, branch_name: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._read(self._path(repo_name, branch_name)).get("selections", {}).values())
+
+    def remove_branch(self, repo_name: str, branch_name: str):
+        with self._lock:
+            try:
+                os.remove(self._path(repo_name, branch_name))
+            except FileNotFoundError:
+                pass
@@ -1,17 +1,76 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started_at = time.perf_counter()  # 起動時間の計測（モジュールの読み込み開始）
+
+import asyncio
+import json
+import os
+import re
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response
 from pydantic import BaseModel
 from components.config import load_environment
-from components.api_clients import APIClients
+from components.api_clients import get_api_clients
 from components.data_fetcher import DataFetcher
+from components.pipeline import run_design_document_pipeline, record_branch_head, PipelineError, document_cache
+from components.file_priority import GenerationBudget
+from components.run_checkpoint import RUN_ID_PATTERN
+from components.single_flight import AsyncSingleFlight
+from components.document_cache import etag_for, etag_matches
+from components.document_delta import document_delta, DELTA_JSON_PATCH
+from components.cancellation import REASON_CLIENT_DISCONNECTED, REASON_DEADLINE_EXCEEDED
+from components.admission import admission_controller, AdmissionRejected, ADMISSION_DEFAULT_FILE_BYTES
+from components.upstream_scheduler import get_scheduler
+from components.warmup import warmup_state, run_warmup
+from components.symbol_index import get_symbol_index
+from components.module_registry import get_module_registry
+from components.file_metadata import estimate_total_bytes, forget_listing_metadata
+from components.file_preview import RangeNotSatisfiable, prefetch_directory, preview_file
 from components.parser import Parser
-from components.mapper import Mapper
-from components.document_generator import DocumentGenerator
-from utils.logger import setup_logger
+from components.file_tree import TREE_FORMAT_COMPACT, TREE_FORMAT_NESTED, build_compact_tree, encoded_tree, forget_listing
+from components.webhooks import PushEvent, TrackedSelections, WebhookError, verify_signature
+from utils.lazy_import import import_timings, record_import_time
+from utils.logger import set_log_context, setup_logger
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal, Optional
 
 logger = setup_logger(__name__)
-app = FastAPI()
+record_import_time("main", _import_started_at)
+logger.info(f"Application modules imported in {import_timings()['main']} ms")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # モジュール定義は起動時に読み込んで検証し、誤りがあれば起動を中止する
+    get_module_registry()
+    # ウォームアップはバックグラウンドで実行し、完了までは /ready が 503 を返す
+    warmup_task = None
+    if warmup_state.enabled:
+        warmup_task = asyncio.ensure_future(run_in_threadpool(run_warmup))
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+generation_flight = AsyncSingleFlight("generate-design-document")
+
+# リクエストの既定の期限（秒、0 は期限なし）。X-Request-Timeout ヘッダーまたは timeout_seconds で上書きできる
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("PIPELINE_REQUEST_TIMEOUT", "0"))
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
+# 期限切れ後、パイプライン側のエラー（実行IDを含む）を待つ猶予（秒）
+DEADLINE_GRACE = 1.0
+# push webhook による事前生成の期限（秒、0 は期限なし）と、アドミッション制御上のユーザーID
+WEBHOOK_PRECOMPUTE_TIMEOUT = float(os.getenv("WEBHOOK_PRECOMPUTE_TIMEOUT", "600"))
+WEBHOOK_USER_ID = os.getenv("WEBHOOK_USER_ID", "webhook")
+# ドキュメントID（設計書のフィンガープリント）の形式
+DOCUMENT_ID_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+tracked_selections = TrackedSelections()
+_precompute_tasks = set()
+# 実行中のプレビュー用の先読み
+_prefetch_tasks = set()
 
 # CORS設定
 origins = [
@@ -25,33 +84,60 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Run-ID", "X-Request-ID", "Retry-After"],
 )
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # リクエストIDをこのリクエストの処理中のすべてのログに付与し、レスポンスヘッダーでも返す
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    set_log_context(request_id=request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Pydanticモデル
 class ListRepoFilesRequest(BaseModel):
     repo_name: str
     branch_name: str
+    format: Literal["nested", "compact"] = TREE_FORMAT_NESTED  # compact: 平坦な並列配列（names, name, parent, types）
 
 class ListRepoFilesResponse(BaseModel):
-    files: List[Dict[str, Any]]  # {'name': str, 'type': 'file' | 'directory', 'path': str}
+    files: Optional[List[Dict[str, Any]]] = None  # nested 形式: {'name': str, 'type': 'file' | 'directory', 'path': str}
+    tree: Optional[Dict[str, Any]] = None  # compact 形式
+    tree_sha: str
 
 class GenerateDesignDocumentRequest(BaseModel):
     repo_name: str
     branch_name: str
     selected_files: List[str]
+    commit_sha: Optional[str] = None
+    run_id: Optional[str] = None  # 失敗・中断した実行を再開する場合に指定
+    timeout_seconds: Optional[float] = None  # この秒数を過ぎたら生成を打ち切る
+    budget_seconds: Optional[float] = None  # この秒数で処理できたファイルだけで設計書を返す（残りは deferred_files）
+    max_upstream_calls: Optional[int] = None  # ファイル内容の取得リクエスト数の上限（超える分は deferred_files）
+    include_document: bool = True  # False の場合は設計書を返さず、document_id で部分的に取得する
+    base_document_id: Optional[str] = None  # 手元にある版。保存されていれば、その版からの差分を返す
+    delta_format: Literal["json-patch", "modules"] = DELTA_JSON_PATCH
 
 class GenerateDesignDocumentResponse(BaseModel):
-    final_documents: Dict[str, Any]  # {'file_path': design_document}
+    final_documents: Optional[Dict[str, Any]] = None  # {'file_path': design_document}
+    run_id: Optional[str] = None
+    document_id: Optional[str] = None  # /documents/{document_id} で取得できる
+    previous_document_id: Optional[str] = None  # 同じ選択に対して前回生成された版
+    base_document_id: Optional[str] = None
+    delta: Optional[Any] = None  # base_document_id からの差分（JSON Patch またはモジュール単位）
+    deferred_files: List[str] = []  # 予算内で処理できなかったファイル。同じ run_id で再度呼び出すと処理される
 
 @app.post("/list-repo-files", response_model=ListRepoFilesResponse)
-async def list_repo_files_endpoint(request: ListRepoFilesRequest):
+async def list_repo_files_endpoint(request: ListRepoFilesRequest, if_none_match: Optional[str] = Header(default=None)):
     try:
         # 環境変数のロード
         env = load_environment()
         logger.info("Environment variables loaded successfully")
         
         # APIクライアントと一時保存管理の初期化
-        api_clients = APIClients(
+        api_clients = get_api_clients(
             groq_api_key=env['GROQ_API_KEY'],
             toolhouse_api_key=env['TOOLHOUSE_API_KEY'],
             lingu_key=env['LINGUSTRUCT_LICENSE_KEY'],
@@ -59,14 +145,26 @@ async def list_repo_files_endpoint(request: ListRepoFilesRequest):
         )
         storage_manager = None  # TempStorageManager は現在使用していない
         
-        # データ取得
+        # データ取得（ブランチごとにキャッシュされ、ツリーのSHAが変わるまで再取得しない）
         fetcher = DataFetcher(api_clients)
-        file_tree = fetcher.fetch_file_tree(request.repo_name, request.branch_name)
-        if not file_tree:
+        listing = await run_in_threadpool(fetcher.fetch_file_listing, request.repo_name, request.branch_name)
+        if not listing:
             logger.warning("File tree could not be fetched")
             raise HTTPException(status_code=404, detail="File tree could not be fetched")
-        
-        return {"files": file_tree}
+        tree_sha, file_paths = listing
+
+        # 同じツリー・同じ形式の応答は内容が変わらないため、ツリーのSHAをETagにする
+        etag = etag_for(f"{tree_sha}-{request.format}")
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        def build() -> Dict[str, Any]:
+            if request.format == TREE_FORMAT_COMPACT:
+                return {"tree": build_compact_tree(file_paths), "tree_sha": tree_sha}
+            return {"files": fetcher.build_file_tree(file_paths), "tree_sha": tree_sha}
+
+        payload = await run_in_threadpool(encoded_tree, request.repo_name, request.branch_name, tree_sha, request.format, build)
+        return Response(content=payload, media_type="application/json", headers={"ETag": etag})
     
     except HTTPException as he:
         raise he
@@ -75,66 +173,429 @@ async def list_repo_files_endpoint(request: ListRepoFilesRequest):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @app.post("/generate-design-document", response_model=GenerateDesignDocumentResponse)
-async def generate_design_document_endpoint(request: GenerateDesignDocumentRequest):
+async def generate_design_document_endpoint(request: GenerateDesignDocumentRequest, response: Response, http_request: Request,
+                                            if_none_match: Optional[str] = Header(default=None),
+                                            x_request_timeout: Optional[float] = Header(default=None)):
     try:
         # 環境変数のロード
         env = load_environment()
         logger.info("Environment variables loaded successfully")
 
-        # コンポーネントの初期化
-        api_clients = APIClients(
+        # 実行IDはチェックポイントのディレクトリ名になるため、形式を検証する
+        if request.run_id is not None and not RUN_ID_PATTERN.fullmatch(request.run_id):
+            raise HTTPException(status_code=400, detail="Invalid run_id")
+
+        # 期限（ヘッダーとボディの指定のうち短い方）
+        timeouts = [t for t in (x_request_timeout, request.timeout_seconds, DEFAULT_REQUEST_TIMEOUT) if t and t > 0]
+        deadline = time.monotonic() + min(timeouts) if timeouts else None
+
+        # 予算（指定された場合は重要度の高いファイルから処理し、予算を超える分は後回しにする）
+        budget = None
+        budget_seconds = request.budget_seconds if request.budget_seconds and request.budget_seconds > 0 else None
+        max_upstream_calls = request.max_upstream_calls
+        if max_upstream_calls is not None and max_upstream_calls < 0:
+            max_upstream_calls = None
+        if budget_seconds is not None or max_upstream_calls is not None:
+            budget = GenerationBudget(budget_seconds, max_upstream_calls)
+
+        # アドミッション制御のユーザーは設定されたユーザーID（クライアントが送るヘッダーは認証されていないため使わない）
+        final_document, fingerprint, run_id, deferred_files = await _await_while_connected(
+            http_request,
+            _generate(env, env['USER_ID'], request.repo_name, request.branch_name, request.selected_files,
+                      request.commit_sha, request.run_id, deadline, budget),
+            deadline
+        )
+        # push webhook で事前生成する対象として記録する
+        previous_document_id = await run_in_threadpool(
+            _record_selection, request.repo_name, request.branch_name, request.selected_files, request.commit_sha is not None,
+            fingerprint
+        )
+
+        # 入力が変わっていなければ 304 Not Modified を返す
+        etag = etag_for(fingerprint)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "X-Run-ID": run_id})
+        response.headers["ETag"] = etag
+        response.headers["X-Run-ID"] = run_id
+        result = {
+            "final_documents": final_document if request.include_document else None,
+            "run_id": run_id,
+            "document_id": fingerprint,
+            "previous_document_id": previous_document_id,
+            "deferred_files": deferred_files,
+        }
+        # 基準となる版が指定された場合は、設計書全体の代わりに差分を返す
+        if request.base_document_id and request.include_document:
+            base_document = await run_in_threadpool(_load_document, request.base_document_id)
+            if base_document is not None:
+                result["final_documents"] = None
+                result["base_document_id"] = request.base_document_id
+                result["delta"] = await run_in_threadpool(document_delta, base_document, final_document, request.delta_format)
+        return result
+
+    except AdmissionRejected as ar:
+        logger.warning(f"Design document request rejected ({ar.status_code}): {ar.detail}")
+        raise HTTPException(status_code=ar.status_code, detail=ar.detail, headers=ar.headers)
+    except PipelineError as pe:
+        # 実行IDを返し、クライアントが同じ実行IDで再開できるようにする
+        headers = {"X-Run-ID": pe.run_id} if pe.run_id else None
+        raise HTTPException(status_code=pe.status_code, detail=pe.detail, headers=headers)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error in generate_design_document_endpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@app.get("/documents/{document_id}")
+async def document_endpoint(document_id: str, response: Response, if_none_match: Optional[str] = Header(default=None)):
+    """設計書のモジュール以外の項目と、モジュールの目次（キー、ID、名前、カテゴリ、ファイルパス）"""
+    not_modified = _document_not_modified(document_id, response, if_none_match)
+    if not_modified is not None:
+        return not_modified
+    skeleton = await run_in_threadpool(document_cache.skeleton, document_id)
+    index = await run_in_threadpool(document_cache.index, document_id)
+    if skeleton is None or index is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {**skeleton, "document_id": document_id, "modules": [_module_summary(entry) for entry in index]}
+
+@app.get("/documents/{document_id}/modules")
+async def document_modules_endpoint(document_id: str, response: Response,
+                                    offset: int = Query(default=0, ge=0), limit: int = Query(default=50, ge=1, le=500),
+                                    module_id: Optional[int] = None, category: Optional[str] = None,
+                                    path_prefix: Optional[str] = None, per_file: Optional[bool] = None,
+                                    if_none_match: Optional[str] = Header(default=None)):
+    """条件（モジュールID・カテゴリ・パスの前方一致・ファイルごとのモジュールか）に一致するモジュールの1ページ"""
+    not_modified = _document_not_modified(document_id, response, if_none_match)
+    if not_modified is not None:
+        return not_modified
+    entries = await run_in_threadpool(document_cache.find_modules, document_id, module_id, category, path_prefix, per_file)
+    if entries is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    page = entries[offset:offset + limit]
+    modules = await run_in_threadpool(document_cache.read_modules, document_id, page)
+    if modules is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"document_id": document_id, "total": len(entries), "offset": offset, "limit": limit, "modules": modules}
+
+@app.get("/documents/{document_id}/modules/{key:path}")
+async def document_module_endpoint(document_id: str, key: str, response: Response,
+                                   if_none_match: Optional[str] = Header(default=None)):
+    """キー（モジュールID、またはファイルごとのモジュールの場合は "ID:パス"）で指定した1つのモジュール"""
+    not_modified = _document_not_modified(document_id, response, if_none_match)
+    if not_modified is not None:
+        return not_modified
+    index = await run_in_threadpool(document_cache.index, document_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    entries = [entry for entry in index if entry["key"] == key]
+    if not entries:
+        raise HTTPException(status_code=404, detail="Module not found")
+    modules = await run_in_threadpool(document_cache.read_modules, document_id, entries[:1])
+    if not modules:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return modules[0]
+
+@app.get("/documents/{document_id}/value")
+async def document_value_endpoint(document_id: str, pointer: str, response: Response,
+                                  if_none_match: Optional[str] = Header(default=None)):
+    """JSON Pointer（RFC 6901、例: /modules/3/content）で指定した設計書の一部"""
+    not_modified = _document_not_modified(document_id, response, if_none_match)
+    if not_modified is not None:
+        return not_modified
+    try:
+        value = await run_in_threadpool(document_cache.resolve_pointer, document_id, pointer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (KeyError, IndexError):
+        raise HTTPException(status_code=404, detail="Value not found")
+    return {"document_id": document_id, "pointer": pointer, "value": value}
+
+@app.get("/documents/{document_id}/delta")
+async def document_delta_endpoint(document_id: str, base: str,
+                                  format: Literal["json-patch", "modules"] = DELTA_JSON_PATCH):
+    """保存済みの2つの版の差分（base から document_id へ）"""
+    document = await run_in_threadpool(_load_document, document_id)
+    base_document = await run_in_threadpool(_load_document, base)
+    if document is None or base_document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    delta = await run_in_threadpool(document_delta, base_document, document, format)
+    return {"document_id": document_id, "base_document_id": base, "format": format, "delta": delta}
+
+@app.get("/symbols/search")
+async def symbol_search_endpoint(repo_name: str, branch_name: str, q: str, kind: Optional[str] = None,
+                                 exact: bool = False, limit: int = Query(default=50, ge=1, le=500)):
+    """シンボル名で検索します（設計書を生成済みのファイルが対象、既定は前方一致）"""
+    results = await run_in_threadpool(get_symbol_index().search, repo_name, branch_name, q, kind, not exact, limit)
+    return {"symbols": results}
+
+@app.get("/symbols/importers")
+async def symbol_importers_endpoint(repo_name: str, branch_name: str, target: str):
+    """指定したファイルまたはモジュール名をインポートしているファイル"""
+    results = await run_in_threadpool(get_symbol_index().importers, repo_name, branch_name, target)
+    return {"target": target, "importers": results}
+
+@app.get("/symbols/outline")
+async def symbol_outline_endpoint(repo_name: str, branch_name: str, path: str):
+    """ファイルのシンボルとインポートの一覧"""
+    outline = await run_in_threadpool(get_symbol_index().outline, repo_name, branch_name, path)
+    if outline is None:
+        raise HTTPException(status_code=404, detail="File is not indexed")
+    return outline
+
+class PrefetchFilesRequest(BaseModel):
+    repo_name: str
+    branch_name: str
+    directory: str = ""  # 展開したディレクトリ（ルートは空文字）
+
+@app.get("/files/content")
+async def file_content_endpoint(repo_name: str, branch_name: str, path: str, response: Response,
+                                start_line: Optional[int] = Query(default=None, ge=1),
+                                end_line: Optional[int] = Query(default=None, ge=1),
+                                start_byte: Optional[int] = Query(default=None, ge=0),
+                                end_byte: Optional[int] = Query(default=None, ge=0),
+                                if_none_match: Optional[str] = Header(default=None)):
+    """
+    ファイルの内容（行またはバイトの範囲を指定可）と構文情報を返します。
+    取得済み・先読み済みの内容はコンテンツキャッシュから返し、上流への呼び出しを行いません。
+    """
+    if (start_line is not None or end_line is not None) and (start_byte is not None or end_byte is not None):
+        raise HTTPException(status_code=400, detail="Specify either a line range or a byte range, not both")
+    try:
+        env = load_environment()
+        api_clients = get_api_clients(
             groq_api_key=env['GROQ_API_KEY'],
             toolhouse_api_key=env['TOOLHOUSE_API_KEY'],
             lingu_key=env['LINGUSTRUCT_LICENSE_KEY'],
             user_id=env['USER_ID']
         )
+        preview = await run_in_threadpool(preview_file, DataFetcher(api_clients), Parser(), repo_name, branch_name, path,
+                                          start_line, end_line, start_byte, end_byte)
+    except RangeNotSatisfiable as e:
+        raise HTTPException(status_code=416, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in file_content_endpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    if preview is None:
+        raise HTTPException(status_code=404, detail="File content could not be fetched")
 
-        # データ取得
-        fetcher = DataFetcher(api_clients)
-        files_content = fetcher.fetch_files_content(request.repo_name, request.branch_name, request.selected_files)
+    # 同じ内容・同じ範囲の応答は変わらないため、内容のハッシュと範囲をETagにする
+    content_range = "-".join(str(value) for value in preview["range"].values())
+    etag = etag_for(f"{preview['hash']}-{content_range}")
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return preview
 
-        if not files_content:
-            logger.warning("Selected files content could not be fetched")
-            raise HTTPException(status_code=404, detail="Selected files content could not be fetched")
+@app.post("/files/prefetch", status_code=202)
+async def prefetch_files_endpoint(request: PrefetchFilesRequest):
+    """
+    ディレクトリ直下のファイルの内容をバックグラウンドで取得し、プレビューをすぐに表示できるようにします。
+    """
+    env = load_environment()
+    api_clients = get_api_clients(
+        groq_api_key=env['GROQ_API_KEY'],
+        toolhouse_api_key=env['TOOLHOUSE_API_KEY'],
+        lingu_key=env['LINGUSTRUCT_LICENSE_KEY'],
+        user_id=env['USER_ID']
+    )
 
-        # 依存関係の解析
-        dependencies = fetcher.analyze_dependencies(files_content)
+    async def prefetch():
+        try:
+            await run_in_threadpool(prefetch_directory, DataFetcher(api_clients), Parser(),
+                                    request.repo_name, request.branch_name, request.directory)
+        except Exception as e:
+            logger.warning(f"Prefetch of {request.repo_name}@{request.branch_name}:{request.directory} failed: {e}")
 
-        # 解析
-        parser = Parser()
-        parsed_data = {}
-        for file_path, content in files_content.items():
-            file_type = file_path.split('.')[-1].lower()
-            parsed = parser.parse_file(file_path, content, file_type)
-            parsed_data[file_path] = parsed
+    # タスクへの参照を保持し、完了前にガベージコレクションされないようにする
+    task = asyncio.ensure_future(prefetch())
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+    return {"scheduled": True}
 
-        # プロジェクトメタデータの取得（README.mdを解析）
-        readme_content = files_content.get("README.md", "")
-        project_meta = fetcher.extract_meta_information(readme_content)
+@app.post("/webhooks/push", status_code=202)
+async def push_webhook_endpoint(http_request: Request,
+                                x_github_event: Optional[str] = Header(default=None),
+                                x_hub_signature_256: Optional[str] = Header(default=None)):
+    """
+    ブランチへのpushを受け取り、変更されたファイルのキャッシュを破棄したうえで、
+    そのブランチで生成済みの設計書をバックグラウンドで再生成してドキュメントキャッシュに載せます。
+    GitHub形式のpushペイロードのほか、ローカル検証用の簡易形式も受け付けます。
+    """
+    body = await http_request.body()
+    try:
+        verify_signature(body, x_hub_signature_256)
+        if x_github_event == "ping":
+            return {"scheduled": []}
+        if x_github_event not in (None, "push"):
+            return {"ignored": f"Unsupported event: {x_github_event}", "scheduled": []}
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise WebhookError(400, "Webhook payload must be JSON")
+        event = PushEvent.from_payload(payload)
+    except WebhookError as we:
+        logger.warning(f"Push webhook rejected ({we.status_code}): {we.detail}")
+        raise HTTPException(status_code=we.status_code, detail=we.detail)
 
-        # マッピング
-        API_URL = "https://lingustruct.onrender.com/lingu_struct/key_mapping"  # APIエンドポイントURL
-        LICENSE_KEY = env['LINGUSTRUCT_LICENSE_KEY']  # 環境変数から取得したライセンスキー
+    if event is None:
+        return {"ignored": "Not a branch push", "scheduled": []}
+    if event.deleted:
+        await run_in_threadpool(tracked_selections.remove_branch, event.repo_name, event.branch_name)
+        await run_in_threadpool(get_symbol_index().remove_branch, event.repo_name, event.branch_name)
+        await run_in_threadpool(forget_listing, event.repo_name, event.branch_name)
+        await run_in_threadpool(record_branch_head, event.repo_name, event.branch_name, None)
+        logger.info(f"Branch {event.repo_name}@{event.branch_name} deleted; stopped tracking its selections.")
+        return {"scheduled": []}
 
-        mapper = Mapper(api_url=API_URL, license_key=LICENSE_KEY)  # 修正箇所
-        mapped_data = mapper.map_data_to_modules(parsed_data, dependencies, project_meta)
+    # 変更されたファイルの取得済み内容を破棄し、次回の生成で最新の内容を取得させる
+    await run_in_threadpool(
+        DataFetcher.invalidate_cached_content, event.repo_name, event.branch_name, event.touched_paths
+    )
 
-        # ドキュメント生成
-        generator = DocumentGenerator(env['LINGUSTRUCT_LICENSE_KEY'])
-        final_document = generator.generate_final_document(mapped_data["modules"], project_id="lingurepo_project", version="1.0")  # 修正箇所
+    # 新しい先頭のコミットを記録する（事前生成した設計書は、内容を取得せずにこのリビジョンの索引から返せる）
+    await run_in_threadpool(record_branch_head, event.repo_name, event.branch_name, event.commit_sha)
 
-        if not final_document:
-            logger.warning("Final document could not be generated")
-            raise HTTPException(status_code=500, detail="Final document could not be generated")
+    # ファイル一覧とそこから得たサイズ・更新日時は古くなるため破棄する
+    await run_in_threadpool(forget_listing_metadata, event.repo_name, event.branch_name)
+    await run_in_threadpool(forget_listing, event.repo_name, event.branch_name)
+    # 削除されたファイルは索引から外す（変更されたファイルは再生成時に更新される）
+    await run_in_threadpool(get_symbol_index().remove_files, event.repo_name, event.branch_name, event.removed_paths)
+
+    touched = set(event.touched_paths)
+    removed = set(event.removed_paths)
+    scheduled = []
+    for selection in await run_in_threadpool(tracked_selections.list, event.repo_name, event.branch_name):
+        if not touched.intersection(selection["files"]):
+            continue
+        selected_files = [path for path in selection["files"] if path not in removed]
+        if not selected_files:
+            continue
+        commit_sha = event.commit_sha if selection["pin_commit"] else None
+        _schedule_precompute(event.repo_name, event.branch_name, selected_files, commit_sha)
+        scheduled.append({"selected_files": selected_files, "commit_sha": commit_sha})
+
+    logger.info(
+        f"Push to {event.repo_name}@{event.branch_name}: {len(touched)} paths changed, "
+        f"{len(scheduled)} documents scheduled for regeneration."
+    )
+    return {"repo_name": event.repo_name, "branch_name": event.branch_name, "scheduled": scheduled}
+
+@app.get("/ready")
+async def ready_endpoint(response: Response):
+    """起動時のウォームアップが完了しているか（無効の場合は常に ready）と、モジュールの読み込み時間"""
+    if not warmup_state.ready:
+        response.status_code = 503
+    return {
+        "ready": warmup_state.ready,
+        "warmup": warmup_state.to_dict(),
+        "import_timings_ms": import_timings(),
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """アドミッション制御（待ち行列の長さ・待ち時間など）と上流呼び出しのメトリクス"""
+    return {
+        "admission": admission_controller.metrics(),
+        "upstream": get_scheduler().metrics(),
+    }
+
+def _document_not_modified(document_id: str, response: Response, if_none_match: Optional[str]) -> Optional[Response]:
+    """
+    ドキュメントIDを検証し、キャッシュ用のヘッダーを設定します。保存済みの設計書は変更されないため、
+    If-None-Match が一致する場合は 304 を返します。
+    """
+    if not DOCUMENT_ID_PATTERN.fullmatch(document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    etag = etag_for(document_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return None
+
+def _module_summary(entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: entry[key] for key in ("key", "id", "name", "category", "file_path")}
+
+def _generate(env: Dict[str, str], user_id: str, repo_name: str, branch_name: str, selected_files: List[str],
+              commit_sha: Optional[str], run_id: Optional[str], deadline: Optional[float],
+              budget: Optional[GenerationBudget] = None):
+    """
+    設計書を生成します。同一の (repo, branch, commit, selected_files, run_id, 予算) に対する同時実行は1回にまとめる。
+    すべての待機者が切断・期限切れになると、パイプラインの上流呼び出しはキャンセルされる。
+    """
+    flight_key = (repo_name, branch_name, commit_sha, tuple(sorted(set(selected_files))), run_id,
+                  budget.key() if budget is not None else None)
+
+    async def run_admitted(cancel_token):
+        # 見積もりコストに応じて実行枠を確保してから実行する（満杯の場合は待ち行列で待つ）
+        # バイト数はファイル一覧のメタデータ（ローカルのクローンでは git）から見積もる。イベントループを止めないようスレッドで実行する
+        total_bytes = await run_in_threadpool(
+            estimate_total_bytes, repo_name, branch_name, selected_files, ADMISSION_DEFAULT_FILE_BYTES
+        )
+        cost = admission_controller.estimate_cost(len(selected_files), total_bytes)
+        async with admission_controller.admit(user_id, cost, cancel_token):
+            return await run_in_threadpool(
+                run_design_document_pipeline, env, repo_name, branch_name, selected_files,
+                commit_sha, run_id, cancel_token, budget
+            )
+
+    return generation_flight.do_cancellable(flight_key, run_admitted, deadline)
+
+def _record_selection(repo_name: str, branch_name: str, selected_files: List[str], pin_commit: bool,
+                      document_id: Optional[str] = None) -> Optional[str]:
+    try:
+        return tracked_selections.add(repo_name, branch_name, selected_files, pin_commit, document_id)
+    except OSError as e:
+        logger.warning(f"Could not record selection for {repo_name}@{branch_name}: {e}")
+        return None
+
+def _load_document(document_id: str) -> Optional[Dict[str, Any]]:
+    if not DOCUMENT_ID_PATTERN.fullmatch(document_id):
+        return None
+    return document_cache.get(document_id)
+
+def _schedule_precompute(repo_name: str, branch_name: str, selected_files: List[str], commit_sha: Optional[str]):
+    """pushを受けた設計書の再生成をバックグラウンドで開始します。結果はドキュメントキャッシュに保存される。"""
+    async def precompute():
+        try:
+            env = load_environment()
+            deadline = time.monotonic() + WEBHOOK_PRECOMPUTE_TIMEOUT if WEBHOOK_PRECOMPUTE_TIMEOUT > 0 else None
+            _, fingerprint, run_id, _ = await _generate(env, WEBHOOK_USER_ID, repo_name, branch_name, selected_files,
+                                                     commit_sha, None, deadline)
+            await run_in_threadpool(_record_selection, repo_name, branch_name, selected_files, commit_sha is not None, fingerprint)
+            logger.info(f"Precomputed design document for {repo_name}@{branch_name} ({len(selected_files)} files, run {run_id}).")
+        except AdmissionRejected as ar:
+            logger.warning(f"Precompute for {repo_name}@{branch_name} rejected ({ar.status_code}): {ar.detail}")
+        except PipelineError as pe:
+            logger.warning(f"Precompute for {repo_name}@{branch_name} failed ({pe.status_code}): {pe.detail}")
+        except Exception as e:
+            logger.error(f"Precompute for {repo_name}@{branch_name} failed: {e}", exc_info=True)
+
+    # タスクへの参照を保持し、完了前にガベージコレクションされないようにする
+    task = asyncio.ensure_future(precompute())
+    _precompute_tasks.add(task)
+    task.add_done_callback(_precompute_tasks.discard)
+
+async def _await_while_connected(http_request: Request, awaitable, deadline: Optional[float]):
+    """
+    クライアントが接続している間、期限までパイプラインの完了を待ちます。
+    切断または期限切れの場合は待機をやめ、共有タスクから離脱します。
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if deadline is not None and time.monotonic() >= deadline + DEADLINE_GRACE:
+                raise PipelineError(504, f"Design document generation cancelled: {REASON_DEADLINE_EXCEEDED}")
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected; abandoning design document generation.")
+                raise PipelineError(499, f"Design document generation cancelled: {REASON_CLIENT_DISCONNECTED}")
+    finally:
+        if not task.done():
+            task.cancel()
 
-        logger.info("Final document generated successfully.")
-        return {"final_documents": final_document}
-    
-    except HTTPException as he:
-        raise he
-    except Exception as e:
-        logger.error(f"Error in generate_design_document_endpoint: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal Server Error")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,45 @@
+import importlib
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Dict
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_timings: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def lazy_import(module_name: str) -> ModuleType:
+    """
+    重いモジュール（SDKなど）を初回使用時に読み込みます。
+    読み込みにかかった時間を記録し、起動時間の分析に使えるようにします。
+
+    :param module_name: モジュール名
+    :return: 読み込んだモジュール
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with _lock:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+        started_at = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        _timings[module_name] = round(elapsed_ms, 1)
+        logger.info(f"Imported {module_name} in {elapsed_ms:.1f} ms")
+        return module
+
+
+def record_import_time(name: str, started_at: float):
+    """time.perf_counter() で計測した開始時刻からの経過時間を記録します。"""
+    _timings[name] = round((time.perf_counter() - started_at) * 1000, 1)
+
+
+def import_timings() -> Dict[str, float]:
+    """これまでに計測したモジュールの読み込み時間（ミリ秒）。"""
+    return dict(_timings)
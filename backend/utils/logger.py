@@ -1,11 +1,181 @@
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import reprlib
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 
-def setup_logger(name: str = __name__, level: int = logging.DEBUG) -> logging.Logger:
+# ログレベル（DEBUG / INFO / WARNING / ERROR）と出力形式（"text" または "json"）
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+_DEFAULT_LEVEL = logging.getLevelName(LOG_LEVEL)
+if not isinstance(_DEFAULT_LEVEL, int):
+    _DEFAULT_LEVEL = logging.INFO
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# "1" の場合、ログの書き出しを別スレッドで行い、呼び出し元をブロックしない
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") == "1"
+# 1件のメッセージの最大文字数（超えた分は切り詰める）
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "4000"))
+# 書き出し待ちのログの上限件数（超えた場合は破棄して呼び出し元を待たせない）
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# リクエストID・実行IDはコンテキスト変数で伝搬し、すべてのログに付与する
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_run_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("run_id", default=None)
+
+_payload_repr = reprlib.Repr()
+_payload_repr.maxstring = 200
+_payload_repr.maxother = 200
+_payload_repr.maxlist = 20
+_payload_repr.maxdict = 20
+_payload_repr.maxlevel = 3
+
+
+class capped:
+    """
+    大きな値（ツールの応答、パスの一覧、依存関係の辞書など）をログに渡すためのラッパー。
+    文字列化はログが実際に出力される場合にだけ行われ、出力される長さも上限で切り詰められます。
+
+        logger.debug("Dependencies: %s", capped(dependencies))
+    """
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = 1000):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if isinstance(self.value, str):
+            text = self.value
+        else:
+            text = _payload_repr.repr(self.value)
+        return _truncate(text, self.limit)
+
+
+def sample(every: int) -> Dict[str, int]:
+    """
+    同じ呼び出し箇所のログを every 件に1件だけ出力します（ファイルごとのループ内のログなど）。
+
+        logger.debug("Added module for file: %s", file_path, extra=sample(100))
+    """
+    return {"sample_every": every}
+
+
+def set_log_context(request_id: Optional[str] = None, run_id: Optional[str] = None) -> None:
+    """現在のコンテキスト（リクエストやスレッド）のログに付与するIDを設定します。"""
+    if request_id is not None:
+        _request_id.set(request_id)
+    if run_id is not None:
+        _run_id.set(run_id)
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit > 0 and len(text) > limit:
+        return f"{text[:limit]}... ({len(text) - limit} chars truncated)"
+    return text
+
+
+class ContextFilter(logging.Filter):
+    """リクエストID・実行IDの付与と、呼び出し箇所ごとのサンプリングを行います。"""
+
+    def __init__(self):
+        super().__init__()
+        self._counts: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = getattr(record, "sample_every", None)
+        if every and every > 1:
+            site = (record.pathname, record.lineno)
+            with self._lock:
+                count = self._counts.get(site, 0)
+                self._counts[site] = count + 1
+            if count % every:
+                return False
+        record.request_id = _request_id.get()
+        record.run_id = _run_id.get()
+        return True
+
+
+class CappedQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord):
+        # キューが満杯の場合はログを捨て、呼び出し元（リクエスト処理）を待たせない
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 引数は呼び出し元で確定させる（後から変更される可変オブジェクトに備える）。書式の適用は書き出しスレッドで行う
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = _truncate(record.getMessage(), LOG_MAX_MESSAGE_CHARS)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        record.msg = _truncate(record.getMessage(), LOG_MAX_MESSAGE_CHARS)
+        record.args = None
+        text = super().format(record)
+        ids = [f"{key}={value}" for key, value in (("request_id", getattr(record, "request_id", None)),
+                                                  ("run_id", getattr(record, "run_id", None))) if value]
+        return f"{text} [{' '.join(ids)}]" if ids else text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": _truncate(record.getMessage(), LOG_MAX_MESSAGE_CHARS),
+        }
+        for key in ("request_id", "run_id"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_handler: Optional[logging.Handler] = None
+_handler_lock = threading.Lock()
+
+
+def _shared_handler() -> logging.Handler:
+    """すべてのモジュールのロガーが共有するハンドラー（プロセスごとに1つ）"""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(TEXT_FORMAT))
+            if LOG_ASYNC:
+                log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+                listener = QueueListener(log_queue, stream_handler, respect_handler_level=False)
+                listener.start()
+                atexit.register(listener.stop)  # 終了時に残りのログを書き出す
+                _handler = CappedQueueHandler(log_queue)
+            else:
+                _handler = stream_handler
+            _handler.addFilter(ContextFilter())
+        return _handler
+
+
+def setup_logger(name: str = __name__, level: Optional[int] = None) -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.handlers:
-        logger.setLevel(level)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-    return logger
\ No newline at end of file
+        logger.setLevel(level if level is not None else _DEFAULT_LEVEL)
+        logger.addHandler(_shared_handler())
+    return logger
@@ -487,11 +487,11 @@ export function BlockPage() {
     return paths;
   }
 
-  const renderFileTree = (files: FileType[], depth = 0) => {
+  const renderFileTree = (files: FileType[], depth = 0, parentPath = '') => {
     return (
       <ul className={`space-y-1 ${depth > 0 ? 'ml-4' : ''}`}>
         {files.map((file) => (
-          <li key={file.path} className="flex items-center space-x-2">
+          <li key={file.path ?? `${parentPath}${file.name}/`} className="flex items-center space-x-2">
             <span className="w-4 h-4 text-xs">
               {file.type === 'directory' ? '📁' : '📄'}
             </span>
@@ -504,7 +504,12 @@ export function BlockPage() {
             )}
             {file.type === 'directory' ? (
               // ディレクトリの場合は名前のみ表示
-              <span className="text-sm cursor-pointer hover:underline">{file.name}</span>
+              <span
+                className="text-sm cursor-pointer hover:underline"
+                onClick={() => prefetchDirectory(`${parentPath}${file.name}`)}
+              >
+                {file.name}
+              </span>
             ) : (
               // ファイルの場合はラベルを表示
               <label
@@ -518,7 +523,7 @@ export function BlockPage() {
             {/* 再帰的にディレクトリ内のファイルを表示 */}
             {file.type === 'directory' && file.children && (
               <div className="ml-4">
-                {renderFileTree(file.children, depth + 1)}
+                {renderFileTree(file.children, depth + 1, `${parentPath}${file.name}/`)}
               </div>
             )}
           </li>
@@ -539,11 +544,34 @@ export function BlockPage() {
     });
   }
 
-  const handleFileSelect = (filePath: string) => {
+  // ディレクトリを展開したときに、直下のファイルの内容をバックグラウンドで先読みさせる
+  const prefetchDirectory = (directory: string) => {
+    fetch('http://localhost:8000/files/prefetch', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ repo_name: repoName, branch_name: branchName, directory })
+    }).catch(error => console.error('Error prefetching directory:', error))
+  }
+
+  const handleFileSelect = async (filePath: string) => {
     setSelectedFile(filePath)
-    // ファイルの履歴や内容を表示する場合はここで設定
-    // ここではシミュレーションとしてプレースホルダーを設定
-    setFileContent(`# ${filePath}\n\nThis is a placeholder content for ${filePath}. In a real application, this would be fetched from the repository.`)
+    setFileContent('')
+    // ファイルの内容はバックエンドのコンテンツキャッシュから取得する（先読み済みであれば上流への呼び出しは発生しない）
+    try {
+      const params = new URLSearchParams({ repo_name: repoName, branch_name: branchName, path: filePath })
+      const response = await fetch(`http://localhost:8000/files/content?${params}`)
+      if (!response.ok) {
+        const errorData = await response.json()
+        throw new Error(errorData.detail || (language === 'en' ? "Failed to fetch file content." : "ファイル内容の取得に失敗しました。"))
+      }
+      const data = await response.json()
+      setFileContent(data.truncated ? `${data.content}\n…` : data.content)
+    } catch (error: any) {
+      console.error('Error fetching file content:', error)
+      setFileContent(error.message || (language === 'en' ? "Failed to fetch file content." : "ファイル内容の取得に失敗しました。"))
+    }
     setFileHistory([
       { date: '2023-05-01', author: 'John Doe', message: 'Initial commit' },
       { date: '2023-05-15', author: 'Jane Smith', message: 'Updated file structure' },